@@ -17,6 +17,9 @@ VENV_BIN = os.path.join(PROJECT_ROOT, ".venv", "bin")
 DBT_CMD = os.path.join(VENV_BIN, "dbt")
 PYTHON_CMD = os.path.join(VENV_BIN, "python")
 
+# 3. Backend the DAG notifies once fresh gold data is in place
+API_BASE = os.getenv("EXECKPI_API_BASE", "http://127.0.0.1:8001")
+
 with DAG(
     dag_id="execkpi_daily",
     start_date=datetime(2024, 1, 1),
@@ -24,12 +27,20 @@ with DAG(
     catchup=False,
     max_active_runs=1,
     tags=["execkpi", "governance"],
+    # trigger with {"full_refresh": true} to rebuild the incremental gold tables
+    params={"full_refresh": False},
 ) as dag:
 
     # Task 1: Run dbt Transformations (Bronze -> Silver -> Gold)
+    # Incremental gold models only recompute the days since the run date
+    # (minus the lookback window) and merge them into their partitions.
     dbt_run = BashOperator(
         task_id="dbt_run",
-        bash_command=f"cd {DBT_DIR} && {DBT_CMD} run",
+        bash_command=(
+            f"cd {DBT_DIR} && {DBT_CMD} run "
+            "--vars '{\"execkpi_run_date\": \"{{ ds }}\"}'"
+            "{{ ' --full-refresh' if params.full_refresh else '' }}"
+        ),
         env={"dbt_project_dir": DBT_DIR} # Explicit env var often helps dbt
     )
 
@@ -47,5 +58,37 @@ with DAG(
         bash_command=f"cd {PROJECT_ROOT} && {PYTHON_CMD} backend/train_explain.py",
     )
 
+    # Task 4: Drop cached KPI results so dashboards pick up the new run.
+    # Best effort: a backend that is down has nothing cached anyway.
+    invalidate_kpi_cache = BashOperator(
+        task_id="invalidate_kpi_cache",
+        bash_command=(
+            f"curl -fsS -X POST {API_BASE}/kpi/cache/invalidate "
+            "-H 'Content-Type: application/json' -d '{\"reason\": \"dbt_run\"}' "
+            "|| echo 'kpi cache invalidation skipped'"
+        ),
+    )
+
+    # Task 5: Fold the A/B cohort whose conversion window closed on this run
+    # date into the sequential (mSPRT) state.
+    # The run date is the idempotency key, so retries do not double count.
+    update_ab_sequential = BashOperator(
+        task_id="update_ab_sequential",
+        bash_command=(
+            f"curl -fsS -X POST {API_BASE}/ab/sequential/ab_group/refresh "
+            "-H 'Content-Type: application/json' -d '{\"day\": \"{{ ds }}\"}'"
+        ),
+    )
+
+    # Task 6: Score every user with the freshly trained model.
+    # Writes artifacts/scores/<ds>/ and, when EXECKPI_SCORE_TABLE is set, the
+    # <ds> partition of that BigQuery table (re-runs replace it).
+    batch_score = BashOperator(
+        task_id="batch_score",
+        bash_command=f"cd {PROJECT_ROOT} && {PYTHON_CMD} backend/batch_score.py --date {{{{ ds }}}}",
+    )
+
     # Orchestration Logic
-    dbt_run >> dbt_test_gold >> train_local_model
\ No newline at end of file
+    dbt_run >> dbt_test_gold >> train_local_model >> batch_score
+    dbt_run >> invalidate_kpi_cache
+    dbt_test_gold >> update_ab_sequential
\ No newline at end of file
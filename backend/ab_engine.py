@@ -0,0 +1,226 @@
+# backend/ab_engine.py
+"""
+Vectorised A/B testing for many experiments at once.
+
+Input is one row per (experiment, segment, arm) with successes and totals.
+Within each (experiment, segment) family every pair of arms gets a pooled
+two-proportion z-test (the same test as /ab/test), a confidence interval for
+the rate difference and Holm / Benjamini-Hochberg adjusted p-values; each
+family also gets a k-arm sample ratio mismatch (SRM) chi-square.
+
+Everything is computed with array operations over all rows and pairs, so a
+batch of thousands of comparisons costs a few milliseconds.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.stats import chi2, norm
+
+CORRECTIONS = {"holm", "bh", "none"}
+
+
+class AbInputError(ValueError):
+    """Malformed batch input (lengths, counts, options)."""
+
+
+def _as_counts(values: Sequence[Any], name: str) -> np.ndarray:
+    try:
+        arr = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise AbInputError(f"{name} must be numeric") from e
+    if arr.ndim != 1 or not np.all(np.isfinite(arr)) or np.any(arr != np.floor(arr)):
+        raise AbInputError(f"{name} must be a list of whole numbers")
+    return arr.astype(np.int64)
+
+
+def _codes(values: np.ndarray) -> np.ndarray:
+    return np.unique(values, return_inverse=True)[1]
+
+
+def _family_ids(experiment: np.ndarray, segment: np.ndarray) -> np.ndarray:
+    """Dense id per (experiment, segment), numbered in first-seen order."""
+    seg = _codes(segment)
+    combined = _codes(experiment) * (int(seg.max()) + 1) + seg
+    _, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+    # renumber so family ids follow input order
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    return rank[inverse]
+
+
+def _pairs(family: np.ndarray, n_families: int):
+    """
+    Index pairs (i, j), i before j, of rows in the same family.
+
+    Rows are grouped by family (stable), then pairs are generated for all
+    families of the same size k at once from np.triu_indices(k).
+    """
+    order = np.argsort(family, kind="stable")
+    sizes = np.bincount(family, minlength=n_families)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    left, right, fam = [], [], []
+    for k in np.unique(sizes):
+        if k < 2:
+            continue
+        fams = np.flatnonzero(sizes == k)
+        iu, ju = np.triu_indices(k, 1)
+        base = starts[fams][:, None]
+        left.append(order[(base + iu).ravel()])
+        right.append(order[(base + ju).ravel()])
+        fam.append(np.repeat(fams, iu.size))
+    if not left:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    i, j, f = (np.concatenate(x) for x in (left, right, fam))
+    # stable output order: by family, then by row position
+    out = np.lexsort((j, i, f))
+    return i[out], j[out], f[out]
+
+
+def _adjust(p: np.ndarray, family: np.ndarray, method: str) -> np.ndarray:
+    """Holm or BH adjusted p-values, each family corrected on its own."""
+    if method == "none" or p.size == 0:
+        return p.copy()
+    order = np.lexsort((p, family))
+    ps, fs = p[order], family[order]
+    sizes = np.bincount(fs)
+    first = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rank = np.arange(ps.size) - first[fs]  # 0-based rank within family
+    m = sizes[fs]
+    # values live in [0, 1]; a per-family offset keeps the running max/min
+    # from leaking across family boundaries
+    offset = 2.0 * fs
+    if method == "holm":
+        adj = np.minimum((m - rank) * ps, 1.0)
+        adj = np.maximum.accumulate(adj + offset) - offset
+    else:  # bh
+        adj = np.minimum(ps * m / (rank + 1), 1.0)
+        adj = (np.minimum.accumulate((adj + offset)[::-1]) - offset[::-1])[::-1]
+    out = np.empty_like(adj)
+    out[order] = np.clip(adj, 0.0, 1.0)
+    return out
+
+
+def run_batch(
+    experiment: Sequence[Any],
+    arm: Sequence[Any],
+    successes: Sequence[Any],
+    totals: Sequence[Any],
+    segment: Optional[Sequence[Any]] = None,
+    weights: Optional[Sequence[Any]] = None,
+    alpha: float = 0.05,
+    correction: str = "holm",
+    control: Optional[str] = None,
+) -> Dict[str, Dict[str, list]]:
+    """
+    Test every pair of arms within each (experiment, segment).
+
+    `weights` are the planned traffic shares per row for the SRM check
+    (equal split if omitted). With `control`, only control-vs-arm pairs are
+    reported and uplift is always arm minus control.
+
+    Returns columnar results: {"pairs": {col: [...]}, "families": {col: [...]}}.
+    """
+    n = len(experiment)
+    segment = [""] * n if segment is None else segment
+    if not all(len(x) == n for x in (arm, successes, totals, segment)):
+        raise AbInputError(
+            "experiment, arm, segment, successes, totals differ in length"
+        )
+    if n == 0:
+        raise AbInputError("no rows")
+    if correction not in CORRECTIONS:
+        raise AbInputError(f"correction must be one of {sorted(CORRECTIONS)}")
+    if not 0 < alpha < 1:
+        raise AbInputError("alpha must be between 0 and 1")
+
+    exp_arr = np.asarray([str(x) for x in experiment])
+    seg_arr = np.asarray([str(x) for x in segment])
+    arm_arr = np.asarray([str(x) for x in arm])
+    s = _as_counts(successes, "successes")
+    t = _as_counts(totals, "totals")
+    if np.any(t <= 0):
+        raise AbInputError("group sizes must be > 0")
+    if np.any((s < 0) | (s > t)):
+        raise AbInputError("successes must be between 0 and totals")
+
+    family = _family_ids(exp_arr, seg_arr)
+    n_families = int(family.max()) + 1
+    arm_code = _codes(arm_arr)
+    if np.unique(family * (int(arm_code.max()) + 1) + arm_code).size != n:
+        raise AbInputError("duplicate arm within an experiment/segment")
+
+    # SRM: chi-square of observed totals vs planned split, per family
+    if weights is None:
+        w = np.ones(n)
+    else:
+        if len(weights) != n:
+            raise AbInputError("weights must match the number of rows")
+        w = np.asarray(weights, dtype=np.float64)
+        if np.any(~np.isfinite(w)) or np.any(w <= 0):
+            raise AbInputError("weights must be > 0")
+    fam_total = np.bincount(family, weights=t, minlength=n_families)
+    fam_weight = np.bincount(family, weights=w, minlength=n_families)
+    fam_arms = np.bincount(family, minlength=n_families)
+    expected = fam_total[family] * w / fam_weight[family]
+    srm_stat = np.bincount(family, weights=(t - expected) ** 2 / expected)
+    dof = fam_arms - 1
+    with np.errstate(invalid="ignore"):
+        srm_p = np.where(dof > 0, chi2.sf(srm_stat, np.maximum(dof, 1)), 1.0)
+
+    # pairwise pooled z-tests
+    i, j, f = _pairs(family, n_families)
+    if control is not None:
+        keep = (arm_arr[i] == control) | (arm_arr[j] == control)
+        i, j, f = i[keep], j[keep], f[keep]
+        swap = arm_arr[j] == control
+        i, j = np.where(swap, j, i), np.where(swap, i, j)
+
+    rate = s / t
+    uplift = rate[j] - rate[i]
+    pooled = (s[i] + s[j]) / (t[i] + t[j])
+    se = np.sqrt(pooled * (1 - pooled) * (1 / t[i] + 1 / t[j]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(se > 0, uplift / se, 0.0)
+    p = 2 * norm.sf(np.abs(z))
+    half = norm.ppf(1 - alpha / 2) * se
+    p_adj = _adjust(p, f, correction)
+
+    families = np.arange(n_families)
+    first_row = np.full(n_families, n)
+    np.minimum.at(first_row, family, np.arange(n))
+    return {
+        "pairs": {
+            "experiment": exp_arr[i].tolist(),
+            "segment": seg_arr[i].tolist(),
+            "arm_a": arm_arr[i].tolist(),
+            "arm_b": arm_arr[j].tolist(),
+            "rate_a": rate[i].tolist(),
+            "rate_b": rate[j].tolist(),
+            "uplift": uplift.tolist(),
+            "z": z.tolist(),
+            "p_value": p.tolist(),
+            "p_adjusted": p_adj.tolist(),
+            "ci_low": (uplift - half).tolist(),
+            "ci_high": (uplift + half).tolist(),
+            "significant": (p_adj < alpha).tolist(),
+        },
+        "families": {
+            "experiment": exp_arr[first_row[families]].tolist(),
+            "segment": seg_arr[first_row[families]].tolist(),
+            "arms": fam_arms.tolist(),
+            "total": fam_total.astype(np.int64).tolist(),
+            "srm_chi2": srm_stat.tolist(),
+            "srm_p": srm_p.tolist(),
+        },
+    }
+
+
+def to_records(columns: Dict[str, list]) -> List[dict]:
+    names = list(columns)
+    return [
+        dict(zip(names, row, strict=True))
+        for row in zip(*columns.values(), strict=False)
+    ]
@@ -0,0 +1,281 @@
+# backend/ab_resample.py
+"""
+Simulation-based A/B analysis from aggregated data.
+
+- `beta_binomial`: Beta posteriors per arm from (successes, totals), with
+  probability to beat control / be best and expected loss estimated from
+  posterior draws.
+- `bootstrap_means`: CIs for revenue per user from per-group revenue
+  histograms (value, users). Replicates use the Poisson bootstrap over the
+  histogram bins, so the cost is draws x bins no matter how many users there
+  are. Histograms wider than EXECKPI_AB_BOOT_BINS are merged into quantile
+  bins first; merging keeps each group's mean and variance exact, so the
+  CIs keep their width.
+
+Draws are generated in chunks of at most EXECKPI_AB_CHUNK_CELLS values. Each
+chunk has its own generator spawned from `seed`, so results are reproducible
+and chunks can run on a few threads (NumPy releases the GIL while sampling).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.stats import beta as beta_dist
+
+DEFAULT_DRAWS = int(os.getenv("EXECKPI_AB_DRAWS", "20000"))
+MAX_DRAWS = int(os.getenv("EXECKPI_AB_MAX_DRAWS", "200000"))
+CHUNK_CELLS = int(os.getenv("EXECKPI_AB_CHUNK_CELLS", "2000000"))
+BOOT_BINS = int(os.getenv("EXECKPI_AB_BOOT_BINS", "256"))
+THREADS = int(os.getenv("EXECKPI_AB_THREADS", str(min(4, os.cpu_count() or 1))))
+
+
+class ResampleInputError(ValueError):
+    """Bad arms / counts / histogram / draw settings."""
+
+
+def parse_draws(value) -> int:
+    draws = DEFAULT_DRAWS if value is None else int(value)
+    if not 100 <= draws <= MAX_DRAWS:
+        raise ResampleInputError(f"draws must be between 100 and {MAX_DRAWS}")
+    return draws
+
+
+def _chunk_sizes(draws: int, width: int) -> List[int]:
+    per = max(1, CHUNK_CELLS // max(width, 1))
+    return [min(per, draws - start) for start in range(0, draws, per)]
+
+
+def _run_chunks(
+    draws: int, width: int, seed: int, fn: Callable[[np.random.Generator, int], Any]
+) -> List[Any]:
+    """Run fn(rng, size) per chunk, each with its own spawned generator."""
+    sizes = _chunk_sizes(draws, width)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(np.random.default_rng(s), n) for s, n in zip(seeds, sizes, strict=True)]
+    if THREADS <= 1 or len(jobs) == 1:
+        return [fn(rng, n) for rng, n in jobs]
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(lambda job: fn(*job), jobs))
+
+
+def _interval(samples: np.ndarray, level: float) -> Tuple[float, float]:
+    lo, hi = np.quantile(samples, [(1 - level) / 2, (1 + level) / 2])
+    return float(lo), float(hi)
+
+
+def _control_index(arms: Sequence[str], control: Optional[str]) -> int:
+    if control is None:
+        return 0
+    try:
+        return list(arms).index(control)
+    except ValueError as e:
+        raise ResampleInputError(f"control {control!r} is not one of the arms") from e
+
+
+# --------------------------------------------------------------------------
+# Bayesian (Beta-Binomial)
+# --------------------------------------------------------------------------
+def beta_binomial(
+    arms: Sequence[str],
+    successes: Sequence[int],
+    totals: Sequence[int],
+    control: Optional[str] = None,
+    draws: int = DEFAULT_DRAWS,
+    seed: int = 42,
+    prior: Tuple[float, float] = (1.0, 1.0),
+    level: float = 0.95,
+) -> dict:
+    """
+    Posterior summary per arm under independent Beta(prior) priors.
+
+    `expected_loss` is E[max(best arm) - arm]: the conversion rate given up by
+    shipping this arm. `expected_loss_vs_control` is E[max(control - arm, 0)].
+    """
+    arms = [str(a) for a in arms]
+    s = np.asarray(successes, dtype=np.float64)
+    n = np.asarray(totals, dtype=np.float64)
+    k = len(arms)
+    if k < 2 or s.shape != (k,) or n.shape != (k,):
+        raise ResampleInputError("need at least two arms with successes and totals")
+    if len(set(arms)) != k:
+        raise ResampleInputError("arm names must be unique")
+    if np.any(n <= 0) or np.any(s < 0) or np.any(s > n):
+        raise ResampleInputError("counts must satisfy 0 <= successes <= totals > 0")
+    if min(prior) <= 0:
+        raise ResampleInputError("prior parameters must be > 0")
+    ctrl = _control_index(arms, control)
+
+    a = prior[0] + s
+    b = prior[1] + n - s
+
+    def chunk(rng: np.random.Generator, size: int):
+        x = rng.beta(a[:, None], b[:, None], size=(k, size))
+        top = x.max(axis=0)
+        diff = x - x[ctrl]
+        return (
+            np.bincount(x.argmax(axis=0), minlength=k),
+            (diff > 0).sum(axis=1),
+            (top - x).sum(axis=1),
+            np.maximum(-diff, 0).sum(axis=1),
+            diff.astype(np.float32),
+        )
+
+    parts = _run_chunks(draws, k, seed, chunk)
+    best = sum(p[0] for p in parts)
+    beat = sum(p[1] for p in parts)
+    loss = sum(p[2] for p in parts)
+    loss_ctrl = sum(p[3] for p in parts)
+    uplift = np.concatenate([p[4] for p in parts], axis=1)
+
+    credible = beta_dist.ppf([(1 - level) / 2, (1 + level) / 2], a[:, None], b[:, None])
+    out = []
+    for i, arm in enumerate(arms):
+        row = {
+            "arm": arm,
+            "control": i == ctrl,
+            "success": int(s[i]),
+            "total": int(n[i]),
+            "posterior_mean": float(a[i] / (a[i] + b[i])),
+            "credible_interval": credible[i].tolist(),
+            "prob_best": float(best[i] / draws),
+            "expected_loss": float(loss[i] / draws),
+        }
+        if i != ctrl:
+            row["prob_beat_control"] = float(beat[i] / draws)
+            row["expected_loss_vs_control"] = float(loss_ctrl[i] / draws)
+            row["uplift_mean"] = float(uplift[i].mean(dtype=np.float64))
+            row["uplift_interval"] = list(_interval(uplift[i], level))
+        out.append(row)
+    return {
+        "method": "beta_binomial",
+        "prior": list(prior),
+        "draws": draws,
+        "seed": seed,
+        "level": level,
+        "arms": out,
+    }
+
+
+# --------------------------------------------------------------------------
+# Bootstrap (revenue per user)
+# --------------------------------------------------------------------------
+def compress_histogram(
+    values: Sequence[float], counts: Sequence[int], bins: int = BOOT_BINS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge a (value, count) histogram into at most `bins` weighted atoms.
+
+    Values holding at least 1/bins of the users (typically zero revenue) keep
+    an atom of their own. The rest are merged into quantile bins by user
+    position, and each bin becomes two atoms of half its users at mean +/- SD.
+    That keeps the histogram's mean and variance exact, so bootstrap CIs stay
+    as wide as over the raw values; a single mean per bin would drop the
+    within-bin variance and narrow them.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    c = np.asarray(counts, dtype=np.float64)
+    if v.shape != c.shape or v.ndim != 1 or v.size == 0:
+        raise ResampleInputError("values and counts must be equal-length lists")
+    if np.any(c < 0) or c.sum() <= 0 or not np.all(np.isfinite(v)):
+        raise ResampleInputError("counts must be >= 0 and values finite")
+    keep = c > 0
+    v, c = v[keep], c[keep]
+    if v.size <= bins:
+        return v, c
+    order = np.argsort(v, kind="stable")
+    v, c = v[order], c[order]
+    heavy = c >= c.sum() / bins
+    n_heavy = int(heavy.sum())
+    # each light bin becomes two atoms
+    light_bins = max(1, (bins - n_heavy) // 2)
+    light = np.where(heavy, 0.0, c)
+    cum = np.cumsum(light)
+    # light values: bin id from the user's position in the sorted population
+    ids = np.minimum(
+        ((cum - light) / max(cum[-1], 1.0) * light_bins).astype(np.int64),
+        light_bins - 1,
+    )
+    ids[heavy] = light_bins + np.arange(n_heavy)
+    size = light_bins + n_heavy
+    merged_c = np.bincount(ids, weights=c, minlength=size)
+    used = merged_c > 0
+    mean = np.bincount(ids, weights=c * v, minlength=size)
+    mean[used] /= merged_c[used]
+    sq = np.bincount(ids, weights=c * (v - mean[ids]) ** 2, minlength=size)
+    sd = np.zeros(size)
+    sd[used] = np.sqrt(sq[used] / merged_c[used])
+    spread = used & (sd > 0)
+    point = used & ~spread
+    return (
+        np.concatenate(
+            [mean[point], mean[spread] - sd[spread], mean[spread] + sd[spread]]
+        ),
+        np.concatenate([merged_c[point], merged_c[spread] / 2, merged_c[spread] / 2]),
+    )
+
+
+def bootstrap_means(
+    groups: Dict[str, Tuple[Sequence[float], Sequence[int]]],
+    control: Optional[str] = None,
+    draws: int = DEFAULT_DRAWS,
+    seed: int = 42,
+    level: float = 0.95,
+    bins: int = BOOT_BINS,
+) -> dict:
+    """Bootstrap CI of the mean per group and of each group's lift over control."""
+    names = [str(g) for g in groups]
+    if len(names) < 2:
+        raise ResampleInputError("need at least two groups")
+    ctrl = names[_control_index(names, control)]
+
+    means: Dict[str, np.ndarray] = {}
+    summary: Dict[str, dict] = {}
+    for gi, name in enumerate(names):
+        v, c = compress_histogram(*groups[name], bins=bins)
+
+        def chunk(rng: np.random.Generator, size: int, v=v, c=c) -> np.ndarray:
+            w = rng.poisson(c, size=(size, c.size))
+            return (w @ v) / np.maximum(w.sum(axis=1), 1)
+
+        means[name] = np.concatenate(_run_chunks(draws, c.size, seed + gi, chunk))
+        users = float(c.sum())
+        summary[name] = {
+            "group": name,
+            "control": name == ctrl,
+            "users": int(users),
+            "bins": int(c.size),
+            "mean": float((c @ v) / users),
+            "interval": list(_interval(means[name], level)),
+        }
+
+    for name in names:
+        if name == ctrl:
+            continue
+        diff = means[name] - means[ctrl]
+        summary[name]["lift"] = summary[name]["mean"] - summary[ctrl]["mean"]
+        summary[name]["lift_interval"] = list(_interval(diff, level))
+        summary[name]["prob_above_control"] = float((diff > 0).mean())
+
+    return {
+        "method": "poisson_bootstrap",
+        "draws": draws,
+        "seed": seed,
+        "level": level,
+        "groups": [summary[n] for n in names],
+    }
+
+
+def histograms_from_columns(data: Dict[str, list]) -> Dict[str, Tuple[list, list]]:
+    """Group columnar rows of (ab_group, users, revenue_sum) into histograms."""
+    groups: Dict[str, Tuple[list, list]] = {}
+    for g, users, total in zip(
+        data["ab_group"], data["users"], data["revenue_sum"], strict=True
+    ):
+        if not users:
+            continue
+        values, counts = groups.setdefault(str(g), ([], []))
+        values.append(float(total or 0.0) / users)
+        counts.append(int(users))
+    return groups
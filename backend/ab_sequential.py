@@ -0,0 +1,307 @@
+# backend/ab_sequential.py
+"""
+Always-valid A/B monitoring (mSPRT) with incremental local state.
+
+Per experiment we keep the running sufficient statistics (users and
+converters for control and treatment) in a small SQLite file. Each daily
+increment is folded in with O(1) work: add the counts, recompute the mixture
+likelihood ratio and tighten the running always-valid p-value and confidence
+sequence. Reading the current result never touches BigQuery.
+
+The test is the normal-mixture mSPRT for a difference in proportions
+(Johari et al., "Always Valid Inference"): with theta_hat = p_t - p_c,
+V = Var(theta_hat) and mixing variance tau2,
+
+    Lambda = sqrt(V / (V + tau2)) * exp(theta_hat^2 tau2 / (2 V (V + tau2)))
+
+and the always-valid p-value is the running minimum of 1 / Lambda. It can be
+checked after every look without inflating the false positive rate.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+STATE_PATH = Path(os.getenv("EXECKPI_AB_SEQ_PATH", "artifacts/ab_sequential.sqlite"))
+# prior variance of the effect (absolute rate difference); 0.01^2 ~ 1pp effects
+DEFAULT_TAU2 = float(os.getenv("EXECKPI_MSPRT_TAU2", "1e-4"))
+# conversion window of a signup cohort in the daily increment (api_ab_daily.sql)
+WINDOW_DAYS = int(os.getenv("EXECKPI_AB_WINDOW_DAYS", "14"))
+
+_COLUMNS = (
+    "experiment",
+    "control",
+    "treatment",
+    "alpha",
+    "tau2",
+    "n_c",
+    "s_c",
+    "n_t",
+    "s_t",
+    "looks",
+    "p_value",
+    "ci_low",
+    "ci_high",
+    "created_at",
+    "updated_at",
+)
+
+
+class SequentialError(ValueError):
+    """Bad increment/snapshot or a mismatch with the stored experiment."""
+
+
+def msprt(
+    n_c: int, s_c: int, n_t: int, s_t: int, tau2: float, alpha: float
+) -> Tuple[float, float, Tuple[float, float]]:
+    """Return (Lambda, 1/Lambda capped at 1, confidence interval) at this look."""
+    if n_c <= 0 or n_t <= 0:
+        return 1.0, 1.0, (-math.inf, math.inf)
+    p_c, p_t = s_c / n_c, s_t / n_t
+    theta = p_t - p_c
+    var = p_c * (1 - p_c) / n_c + p_t * (1 - p_t) / n_t
+    if var <= 0:
+        return 1.0, 1.0, (-math.inf, math.inf)
+    log_lam = 0.5 * math.log(var / (var + tau2)) + theta * theta * tau2 / (
+        2 * var * (var + tau2)
+    )
+    p_now = math.exp(-log_lam) if log_lam > 0 else 1.0
+    half = math.sqrt(
+        var
+        * (var + tau2)
+        / tau2
+        * (-2 * math.log(alpha) - math.log(var / (var + tau2)))
+    )
+    return math.exp(min(log_lam, 700.0)), min(1.0, p_now), (theta - half, theta + half)
+
+
+def _counts(block: dict, arm: str) -> Tuple[int, int]:
+    try:
+        total, success = int(block[arm]["total"]), int(block[arm]["success"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise SequentialError(f"missing success/total for arm {arm!r}") from e
+    if total < 0 or success < 0:
+        raise SequentialError(f"arm {arm!r}: counts must be >= 0")
+    if success > total:
+        raise SequentialError(f"arm {arm!r}: success > total")
+    return total, success
+
+
+class SequentialStore:
+    def __init__(self, path: Path = STATE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ab_sequential ("
+            " experiment TEXT PRIMARY KEY, control TEXT NOT NULL,"
+            " treatment TEXT NOT NULL, alpha REAL NOT NULL, tau2 REAL NOT NULL,"
+            " n_c INTEGER NOT NULL, s_c INTEGER NOT NULL,"
+            " n_t INTEGER NOT NULL, s_t INTEGER NOT NULL, looks INTEGER NOT NULL,"
+            " p_value REAL NOT NULL, ci_low REAL NOT NULL, ci_high REAL NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # increments already folded (e.g. DAG run dates), so retries are no-ops
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ab_sequential_folds ("
+            " experiment TEXT NOT NULL, fold_key TEXT NOT NULL,"
+            " folded_at REAL NOT NULL, PRIMARY KEY (experiment, fold_key))"
+        )
+        self._conn.commit()
+
+    def _row(self, experiment: str) -> Optional[dict]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM ab_sequential WHERE experiment = ?",
+            (experiment,),
+        ).fetchone()
+        return dict(zip(_COLUMNS, row, strict=True)) if row else None
+
+    def get(self, experiment: str) -> Optional[dict]:
+        with self._lock:
+            row = self._row(experiment)
+        return _summary(row) if row else None
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            names = [
+                r[0]
+                for r in self._conn.execute(
+                    "SELECT experiment FROM ab_sequential ORDER BY experiment"
+                )
+            ]
+            rows = [self._row(n) for n in names]
+        return [_summary(r) for r in rows if r]
+
+    def fold(
+        self,
+        experiment: str,
+        increment: Optional[dict] = None,
+        snapshot: Optional[dict] = None,
+        key: Optional[str] = None,
+        control: str = "A",
+        treatment: str = "B",
+        alpha: float = 0.05,
+        tau2: float = DEFAULT_TAU2,
+    ) -> dict:
+        """
+        Fold one look into the running state.
+
+        Pass either `increment` (new users/converters since the last look) or
+        `snapshot` (cumulative totals; the difference to the stored totals is
+        folded). A `key` that was folded before is ignored, so the DAG can
+        retry safely. Arms, alpha and tau2 are fixed when the experiment is
+        first seen.
+        """
+        if (increment is None) == (snapshot is None):
+            raise SequentialError("pass exactly one of increment or snapshot")
+        if not 0 < alpha < 1 or tau2 <= 0:
+            raise SequentialError("alpha must be in (0, 1) and tau2 > 0")
+
+        with self._lock:
+            row = self._row(experiment)
+            if row is None:
+                now = time.time()
+                row = dict.fromkeys(_COLUMNS, 0)
+                row.update(
+                    experiment=experiment,
+                    control=control,
+                    treatment=treatment,
+                    alpha=alpha,
+                    tau2=tau2,
+                    p_value=1.0,
+                    ci_low=-math.inf,
+                    ci_high=math.inf,
+                    created_at=now,
+                )
+            if (
+                key is not None
+                and self._conn.execute(
+                    "SELECT 1 FROM ab_sequential_folds"
+                    " WHERE experiment = ? AND fold_key = ?",
+                    (experiment, key),
+                ).fetchone()
+            ):
+                return {**_summary(row), "folded": False, "duplicate_key": key}
+
+            block = increment if increment is not None else snapshot
+            n_c, s_c = _counts(block, row["control"])
+            n_t, s_t = _counts(block, row["treatment"])
+            if snapshot is not None:
+                n_c, s_c = n_c - row["n_c"], s_c - row["s_c"]
+                n_t, s_t = n_t - row["n_t"], s_t - row["s_t"]
+                if min(n_c, s_c, n_t, s_t) < 0:
+                    raise SequentialError("snapshot is behind the stored totals")
+
+            row["n_c"] += n_c
+            row["s_c"] += s_c
+            row["n_t"] += n_t
+            row["s_t"] += s_t
+            row["looks"] += 1
+            if row["s_c"] > row["n_c"] or row["s_t"] > row["n_t"]:
+                raise SequentialError("more converters than users after folding")
+            _, p_now, (lo, hi) = msprt(
+                row["n_c"],
+                row["s_c"],
+                row["n_t"],
+                row["s_t"],
+                row["tau2"],
+                row["alpha"],
+            )
+            # always-valid: the p-value only goes down, the interval only shrinks
+            row["p_value"] = min(row["p_value"], p_now)
+            row["ci_low"] = max(row["ci_low"], lo)
+            row["ci_high"] = min(row["ci_high"], hi)
+            row["updated_at"] = time.time()
+
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO ab_sequential ({', '.join(_COLUMNS)})"
+                f" VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                tuple(row[c] for c in _COLUMNS),
+            )
+            if key is not None:
+                self._conn.execute(
+                    "INSERT INTO ab_sequential_folds VALUES (?, ?, ?)",
+                    (experiment, key, row["updated_at"]),
+                )
+            self._conn.commit()
+        return {**_summary(row), "folded": True}
+
+    def reset(self, experiment: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM ab_sequential WHERE experiment = ?", (experiment,)
+            )
+            self._conn.execute(
+                "DELETE FROM ab_sequential_folds WHERE experiment = ?", (experiment,)
+            )
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[SequentialStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SequentialStore:
+    """Return the process-wide store, opening the SQLite file on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SequentialStore()
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
+
+
+def _finite(x: float) -> Optional[float]:
+    return x if math.isfinite(x) else None
+
+
+def _summary(row: Dict) -> dict:
+    n_c, s_c, n_t, s_t = row["n_c"], row["s_c"], row["n_t"], row["s_t"]
+    rate_c = s_c / n_c if n_c else None
+    rate_t = s_t / n_t if n_t else None
+    significant = row["p_value"] < row["alpha"]
+    if not significant:
+        decision = "continue"
+    elif row["ci_low"] > 0:
+        decision = "treatment_better"
+    elif row["ci_high"] < 0:
+        decision = "control_better"
+    else:
+        decision = "significant"
+    return {
+        "experiment": row["experiment"],
+        "method": "msprt",
+        "alpha": row["alpha"],
+        "tau2": row["tau2"],
+        "looks": row["looks"],
+        "group": {
+            row["control"]: {"success": s_c, "total": n_c, "rate": rate_c},
+            row["treatment"]: {"success": s_t, "total": n_t, "rate": rate_t},
+        },
+        "control": row["control"],
+        "treatment": row["treatment"],
+        "uplift": rate_t - rate_c if n_c and n_t else None,
+        "p_value": row["p_value"],
+        "confidence_sequence": [_finite(row["ci_low"]), _finite(row["ci_high"])],
+        "significant": significant,
+        "decision": decision,
+        "updated_at": row["updated_at"] or None,
+    }
@@ -0,0 +1,358 @@
+# backend/artifact_store.py
+"""
+Versioned, content-addressed model artifacts.
+
+    artifacts/
+      LATEST                      -> "<version>" (the version being served)
+      versions/<version>/
+        manifest.json             name, format, columns, file hashes
+        model.ubj                 xgboost (native UBJSON)
+        forest/*.npy              random forest as flat node arrays (mmap-able)
+        linear.json               logistic regression coefficients
+        model.pkl                 anything else
+        columns.json, metrics.json, shap_summary.json, ...
+
+The version is a hash of every file in it, so identical content maps to the
+same directory and a version directory is never rewritten. A commit writes the
+version into a temp directory, renames it into place, then swaps LATEST
+(write + rename). Readers follow LATEST and never see a half-written version.
+Rolling back is a LATEST swap. The newest EXECKPI_ARTIFACT_KEEP versions are
+kept, and the LATEST one is never pruned.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ARTIFACT_DIR = Path(os.getenv("EXECKPI_ARTIFACT_DIR", "artifacts"))
+KEEP = int(os.getenv("EXECKPI_ARTIFACT_KEEP", "5"))
+PREDICT_BLOCK_ROWS = 4096  # rows per vectorized forest traversal
+
+LATEST_FILE = "LATEST"
+VERSIONS_DIR = "versions"
+MANIFEST_FILE = "manifest.json"
+
+
+class ArtifactError(Exception):
+    """Missing, unknown or inconsistent artifact version."""
+
+
+# ---------------------------------------------------------------------
+# Native model formats
+# ---------------------------------------------------------------------
+class ForestModel:
+    """
+    A fitted RandomForestClassifier as flat node arrays (all trees back to
+    back, child indices global). Leaves point to themselves with an infinite
+    threshold, so predict_proba can step every tree for a block of rows at
+    once without masking. The arrays can be memory-mapped, so a load only
+    reads the pages a prediction touches.
+    """
+
+    ARRAYS = ("left", "right", "feature", "threshold", "value", "weight", "roots")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], n_features: int, depth: int):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_features_in_ = n_features
+        self.depth = depth
+        self.classes_ = np.arange(self.value.shape[1])
+
+    @classmethod
+    def from_sklearn(cls, model) -> "ForestModel":
+        parts = {name: [] for name in cls.ARRAYS}
+        offset = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            leaf = tree.children_left == -1
+            own = np.arange(tree.node_count) + offset
+            parts["left"].append(np.where(leaf, own, tree.children_left + offset))
+            parts["right"].append(np.where(leaf, own, tree.children_right + offset))
+            parts["feature"].append(np.where(leaf, 0, tree.feature))
+            parts["threshold"].append(np.where(leaf, np.inf, tree.threshold))
+            value = tree.value[:, 0, :].astype(np.float64)
+            parts["value"].append(value / value.sum(axis=1, keepdims=True))
+            parts["weight"].append(tree.weighted_n_node_samples)
+            parts["roots"].append([offset])
+            offset += tree.node_count
+        arrays = {
+            "left": np.concatenate(parts["left"]).astype(np.int32),
+            "right": np.concatenate(parts["right"]).astype(np.int32),
+            "feature": np.concatenate(parts["feature"]).astype(np.int32),
+            "threshold": np.concatenate(parts["threshold"]).astype(np.float64),
+            "value": np.concatenate(parts["value"]),
+            "weight": np.concatenate(parts["weight"]).astype(np.float64),
+            "roots": np.concatenate(parts["roots"]).astype(np.int64),
+        }
+        depth = max(est.tree_.max_depth for est in model.estimators_)
+        return cls(arrays, int(model.n_features_in_), int(depth))
+
+    def save(self, out_dir: Path) -> List[str]:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(out_dir / f"{name}.npy", getattr(self, name))
+        return [f"forest/{name}.npy" for name in self.ARRAYS]
+
+    @classmethod
+    def load(cls, in_dir: Path, n_features: int, depth: int, mmap: bool = True):
+        mode = "r" if mmap else None
+        arrays = {n: np.load(in_dir / f"{n}.npy", mmap_mode=mode) for n in cls.ARRAYS}
+        return cls(arrays, n_features, depth)
+
+    def predict_proba(self, X) -> np.ndarray:
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((len(X), self.value.shape[1]))
+        for start in range(0, len(X), PREDICT_BLOCK_ROWS):
+            block = X[start : start + PREDICT_BLOCK_ROWS]
+            n, trees = len(block), len(self.roots)
+            flat = block.ravel()
+            nodes = np.tile(self.roots.astype(np.int32), n)  # one path per (row, tree)
+            base = np.repeat(np.arange(n, dtype=np.int64) * X.shape[1], trees)
+            active = np.arange(n * trees)
+            # step all unfinished paths one level; a path stops at its leaf
+            while active.size:
+                at = nodes[active]
+                x = flat.take(base[active] + self.feature.take(at))
+                step = np.where(
+                    x <= self.threshold.take(at),
+                    self.left.take(at),
+                    self.right.take(at),
+                )
+                nodes[active] = step
+                active = active[step != at]
+            value = self.value[nodes].reshape(n, trees, -1)
+            out[start : start + n] = value.mean(axis=1)
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_proba(X).argmax(axis=1)
+
+    def shap_tree_model(self) -> dict:
+        """The forest in shap.TreeExplainer's dict format (per-tree, local ids)."""
+        bounds = [*self.roots.tolist(), len(self.left)]
+        scaling = 1.0 / len(self.roots)
+        trees = []
+        for start, end in zip(bounds[:-1], bounds[1:], strict=True):
+            own = np.arange(start, end)
+            leaf = np.asarray(self.left[start:end]) == own
+            left = np.where(leaf, -1, self.left[start:end] - start).astype(np.int32)
+            right = np.where(leaf, -1, self.right[start:end] - start).astype(np.int32)
+            trees.append(
+                {
+                    "children_left": left,
+                    "children_right": right,
+                    "children_default": left,
+                    "features": np.where(leaf, -2, self.feature[start:end]),
+                    "thresholds": np.where(leaf, -2.0, self.threshold[start:end]),
+                    "values": np.asarray(self.value[start:end]) * scaling,
+                    "node_sample_weight": np.asarray(self.weight[start:end]),
+                }
+            )
+        return {
+            "trees": trees,
+            "tree_output": "probability",
+            "input_dtype": np.float32,
+            "internal_dtype": np.float64,
+        }
+
+
+def _linear_to_json(model) -> dict:
+    return {
+        "class": type(model).__name__,
+        "coef": np.asarray(model.coef_).tolist(),
+        "intercept": np.asarray(model.intercept_).tolist(),
+        "classes": np.asarray(model.classes_).tolist(),
+    }
+
+
+def _linear_from_json(spec: dict):
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression()
+    model.coef_ = np.asarray(spec["coef"], dtype=np.float64)
+    model.intercept_ = np.asarray(spec["intercept"], dtype=np.float64)
+    model.classes_ = np.asarray(spec["classes"])
+    model.n_features_in_ = model.coef_.shape[1]
+    return model
+
+
+def export_model(model, out_dir: Path) -> Tuple[str, List[str], dict]:
+    """Write `model` in its native format -> (format, files, load options)."""
+    kind = type(model).__name__
+    if hasattr(model, "get_booster"):
+        model.save_model(out_dir / "model.ubj")
+        return "xgboost-ubj", ["model.ubj"], {}
+    if kind in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        forest = ForestModel.from_sklearn(model)
+        files = forest.save(out_dir / "forest")
+        return "forest-npy", files, {"depth": forest.depth}
+    if kind == "ForestModel":
+        return "forest-npy", model.save(out_dir / "forest"), {"depth": model.depth}
+    if kind == "LogisticRegression":
+        (out_dir / "linear.json").write_text(json.dumps(_linear_to_json(model)))
+        return "linear-json", ["linear.json"], {}
+    (out_dir / "model.pkl").write_bytes(pickle.dumps(model))
+    return "pickle", ["model.pkl"], {}
+
+
+def load_model(version_dir: Path, manifest: dict, mmap: bool = True):
+    fmt = manifest["format"]
+    if fmt == "xgboost-ubj":
+        from xgboost import XGBClassifier
+
+        model = XGBClassifier()
+        model.load_model(version_dir / "model.ubj")
+        return model
+    if fmt == "forest-npy":
+        return ForestModel.load(
+            version_dir / "forest",
+            len(manifest["columns"]),
+            manifest["options"]["depth"],
+            mmap=mmap,
+        )
+    if fmt == "linear-json":
+        return _linear_from_json(json.loads((version_dir / "linear.json").read_text()))
+    if fmt == "pickle":
+        with open(version_dir / "model.pkl", "rb") as f:
+            return pickle.load(f)
+    raise ArtifactError(f"unknown model format {fmt!r}")
+
+
+# ---------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root: Path = ARTIFACT_DIR, keep: int = KEEP):
+        self.root = Path(root)
+        self.keep = max(1, keep)
+
+    @property
+    def versions_dir(self) -> Path:
+        return self.root / VERSIONS_DIR
+
+    def path(self, version: str) -> Path:
+        if not version or "/" in version or version.startswith("."):
+            raise ArtifactError(f"bad version {version!r}")
+        return self.versions_dir / version
+
+    def latest(self) -> Optional[str]:
+        try:
+            return (self.root / LATEST_FILE).read_text("utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    def manifest(self, version: str) -> dict:
+        try:
+            text = (self.path(version) / MANIFEST_FILE).read_text("utf-8")
+        except FileNotFoundError:
+            raise ArtifactError(f"unknown version {version!r}") from None
+        return json.loads(text)
+
+    def read_json(self, version: str, name: str) -> Optional[dict]:
+        path = self.path(version) / name
+        if not path.exists():
+            return None
+        return json.loads(path.read_text("utf-8"))
+
+    def load(self, version: str, mmap: bool = True):
+        """-> (model, columns, manifest)."""
+        manifest = self.manifest(version)
+        model = load_model(self.path(version), manifest, mmap=mmap)
+        return model, list(manifest["columns"]), manifest
+
+    def versions(self) -> List[dict]:
+        """Manifests, newest first, with a `latest` flag."""
+        latest = self.latest()
+        out = []
+        if self.versions_dir.exists():
+            for d in self.versions_dir.iterdir():
+                if d.name.startswith(".") or not (d / MANIFEST_FILE).exists():
+                    continue
+                m = self.manifest(d.name)
+                out.append({**m, "latest": d.name == latest})
+        out.sort(key=lambda m: m["created_at"], reverse=True)
+        return out
+
+    def set_latest(self, version: str) -> None:
+        """Point LATEST at an existing version (also used to roll back)."""
+        self.manifest(version)  # must exist
+        tmp = self.root / f".{LATEST_FILE}.{uuid.uuid4().hex}"
+        tmp.write_text(version + "\n", "utf-8")
+        tmp.replace(self.root / LATEST_FILE)
+
+    def commit(
+        self,
+        model,
+        name: str,
+        columns: List[str],
+        files: Optional[Dict[str, bytes]] = None,
+    ) -> dict:
+        """Write a new version (model + columns + extra files), make it LATEST."""
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.versions_dir / f".tmp-{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            fmt, model_files, options = export_model(model, staging)
+            (staging / "columns.json").write_text(json.dumps(columns, indent=2))
+            for fname, data in (files or {}).items():
+                (staging / fname).write_bytes(data)
+            hashes = {
+                p.relative_to(staging).as_posix(): _sha256(p)
+                for p in sorted(staging.rglob("*"))
+                if p.is_file()
+            }
+            h = hashlib.sha256()
+            for fname, digest in hashes.items():
+                h.update(f"{fname}\0{digest}\n".encode())
+            version = h.hexdigest()[:16]
+            manifest = {
+                "version": version,
+                "name": name,
+                "format": fmt,
+                "model_files": model_files,
+                "options": options,
+                "columns": list(columns),
+                "created_at": time.time(),
+                "files": hashes,
+            }
+            target = self.path(version)
+            if target.exists():
+                # identical content: a version directory is never rewritten
+                manifest = self.manifest(version)
+            else:
+                (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+                staging.replace(target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.set_latest(version)
+        self.prune()
+        return manifest
+
+    def prune(self) -> List[str]:
+        latest = self.latest()
+        old = [m["version"] for m in self.versions()[self.keep :]]
+        removed = [v for v in old if v != latest]
+        for version in removed:
+            shutil.rmtree(self.path(version), ignore_errors=True)
+        for stale in self.versions_dir.glob(".tmp-*"):
+            # left over from a crashed commit (never referenced by LATEST)
+            if time.time() - stale.stat().st_mtime > 3600:
+                shutil.rmtree(stale, ignore_errors=True)
+        return removed
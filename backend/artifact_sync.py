@@ -0,0 +1,197 @@
+# backend/artifact_sync.py
+"""
+Upload model artifact versions (backend/artifact_store.py) to S3.
+
+    s3://<bucket>/<prefix>versions/<version>/...            version files
+    s3://<bucket>/<prefix>versions/<version>/manifest.json  written after them
+    s3://<bucket>/<prefix>LATEST                             written last
+
+Files go up concurrently on a thread pool (EXECKPI_S3_WORKERS) that shares
+one client. Files of EXECKPI_S3_MULTIPART_MB or more are sent as multipart
+uploads by boto3's transfer manager. Before each upload the object's ETag is
+compared with the one computed locally (the MD5, or for multipart the MD5 of
+the part MD5s plus "-<parts>"). Matching objects are skipped, so a daily run
+with an unchanged model sends nothing, and a re-run after a failure only
+sends what is missing. If any file fails, the manifest and LATEST are not
+written, so a reader that follows LATEST always finds a complete version.
+
+EXECKPI_S3_ENDPOINT_URL points the client at an S3-compatible stand-in
+(MinIO, moto) for local runs.
+
+    python backend/artifact_sync.py [--version <id>] [--bucket <name>]
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+try:
+    from backend import artifact_store
+except ImportError:  # run as a script: python backend/artifact_sync.py
+    import artifact_store
+
+BUCKET = os.getenv("EXECKPI_S3_BUCKET", "").strip()
+PREFIX = os.getenv("EXECKPI_S3_PREFIX", "").strip()
+ENDPOINT_URL = os.getenv("EXECKPI_S3_ENDPOINT_URL", "").strip() or None
+WORKERS = int(os.getenv("EXECKPI_S3_WORKERS", "8"))
+MULTIPART_BYTES = int(float(os.getenv("EXECKPI_S3_MULTIPART_MB", "16")) * 1024 * 1024)
+
+
+class SyncError(Exception):
+    """One or more artifact files could not be uploaded."""
+
+
+def local_etag(path: Path, multipart_bytes: int = MULTIPART_BYTES) -> str:
+    """The ETag S3 reports for `path` uploaded with this multipart size."""
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        if size < multipart_bytes:
+            h = hashlib.md5(usedforsecurity=False)
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+            return h.hexdigest()
+        parts = [
+            hashlib.md5(part, usedforsecurity=False).digest()
+            for part in iter(lambda: f.read(multipart_bytes), b"")
+        ]
+    digest = hashlib.md5(b"".join(parts), usedforsecurity=False).hexdigest()
+    return f"{digest}-{len(parts)}"
+
+
+def make_client(endpoint_url: Optional[str] = ENDPOINT_URL, workers: int = WORKERS):
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=Config(
+            retries={"max_attempts": 5, "mode": "standard"},
+            max_pool_connections=max(10, workers * 2),
+        ),
+    )
+
+
+def _remote_etag(client, bucket: str, key: str) -> Optional[str]:
+    from botocore.exceptions import ClientError
+
+    try:
+        head = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return head["ETag"].strip('"')
+
+
+def _put(client, bucket: str, key: str, path: Path, multipart_bytes: int) -> int:
+    """Upload unless the object already matches. Returns bytes sent."""
+    from boto3.s3.transfer import TransferConfig
+
+    if _remote_etag(client, bucket, key) == local_etag(path, multipart_bytes):
+        return 0
+    config = TransferConfig(
+        multipart_threshold=multipart_bytes,
+        multipart_chunksize=multipart_bytes,
+        max_concurrency=4,
+    )
+    client.upload_file(str(path), bucket, key, Config=config)
+    return path.stat().st_size
+
+
+def sync_version(
+    root: Path,
+    version: str,
+    bucket: str,
+    prefix: str = PREFIX,
+    client=None,
+    workers: int = WORKERS,
+    multipart_bytes: int = MULTIPART_BYTES,
+    update_latest: bool = True,
+) -> dict:
+    """Upload one version (files, then manifest, then LATEST)."""
+    t0 = time.perf_counter()
+    store = artifact_store.ArtifactStore(root)
+    manifest = store.manifest(version)
+    version_dir = store.path(version)
+    base = f"{prefix}{artifact_store.VERSIONS_DIR}/{version}/"
+    client = client or make_client(workers=workers)
+
+    files = sorted(manifest["files"])
+    errors = {}
+    sent = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            fname: pool.submit(
+                _put, client, bucket, base + fname, version_dir / fname, multipart_bytes
+            )
+            for fname in files
+        }
+        for fname, fut in futures.items():
+            try:
+                sent[fname] = fut.result()
+            except Exception as e:  # noqa: BLE001
+                errors[fname] = f"{type(e).__name__}: {e}"
+    if errors:
+        # no manifest / LATEST: the remote version stays invisible to readers
+        raise SyncError(f"{len(errors)} of {len(files)} files failed: {errors}")
+
+    sent[artifact_store.MANIFEST_FILE] = _put(
+        client,
+        bucket,
+        base + artifact_store.MANIFEST_FILE,
+        version_dir / artifact_store.MANIFEST_FILE,
+        multipart_bytes,
+    )
+    if update_latest:
+        client.put_object(
+            Bucket=bucket,
+            Key=f"{prefix}{artifact_store.LATEST_FILE}",
+            Body=(version + "\n").encode("utf-8"),
+        )
+    uploaded = [f for f, n in sent.items() if n]
+    summary = {
+        "version": version,
+        "bucket": bucket,
+        "prefix": base,
+        "uploaded": len(uploaded),
+        "skipped": len(sent) - len(uploaded),
+        "bytes": sum(sent.values()),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+    print(
+        f"[artifact_sync] s3://{bucket}/{base}: {summary['uploaded']} uploaded,"
+        f" {summary['skipped']} unchanged, {summary['bytes']} bytes"
+        f" in {summary['elapsed_s']}s"
+    )
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upload a model version to S3.")
+    parser.add_argument("--root", type=Path, default=artifact_store.ARTIFACT_DIR)
+    parser.add_argument("--version", help="default: the LATEST version")
+    parser.add_argument("--bucket", default=BUCKET)
+    parser.add_argument("--prefix", default=PREFIX)
+    parser.add_argument("--no-latest", action="store_true", help="leave LATEST alone")
+    args = parser.parse_args()
+    if not args.bucket:
+        parser.error("no bucket (--bucket or EXECKPI_S3_BUCKET)")
+    version = args.version or artifact_store.ArtifactStore(args.root).latest()
+    if version is None:
+        parser.error(f"no LATEST version in {args.root}")
+    sync_version(
+        args.root,
+        version,
+        args.bucket,
+        prefix=args.prefix,
+        update_latest=not args.no_latest,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+ExecKPI batch scorer: write will_convert_14d probabilities for every user.
+
+    python backend/batch_score.py --date 2024-01-01 \
+        [--out artifacts/scores] [--table exec-kpi.execkpi_execkpi.conversion_scores]
+
+Feature rows stream in Arrow batches from the same source as the trainer
+(BigQuery Storage API with the Parquet cache, or DuckDB). They are grouped
+into chunks of --chunk-rows, coerced like the training data and scored on a
+process pool. Each worker loads the saved model once. At most two chunks per
+worker are in flight, so memory stays bounded no matter how many users there
+are.
+
+Output rows are (user_id, score, model_version, model_name, scored_date):
+- Parquet parts under <out>/<date>/ (the date is also a column, so the
+  directory is not hive-partitioned). A re-run replaces that directory.
+- With --table, each part is also loaded into a BigQuery table partitioned by
+  scored_date and clustered by user_id. The first part truncates that date's
+  partition.
+"""
+
+# backend/batch_score.py
+
+import argparse
+import collections
+import datetime as dt
+import multiprocessing as mp
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from backend import feature_prep, ml_serving
+    from backend.bq_pool import get_registry
+    from backend.train_explain import ARTIFACT_DIR, PROJECT_ID, feature_batches
+except ImportError:  # run as a script: python backend/batch_score.py
+    import feature_prep
+    import ml_serving
+    from bq_pool import get_registry
+    from train_explain import ARTIFACT_DIR, PROJECT_ID, feature_batches
+
+SCORE_DIR = Path(os.getenv("EXECKPI_SCORE_DIR", "artifacts/scores"))
+SCORE_TABLE = os.getenv("EXECKPI_SCORE_TABLE", "").strip()
+CHUNK_ROWS = int(os.getenv("EXECKPI_SCORE_CHUNK_ROWS", "200000"))
+WORKERS = int(os.getenv("EXECKPI_SCORE_WORKERS", str(os.cpu_count() or 1)))
+
+
+# ---------------------------------------------------------------------
+# Worker side: the model is loaded once per process
+# ---------------------------------------------------------------------
+_model: Optional["ml_serving.LoadedModel"] = None
+
+
+def _init_worker(artifact_dir: str, version: str) -> None:
+    global _model
+    # the exact version the job started with, even if LATEST moves meanwhile
+    _model = ml_serving.ModelStore(Path(artifact_dir)).load(version)
+
+
+def _score(X: np.ndarray) -> np.ndarray:
+    return _model.predict(X)
+
+
+# ---------------------------------------------------------------------
+# Chunking / output
+# ---------------------------------------------------------------------
+def chunks(batches, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Arrow record batches -> DataFrames of about chunk_rows rows."""
+    import pyarrow as pa
+
+    buf, rows = [], 0
+    for batch in batches:
+        buf.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_rows:
+            yield pa.Table.from_batches(buf).to_pandas()
+            buf, rows = [], 0
+    if buf:
+        yield pa.Table.from_batches(buf).to_pandas()
+
+
+def features_matrix(df: pd.DataFrame, columns) -> np.ndarray:
+    """Coerce a chunk exactly like the trainer and order it like columns.json."""
+    for col in columns:
+        if col not in df.columns:
+            df[col] = 0.0
+    frame, _ = feature_prep.coerce_features(df, list(columns))
+    return frame.to_numpy()
+
+
+def _load_part(client, table: str, day: dt.date, path: Path, first: bool) -> None:
+    from google.cloud import bigquery
+
+    config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        time_partitioning=bigquery.TimePartitioning(field="scored_date"),
+        clustering_fields=["user_id"],
+        write_disposition=(
+            bigquery.WriteDisposition.WRITE_TRUNCATE
+            if first
+            else bigquery.WriteDisposition.WRITE_APPEND
+        ),
+    )
+    with open(path, "rb") as f:
+        client.load_table_from_file(
+            f, f"{table}${day:%Y%m%d}", job_config=config
+        ).result()
+
+
+def run(
+    day: dt.date,
+    out: Path = SCORE_DIR,
+    table: str = SCORE_TABLE,
+    workers: int = WORKERS,
+    chunk_rows: int = CHUNK_ROWS,
+    artifact_dir: Path = ARTIFACT_DIR,
+) -> dict:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    loaded = ml_serving.ModelStore(artifact_dir).reload()
+    if loaded is None:
+        raise RuntimeError(f"no model artifacts in {artifact_dir}; run train_explain")
+    print(f"[batch_score] model {loaded.name} ({loaded.version}), {workers} worker(s)")
+
+    source, batches = feature_batches()
+    print(f"[batch_score] scoring {source} for {day}")
+
+    partition = Path(out) / day.isoformat()
+    staging = partition.with_name(partition.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    client = get_registry().client(PROJECT_ID) if table else None
+    if workers > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(artifact_dir), loaded.version),
+        )
+    else:
+        _init_worker(str(artifact_dir), loaded.version)
+        pool = None
+
+    t0 = time.perf_counter()
+    rows = parts = 0
+    in_flight: collections.deque = collections.deque()
+
+    def write(user_ids: np.ndarray, fut) -> None:
+        nonlocal rows, parts
+        scores = fut.result() if pool is not None else fut
+        part = pa.table(
+            {
+                "user_id": pa.array(user_ids),
+                "score": pa.array(np.asarray(scores, dtype=np.float64)),
+                "model_version": pa.array([loaded.version] * len(user_ids)),
+                "model_name": pa.array([loaded.name] * len(user_ids)),
+                "scored_date": pa.array([day] * len(user_ids), type=pa.date32()),
+            }
+        )
+        path = staging / f"part-{parts:05d}.parquet"
+        pq.write_table(part, path, compression="zstd")
+        if client is not None:
+            _load_part(client, table, day, path, first=parts == 0)
+        parts += 1
+        rows += len(user_ids)
+        print(f"[batch_score] {rows} users scored")
+
+    try:
+        for df in chunks(batches, chunk_rows):
+            user_ids = df["user_id"].to_numpy()
+            X = features_matrix(df, loaded.columns)
+            del df
+            if pool is None:
+                write(user_ids, _score(X))
+                continue
+            in_flight.append((user_ids, pool.submit(_score, X)))
+            # bounded: wait for the oldest chunk (keeps the output in order)
+            if len(in_flight) >= 2 * workers:
+                write(*in_flight.popleft())
+        while in_flight:
+            write(*in_flight.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    shutil.rmtree(partition, ignore_errors=True)
+    staging.replace(partition)
+    elapsed = time.perf_counter() - t0
+    summary = {
+        "scored_date": day.isoformat(),
+        "rows": rows,
+        "parts": parts,
+        "model": loaded.name,
+        "model_version": loaded.version,
+        "output": str(partition),
+        "table": table or None,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(f"[batch_score] done: {summary}")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Score every user with the saved model."
+    )
+    parser.add_argument("--date", type=dt.date.fromisoformat, default=dt.date.today())
+    parser.add_argument("--out", type=Path, default=SCORE_DIR)
+    parser.add_argument("--table", default=SCORE_TABLE, help="BigQuery output table")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    run(args.date, args.out, args.table, args.workers, args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# backend/bq_pool.py
+"""
+Process-wide BigQuery client registry.
+
+Building a client means decoding the service account, exchanging a token and
+opening a fresh HTTP session. We do that once per (project, credentials) pair
+and share the client: its AuthorizedSession keeps a pooled keep-alive
+connection set and refreshes the OAuth token in place when it expires.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from google.cloud import bigquery
+
+POOL_SIZE = int(os.getenv("EXECKPI_BQ_POOL_SIZE", "32"))
+
+ClientKey = Tuple[str, str]
+
+
+def _credentials_fingerprint() -> str:
+    """Identify the active credentials without decoding them."""
+    b64_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+    if not b64_creds:
+        return "default"
+    return "sa:" + hashlib.sha256(b64_creds.encode("utf-8")).hexdigest()[:16]
+
+
+def build_client(project: str) -> bigquery.Client:
+    """
+    Build a BigQuery client with a pooled HTTP session.
+
+    If GOOGLE_APPLICATION_CREDENTIALS_JSON is present (base64-encoded), the
+    service account in it is used (Render). Otherwise default creds (local dev).
+    """
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2 import service_account
+    from requests.adapters import HTTPAdapter
+
+    b64_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+    if b64_creds:
+        info = json.loads(base64.b64decode(b64_creds))
+        creds = service_account.Credentials.from_service_account_info(
+            info, scopes=bigquery.Client.SCOPE
+        )
+    else:
+        creds, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    return bigquery.Client(project=project, credentials=creds, _http=session)
+
+
+def build_storage_client(client: bigquery.Client):
+    """BigQuery Storage read client sharing the REST client's credentials."""
+    from google.cloud import bigquery_storage
+
+    return bigquery_storage.BigQueryReadClient(credentials=client._credentials)
+
+
+class _Entry:
+    def __init__(self, client: bigquery.Client):
+        self.client = client
+        self.storage = None
+        self.created_at = time.time()
+        self.uses = 0
+
+
+class ClientRegistry:
+    """Thread-safe map of (project, credentials) -> shared BigQuery client."""
+
+    def __init__(self, factory: Callable[[str], bigquery.Client] = build_client):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._entries: Dict[ClientKey, _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def client(self, project: str) -> bigquery.Client:
+        key = (project, _credentials_fingerprint())
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = _Entry(self._factory(project))
+                    self._entries[key] = entry
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        else:
+            self.hits += 1
+        entry.uses += 1
+        return entry.client
+
+    def storage_client(self, project: str):
+        """Shared Storage read client (gRPC) for Arrow downloads."""
+        self.client(project)
+        entry = self._entries[(project, _credentials_fingerprint())]
+        if entry.storage is None:
+            with self._lock:
+                if entry.storage is None:
+                    entry.storage = build_storage_client(entry.client)
+        return entry.storage
+
+    def close(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            try:
+                entry.client.close()
+                if entry.storage is not None:
+                    entry.storage.transport.close()
+            except Exception as e:  # noqa: BLE001
+                print(f"[bq_pool] close failed: {e}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        clients = []
+        for (project, creds), entry in list(self._entries.items()):
+            clients.append(
+                {
+                    "project": project,
+                    "credentials": creds.split(":", 1)[0],
+                    "age_s": round(now - entry.created_at, 1),
+                    "uses": entry.uses,
+                    "storage_client": entry.storage is not None,
+                    **_http_pool_stats(entry.client),
+                }
+            )
+        return {
+            "clients": clients,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pool_size": POOL_SIZE,
+        }
+
+
+def _http_pool_stats(client: bigquery.Client) -> dict:
+    """Summarise the urllib3 pools behind the client's session, if any."""
+    session = getattr(client, "_http_internal", None)
+    adapter = getattr(session, "adapters", {}).get("https://")
+    manager = getattr(adapter, "poolmanager", None)
+    if manager is None:
+        return {}
+    pools = [manager.pools[k] for k in list(manager.pools.keys())]
+    return {
+        "http_pools": len(pools),
+        "http_connections": sum(getattr(p, "num_connections", 0) for p in pools),
+        "http_requests": sum(getattr(p, "num_requests", 0) for p in pools),
+    }
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ClientRegistry:
+    """Return the process-wide registry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry()
+    return _registry
+
+
+def close_registry() -> None:
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        registry.close()
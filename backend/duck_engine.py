@@ -0,0 +1,313 @@
+# backend/duck_engine.py
+"""
+Local DuckDB query engine (EXECKPI_ENGINE=duckdb).
+
+BigQuery stays the production engine. With the DuckDB engine the KPI
+endpoints and the trainer run against a local Parquet extract of the thelook
+tables instead (see backend/duck_extract.py):
+
+    <EXECKPI_DUCKDB_DATA>/{users,orders,order_items,events}.parquet
+
+On first use the Parquet files are exposed as `thelook.*` views. Then the
+DuckDB translations of the dbt models (dbt_project/duckdb/NN_<model>.sql)
+are created in an `execkpi_execkpi` schema, so `sql/api_*.sql` resolves the
+same table names as on BigQuery. The API queries are translated on the fly:
+backticks and project prefixes are dropped, and `@param` becomes `$param`.
+Macros cover the BigQuery functions the queries use (DATE, COUNTIF,
+SAFE_DIVIDE).
+"""
+
+import base64
+import datetime as dt
+import decimal
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ENGINE = os.getenv("EXECKPI_ENGINE", "bigquery").strip().lower()
+DATA_DIR = Path(os.getenv("EXECKPI_DUCKDB_DATA", str(REPO_ROOT / "data" / "thelook")))
+DB_PATH = os.getenv("EXECKPI_DUCKDB_PATH", ":memory:")
+MODELS_DIR = REPO_ROOT / "dbt_project" / "duckdb"
+# gold models as tables (computed once per refresh) instead of views
+MATERIALIZE = os.getenv("EXECKPI_DUCKDB_MATERIALIZE", "0") in {"1", "true", "yes"}
+THREADS = int(os.getenv("EXECKPI_DUCKDB_THREADS", "0"))  # 0 = DuckDB default
+
+SOURCE_TABLES = ("users", "orders", "order_items", "events")
+SCHEMA = "execkpi_execkpi"
+
+_MACROS = (
+    "CREATE OR REPLACE MACRO date(x) AS CAST(x AS DATE)",
+    "CREATE OR REPLACE MACRO countif(x) AS count_if(x)",
+    "CREATE OR REPLACE MACRO safe_divide(a, b) AS"
+    " CASE WHEN b = 0 THEN NULL ELSE a / b END",
+    # BigQuery TIMESTAMP_DIFF(a, b, DAY): whole 24h periods
+    "CREATE OR REPLACE MACRO timestamp_diff_day(a, b) AS"
+    " CAST(trunc(epoch(CAST(a AS TIMESTAMP) - CAST(b AS TIMESTAMP)) / 86400)"
+    " AS BIGINT)",
+)
+
+_BACKTICK = re.compile(r"`([^`]*)`")
+_PROJECT = re.compile(rf"\b[\w-]+\.({SCHEMA}\.)")
+_PARAM = re.compile(r"(?<![@\w])@(\w+)")
+_MODEL_FILE = re.compile(r"^\d+_(\w+)\.sql$")
+
+
+def is_local() -> bool:
+    return ENGINE == "duckdb"
+
+
+def translate(sql: str) -> str:
+    """BigQuery-flavoured API SQL -> DuckDB SQL."""
+    sql = _BACKTICK.sub(r"\1", sql)
+    sql = _PROJECT.sub(r"\1", sql)
+    sql = _PARAM.sub(r"$\1", sql)
+    return sql.strip().rstrip(";")
+
+
+def _param_value(p: dict) -> Any:
+    value = p.get("value")
+    if value is None:
+        return None
+    if p["type"] == "DATE":
+        return dt.date.fromisoformat(value)
+    if p["type"] == "TIMESTAMP":
+        return dt.datetime.fromisoformat(value)
+    if p["type"] == "NUMERIC":
+        return decimal.Decimal(value)
+    return value
+
+
+def _bind(sql: str, params: List[dict]) -> Optional[Dict[str, Any]]:
+    # DuckDB rejects named params the statement does not use
+    used = set(re.findall(r"\$(\w+)", sql))
+    bound = {p["name"]: _param_value(p) for p in params if p["name"] in used}
+    return bound or None
+
+
+def encode_offset(sql: str, offset: int, total: int) -> str:
+    raw = json.dumps(
+        {"o": offset, "t": total, "q": hashlib.sha256(sql.encode()).hexdigest()[:16]}
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_offset(token: str, sql: str) -> Tuple[int, int]:
+    """(offset, total_rows) from a page token issued for `sql`."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        offset, total = int(data["o"]), int(data["t"])
+    except Exception as e:  # noqa: BLE001
+        raise ValueError("malformed page_token") from e
+    if data.get("q") != hashlib.sha256(sql.encode()).hexdigest()[:16] or offset < 0:
+        raise ValueError("page_token belongs to a different query")
+    return offset, total
+
+
+class _Rows:
+    """Adapter so kpi_results.ndjson_lines can stream a DuckDB cursor."""
+
+    def __init__(self, cursor, page_size: int):
+        self.schema = [_Field(d[0]) for d in cursor.description]
+        self.total_rows = None
+        self._cursor = cursor
+        self._page_size = page_size
+
+    @property
+    def pages(self) -> Iterator[list]:
+        while True:
+            rows = self._cursor.fetchmany(self._page_size)
+            if not rows:
+                return
+            yield rows
+
+
+class _Field:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class DuckDBEngine:
+    def __init__(
+        self,
+        data_dir: Path = DATA_DIR,
+        db_path: str = DB_PATH,
+        models_dir: Path = MODELS_DIR,
+        materialize: bool = MATERIALIZE,
+    ):
+        self.data_dir = Path(data_dir)
+        self.db_path = db_path
+        self.models_dir = Path(models_dir)
+        self.materialize = materialize
+        self._conn = None
+        self._lock = threading.Lock()
+        self.models: List[str] = []
+        self.queries = 0
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+    def _source(self, table: str) -> str:
+        single = self.data_dir / f"{table}.parquet"
+        if single.exists():
+            return f"read_parquet('{single.as_posix()}')"
+        parts = self.data_dir / table
+        if parts.is_dir():
+            return f"read_parquet('{(parts / '*.parquet').as_posix()}')"
+        raise FileNotFoundError(
+            f"no local extract for thelook.{table} under {self.data_dir} "
+            "(run: python -m backend.duck_extract)"
+        )
+
+    def _build(self, conn) -> None:
+        # BigQuery evaluates DATE(timestamp) in UTC
+        conn.execute("SET TimeZone = 'UTC'")
+        for stmt in _MACROS:
+            conn.execute(stmt)
+        conn.execute("CREATE SCHEMA IF NOT EXISTS thelook")
+        conn.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+        for table in SOURCE_TABLES:
+            conn.execute(
+                f"CREATE OR REPLACE VIEW thelook.{table} AS"
+                f" SELECT * FROM {self._source(table)}"
+            )
+        self.models = []
+        for path in sorted(self.models_dir.glob("*.sql")):
+            m = _MODEL_FILE.match(path.name)
+            if not m:
+                continue
+            name = m.group(1)
+            body = path.read_text(encoding="utf-8").strip().rstrip(";")
+            kind = "TABLE" if self.materialize and "silver" not in name else "VIEW"
+            conn.execute(f"CREATE OR REPLACE {kind} {SCHEMA}.{name} AS\n{body}")
+            self.models.append(name)
+        print(f"[duckdb] built {len(self.models)} models from {self.data_dir}")
+
+    def _connection(self):
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    import duckdb
+
+                    config = {"threads": THREADS} if THREADS > 0 else {}
+                    conn = duckdb.connect(self.db_path, config=config)
+                    self._build(conn)
+                    self._conn = conn
+        return self._conn
+
+    def refresh(self) -> None:
+        """Re-create sources and models, e.g. after a new extract."""
+        with self._lock:
+            if self._conn is not None:
+                self._build(self._conn)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # Queries (each call gets its own cursor, so threads do not share one)
+    # ------------------------------------------------------------------
+    def _execute(self, sql: str, params: List[dict], wrap: str = "{}"):
+        """Run `sql`; `wrap` can embed it as a subquery, e.g. to page it."""
+        local_sql = translate(sql)
+        cursor = self._connection().cursor()
+        # newline: the query may end in a -- comment
+        cursor.execute(wrap.format(local_sql + "\n"), _bind(local_sql, params))
+        self.queries += 1
+        return cursor
+
+    def fetch(
+        self,
+        sql: str,
+        params: List[dict],
+        fmt: str = "records",
+        page_size: Optional[int] = None,
+        page_token: Optional[str] = None,
+    ) -> dict:
+        from backend import kpi_results
+
+        if not page_size and not page_token:
+            cursor = self._execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            return kpi_results.tuples_payload(columns, cursor.fetchall(), fmt)
+
+        # only the page is read; the row count is taken once, then carried
+        # in the page token
+        size = int(page_size or kpi_results.MAX_PAGE_SIZE)
+        if page_token:
+            offset, total = decode_offset(page_token, sql)
+        else:
+            offset = 0
+            counted = self._execute(sql, params, "SELECT count(*) FROM ({})")
+            total = counted.fetchone()[0]
+        cursor = self._execute(
+            sql, params, f"SELECT * FROM ({{}}) LIMIT {size} OFFSET {offset}"
+        )
+        columns = [d[0] for d in cursor.description]
+        payload = kpi_results.tuples_payload(columns, cursor.fetchall(), fmt)
+        payload["total_rows"] = total
+        more = offset + size < total
+        payload["next_page_token"] = (
+            encode_offset(sql, offset + size, total) if more else None
+        )
+        return payload
+
+    def fetch_arrow(self, sql: str, params: List[dict]) -> bytes:
+        import pyarrow as pa
+
+        table = self._execute(sql, params).arrow()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def fetch_stream(self, sql: str, params: List[dict], page_size: int) -> _Rows:
+        return _Rows(self._execute(sql, params), page_size)
+
+    def dataframe(self, sql: str, params: Optional[List[dict]] = None):
+        return self._execute(sql, params or []).df()
+
+    def record_batches(
+        self, sql: str, params: Optional[List[dict]] = None, batch_rows: int = 65536
+    ) -> Iterator:
+        """Stream a result as Arrow record batches."""
+        yield from self._execute(sql, params or []).fetch_record_batch(batch_rows)
+
+    def stats(self) -> dict:
+        return {
+            "engine": "duckdb",
+            "data_dir": str(self.data_dir),
+            "db_path": self.db_path,
+            "connected": self._conn is not None,
+            "models": list(self.models),
+            "materialized": self.materialize,
+            "queries": self.queries,
+        }
+
+
+_engine: Optional[DuckDBEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> DuckDBEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = DuckDBEngine()
+    return _engine
+
+
+def close_engine() -> None:
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.close()
@@ -0,0 +1,94 @@
+# backend/duck_extract.py
+"""
+Export the thelook source tables to Parquet for the local DuckDB engine.
+
+    python -m backend.duck_extract --out data/thelook --sample-pct 10
+
+Writes <out>/{users,orders,order_items,events}.parquet. With --sample-pct the
+extract keeps a deterministic slice of users (FARM_FINGERPRINT(user id) mod
+100) and only their orders, items and events, so every model stays
+consistent on the smaller extract.
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+try:
+    from backend.bq_pool import get_registry
+    from backend.duck_engine import DATA_DIR, SOURCE_TABLES
+except ImportError:  # run as a script: python backend/duck_extract.py
+    from bq_pool import get_registry
+    from duck_engine import DATA_DIR, SOURCE_TABLES
+
+PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("GCP_PROJECT", "exec-kpi"))
+SOURCE = "bigquery-public-data.thelook_ecommerce"
+
+# user id column per table
+_USER_COLUMN = {
+    "users": "id",
+    "orders": "user_id",
+    "order_items": "user_id",
+    "events": "user_id",
+}
+
+
+def extract_sql(table: str, sample_pct: int = 100) -> str:
+    sql = f"SELECT * FROM `{SOURCE}.{table}`"
+    if sample_pct < 100:
+        col = _USER_COLUMN[table]
+        sql += (
+            f"\nWHERE {col} IS NOT NULL"
+            f" AND MOD(ABS(FARM_FINGERPRINT(CAST({col} AS STRING))), 100)"
+            f" < {sample_pct}"
+        )
+    return sql
+
+
+def extract(out: Path = DATA_DIR, sample_pct: int = 100) -> dict:
+    import pyarrow.parquet as pq
+
+    if not 0 < sample_pct <= 100:
+        raise ValueError("sample_pct must be in 1..100")
+    registry = get_registry()
+    client = registry.client(PROJECT_ID)
+    bqstorage = registry.storage_client(PROJECT_ID)
+    out.mkdir(parents=True, exist_ok=True)
+
+    summary = {}
+    for table in SOURCE_TABLES:
+        t0 = time.perf_counter()
+        arrow = (
+            client.query(extract_sql(table, sample_pct))
+            .result()
+            .to_arrow(bqstorage_client=bqstorage)
+        )
+        # write to a temp file first so a failed run never leaves half a table
+        path = out / f"{table}.parquet"
+        tmp = path.with_suffix(".parquet.tmp")
+        pq.write_table(arrow, tmp, compression="zstd")
+        tmp.replace(path)
+        summary[table] = {"rows": arrow.num_rows, "path": str(path)}
+        print(
+            f"[duck_extract] {table}: {arrow.num_rows} rows"
+            f" in {time.perf_counter() - t0:.1f}s -> {path}"
+        )
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--out", type=Path, default=DATA_DIR)
+    parser.add_argument(
+        "--sample-pct",
+        type=int,
+        default=100,
+        help="keep this percentage of users (deterministic)",
+    )
+    args = parser.parse_args()
+    extract(args.out, args.sample_pct)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# backend/feature_loader.py
+"""
+Streaming feature-table loader with a local Parquet cache.
+
+The table is found with `client.get_table` (metadata only, no query job) and
+streamed as Arrow record batches over the BigQuery Storage read API
+(parallel streams, bounded queue). While the batches are streamed they are
+also written to
+
+    <EXECKPI_FEATURE_CACHE_DIR>/<table>@<last_modified>.parquet
+
+The next run on unchanged data reads that file batch by batch, with no
+BigQuery traffic. A new `last_modified` (e.g. after a dbt run) gives a new
+key. The stale file is then removed once the new one is complete. Logical
+views have no reliable change stamp, so they are streamed through a query
+job and not cached.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+CACHE_DIR = os.getenv("EXECKPI_FEATURE_CACHE_DIR", "artifacts/feature_cache").strip()
+BATCH_ROWS = int(os.getenv("EXECKPI_FEATURE_BATCH_ROWS", "65536"))  # cache reads
+MAX_STREAMS = int(os.getenv("EXECKPI_FEATURE_STREAMS", "0"))  # 0 = server decides
+MAX_QUEUE = int(os.getenv("EXECKPI_FEATURE_QUEUE", "8"))  # pages held in memory
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+
+def find_table(client: bigquery.Client, candidates: List[str]) -> bigquery.Table:
+    """First candidate that exists (metadata lookup only)."""
+    for table_fq in filter(None, candidates):
+        print(f"[feature_loader] -> trying {table_fq}")
+        try:
+            table = client.get_table(table_fq)
+        except NotFound:
+            print(f"[feature_loader]    not found: {table_fq}")
+            continue
+        except Exception as e:  # noqa: BLE001
+            # e.g. Forbidden or a malformed id: try the next candidate
+            print(f"[feature_loader]    error probing {table_fq}: {e}")
+            continue
+        print(
+            f"[feature_loader] using {table_fq} ({table.table_type},"
+            f" {table.num_rows if table.num_rows is not None else '?'} rows)"
+        )
+        return table
+    raise RuntimeError(
+        "Could not find features_conversion in any known dataset.\n"
+        "Run: dbt build (writes to exec-kpi:execkpi_execkpi) or set EXECKPI_FEATURE_TABLE."
+    )
+
+
+def table_fq(table: bigquery.Table) -> str:
+    return f"{table.project}.{table.dataset_id}.{table.table_id}"
+
+
+def cache_path(table: bigquery.Table, cache_dir: str = CACHE_DIR) -> Optional[Path]:
+    if not cache_dir or table.table_type == "VIEW" or table.modified is None:
+        return None
+    stamp = table.modified.strftime("%Y%m%dT%H%M%S%fZ")
+    return Path(cache_dir) / f"{_UNSAFE.sub('_', table_fq(table))}@{stamp}.parquet"
+
+
+def _download(client: bigquery.Client, storage, table: bigquery.Table):
+    if table.table_type == "VIEW":
+        rows = client.query(f"SELECT * FROM `{table_fq(table)}`").result()
+    else:
+        rows = client.list_rows(table)
+    return rows.to_arrow_iterable(
+        bqstorage_client=storage,
+        max_queue_size=MAX_QUEUE,
+        max_stream_count=MAX_STREAMS or None,
+    )
+
+
+def iter_batches(
+    client: bigquery.Client,
+    storage,
+    table: bigquery.Table,
+    cache_dir: str = CACHE_DIR,
+) -> Iterator:
+    """Yield pyarrow RecordBatches of the table, from the cache when fresh."""
+    import pyarrow.parquet as pq
+
+    path = cache_path(table, cache_dir)
+    if path is not None and path.exists():
+        print(f"[feature_loader] cache hit: {path}")
+        yield from pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS)
+        return
+
+    print(f"[feature_loader] streaming {table_fq(table)} via the Storage API")
+    if path is None:
+        yield from _download(client, storage, table)
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    writer = None
+    rows = 0
+    try:
+        for batch in _download(client, storage, table):
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, batch.schema, compression="zstd")
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            yield batch
+        if writer is None:
+            return  # empty table: nothing worth caching
+        writer.close()
+        writer = None
+        tmp.replace(path)
+        print(f"[feature_loader] cached {rows} rows -> {path}")
+        prefix = path.name.split("@", 1)[0] + "@"
+        for old in path.parent.glob(prefix + "*.parquet"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    finally:
+        # a failed or abandoned download never leaves a partial cache file
+        if writer is not None:
+            writer.close()
+        tmp.unlink(missing_ok=True)
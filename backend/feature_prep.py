@@ -0,0 +1,196 @@
+# backend/feature_prep.py
+"""
+Vectorized feature coercion for the trainer.
+
+Feature tables can contain numbers, numeric strings ("1.5", "[1.5]"),
+repeated fields (lists or arrays, where the first element is used) and NULLs.
+`coerce_features` finds each column's physical type once and converts the
+whole column with pandas/NumPy bulk operations. Missing or unparsable cells
+become 0.0. Columns are stored as float32 when the round trip keeps the
+values: integer columns must stay exact, others within FLOAT32_RTOL relative
+error. Otherwise they stay float64.
+
+`coerce_cell` is the scalar reference with the same rules. It is only used by
+tests and for one-off values.
+"""
+
+import decimal
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_bool_dtype, is_numeric_dtype
+
+FLOAT32_RTOL = float(os.getenv("EXECKPI_FLOAT32_RTOL", "1e-6"))
+
+_NUMBER = (int, float, np.integer, np.floating, decimal.Decimal)
+_SEQUENCE = (list, tuple, np.ndarray)
+_NUMERIC_KINDS = {"integer", "floating", "mixed-integer-float", "decimal", "boolean"}
+
+
+def coerce_cell(v: Any) -> float:
+    if v is None:
+        return 0.0
+    if isinstance(v, _SEQUENCE):
+        return coerce_cell(v[0]) if len(v) else 0.0
+    if isinstance(v, _NUMBER):
+        out = float(v)
+    elif isinstance(v, str):
+        s = v.strip()
+        if s.startswith("[") and s.endswith("]"):
+            s = s[1:-1].strip()
+        try:
+            out = float(s)
+        except ValueError:
+            return 0.0
+    else:
+        return 0.0
+    return 0.0 if np.isnan(out) else out
+
+
+def _parse_strings(s: pd.Series) -> pd.Series:
+    # to_numeric already skips surrounding whitespace; only the cells it
+    # rejects get the (slower) bracket handling
+    values = pd.to_numeric(s, errors="coerce")
+    retry = (values.isna() & s.notna()).to_numpy()
+    if retry.any():
+        rest = s[retry].str.strip()
+        bracketed = rest.str.startswith("[") & rest.str.endswith("]")
+        rest = rest.where(bracketed, None).str[1:-1]
+        values[retry] = pd.to_numeric(rest, errors="coerce").to_numpy()
+    return values
+
+
+def _numbers(s: pd.Series) -> pd.Series:
+    # Decimal/bool objects are not accepted by every to_numeric path
+    if s.dtype == object:
+        return pd.Series(s.to_numpy(dtype=float, na_value=np.nan), index=s.index)
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _coerce_object(s: pd.Series) -> Tuple[pd.Series, int]:
+    """Object column -> float64 values (NaN = missing/unparsable), cells parsed."""
+    kind = infer_dtype(s, skipna=True)
+    if kind in _NUMERIC_KINDS:
+        return _numbers(s), 0
+    if kind in {"string", "empty"}:
+        values = _parse_strings(s)
+        return values, int(values.notna().sum())
+
+    # mixed column: one pass for the cell types, then one bulk op per type
+    types = s.map(type)
+    out = pd.Series(np.nan, index=s.index)
+    parsed = 0
+    for t in types.unique():
+        mask = (types == t).to_numpy()
+        part = s[mask]
+        if issubclass(t, _NUMBER):
+            out[mask] = _numbers(part.astype(object)).to_numpy()
+        elif issubclass(t, str):
+            values = _parse_strings(part)
+            out[mask] = values.to_numpy()
+            parsed += int(values.notna().sum())
+        elif issubclass(t, _SEQUENCE):
+            first = part.map(lambda v: v[0] if len(v) else None)
+            values, _ = _coerce_object(first.astype(object))
+            out[mask] = values.to_numpy()
+            parsed += int(values.notna().sum())
+    return out, parsed
+
+
+def _to_float(s: pd.Series) -> Tuple[np.ndarray, dict]:
+    """One column -> (float64 array with 0.0 for missing, report entry)."""
+    nulls = int(s.isna().sum())
+    if is_bool_dtype(s.dtype) or is_numeric_dtype(s.dtype):
+        values = s.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        kind, parsed = str(s.dtype), 0
+    else:
+        series, parsed = _coerce_object(s)
+        values = series.to_numpy(dtype=np.float64)
+        kind = infer_dtype(s, skipna=True)
+
+    missing = np.isnan(values)
+    zeroed = int(missing.sum())
+    values[missing] = 0.0
+    report = {
+        "dtype": str(s.dtype),
+        "kind": kind,
+        "nulls": nulls,
+        "coerced": parsed,
+        "failed": zeroed - nulls,
+    }
+    return values, report
+
+
+def _compact(values: np.ndarray) -> Tuple[np.ndarray, bool]:
+    finite = values[np.isfinite(values)]
+    f32 = finite.astype(np.float32)
+    if np.array_equal(finite, np.round(finite)):
+        # counts and ids must stay exact integers
+        safe = bool(np.array_equal(f32, finite))
+    else:
+        safe = bool(
+            np.all(np.isfinite(f32))
+            and np.allclose(f32, finite, rtol=FLOAT32_RTOL, atol=0.0)
+        )
+    return (values.astype(np.float32) if safe else values), safe
+
+
+def coerce_column(s: pd.Series) -> Tuple[np.ndarray, dict]:
+    """One column -> (float array, report entry)."""
+    values, report = _to_float(s)
+    values, report["float32"] = _compact(values)
+    return values, report
+
+
+def coerce_features(
+    df: pd.DataFrame, columns: List[str]
+) -> Tuple[pd.DataFrame, Dict[str, dict]]:
+    """
+    Coerce `columns` of `df` to a compact float frame (float32 where safe).
+    Returns (frame, report). The report has one entry per column: nulls,
+    coerced (string/array cells parsed), failed (non-null cells that became
+    0.0) and float32.
+    """
+    arrays, report = {}, {}
+    for col in columns:
+        arrays[col], report[col] = coerce_column(df[col])
+    return pd.DataFrame(arrays, index=df.index), report
+
+
+def coerce_batches(
+    batches: Iterable[pd.DataFrame], keep: Iterable[str] = ()
+) -> Tuple[pd.DataFrame, Dict[str, dict]]:
+    """
+    Same as coerce_features over a stream of row batches. Each batch is
+    coerced (and its raw cells dropped) before the next one is read, so peak
+    memory is the float columns plus one raw batch. Columns in `keep` are
+    passed through. The float32 decision is made once per whole column.
+    """
+    keep = list(keep)
+    columns: List[str] = []
+    parts: Dict[str, List[np.ndarray]] = {}
+    kept: List[pd.DataFrame] = []
+    report: Dict[str, dict] = {}
+    for batch in batches:
+        if not columns:
+            columns = [c for c in batch.columns if c not in keep]
+            parts = {c: [] for c in columns}
+        kept.append(batch[[c for c in keep if c in batch.columns]])
+        for col in columns:
+            values, entry = _to_float(batch[col])
+            parts[col].append(values)
+            if col in report:
+                for k in ("nulls", "coerced", "failed"):
+                    report[col][k] += entry[k]
+            else:
+                report[col] = entry
+
+    arrays = {}
+    for col in columns:
+        arrays[col], report[col]["float32"] = _compact(np.concatenate(parts.pop(col)))
+    frame = pd.DataFrame(arrays)
+    if kept:
+        frame = pd.concat([pd.concat(kept, ignore_index=True), frame], axis=1)
+    return frame, report
@@ -0,0 +1,268 @@
+# backend/kpi_cache.py
+"""
+Result cache for /kpi/query.
+
+Entries are keyed by the SQL text hash plus the bound params and carry a
+freshness token built from the `last_modified` time of every dataset table the
+query reads. A changed token, an expired TTL or an explicit invalidation (the
+execkpi_daily DAG calls it after `dbt run`) turns a lookup into a miss.
+
+Two backends: an in-process LRU (default) and a SQLite file that survives
+restarts and is shared by every worker on the box.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+CACHE_MODE = os.getenv("EXECKPI_KPI_CACHE", "memory").strip().lower()
+CACHE_TTL_S = float(os.getenv("EXECKPI_KPI_CACHE_TTL", "900"))
+CACHE_MAX_ENTRIES = int(os.getenv("EXECKPI_KPI_CACHE_MAX", "256"))
+CACHE_PATH = Path(os.getenv("EXECKPI_KPI_CACHE_PATH", "artifacts/kpi_cache.sqlite"))
+FRESHNESS_CHECK_S = float(os.getenv("EXECKPI_FRESHNESS_CHECK_S", "60"))
+
+# (payload, created_at, freshness)
+Entry = Tuple[Any, float, str]
+
+
+def cache_key(sql: str, params: List[dict], variant: str = "") -> str:
+    """
+    Hash of the SQL text plus the params, independent of param order.
+
+    `variant` separates differently shaped results of the same query (pages).
+    """
+    sql_hash = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+    canon = json.dumps(
+        sorted(params, key=lambda p: str(p.get("name"))),
+        sort_keys=True,
+        default=str,
+    )
+    params_hash = hashlib.sha256(canon.encode("utf-8")).hexdigest()
+    key = f"{sql_hash[:32]}:{params_hash[:16]}"
+    return f"{key}:{variant}" if variant else key
+
+
+def referenced_tables(sql: str, dataset: str) -> List[str]:
+    """`dataset.table` names the query reads (project prefix is dropped)."""
+    pattern = re.compile(
+        rf"(?:[\w-]+\.)?\b{re.escape(dataset)}\.(\w+)", flags=re.IGNORECASE
+    )
+    return sorted({f"{dataset}.{t}" for t in pattern.findall(sql)})
+
+
+# --------------------------------------------------------------------------
+# Backends
+# --------------------------------------------------------------------------
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: Entry) -> int:
+        """Store an entry and return how many entries were evicted."""
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBackend:
+    def __init__(self, path: Path, max_entries: int):
+        self.max_entries = max_entries
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kpi_cache ("
+            " key TEXT PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL,"
+            " freshness TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at, freshness FROM kpi_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE kpi_cache SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+        return json.loads(row[0]), row[1], row[2]
+
+    def put(self, key: str, entry: Entry) -> int:
+        payload, created_at, freshness = entry
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kpi_cache VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(payload), created_at, freshness, time.time()),
+            )
+            cur = self._conn.execute(
+                "DELETE FROM kpi_cache WHERE key IN ("
+                " SELECT key FROM kpi_cache ORDER BY last_access DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            return max(cur.rowcount, 0)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kpi_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kpi_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM kpi_cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# --------------------------------------------------------------------------
+# Cache
+# --------------------------------------------------------------------------
+class ResultCache:
+    def __init__(self, backend, ttl_s: float = CACHE_TTL_S):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.last_invalidated_at: Optional[float] = None
+
+    def get(self, key: str, freshness: str) -> Optional[Tuple[Any, float]]:
+        """Return (payload, age_s) if the entry is live and still fresh."""
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, created_at, entry_freshness = entry
+        age = time.time() - created_at
+        if age > self.ttl_s or entry_freshness != freshness:
+            self.backend.delete(key)
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload, age
+
+    def put(self, key: str, payload: Any, freshness: str) -> None:
+        self.evictions += self.backend.put(key, (payload, time.time(), freshness))
+
+    def invalidate(self) -> None:
+        self.backend.clear()
+        self.invalidations += 1
+        self.last_invalidated_at = time.time()
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "last_invalidated_at": self.last_invalidated_at,
+        }
+
+
+class TableFreshness:
+    """
+    Memoised `last_modified` lookups for the tables a query reads.
+
+    Each table is re-checked with a metadata call at most every `check_s`
+    seconds, so the token costs nothing on most requests. Failed lookups are
+    not memoised: the token is None until the table can be read, and callers
+    skip the cache for that request.
+    """
+
+    def __init__(self, check_s: float = FRESHNESS_CHECK_S):
+        self.check_s = check_s
+        self._seen: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def token(
+        self, get_table: Callable[[str], Any], tables: List[str]
+    ) -> Optional[str]:
+        now = time.time()
+        parts = []
+        for table in tables:
+            with self._lock:
+                seen = self._seen.get(table)
+            if seen is None or now - seen[1] > self.check_s:
+                try:
+                    modified = get_table(table).modified
+                except Exception as e:  # noqa: BLE001
+                    print(f"[kpi_cache] freshness of {table} unknown: {e}")
+                    return None
+                stamp = modified.isoformat() if modified else "none"
+                seen = (stamp, now)
+                with self._lock:
+                    self._seen[table] = seen
+            parts.append(f"{table}={seen[0]}")
+        return ";".join(parts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._seen.clear()
+
+
+def from_env() -> Optional[ResultCache]:
+    """Build the cache configured by EXECKPI_KPI_CACHE (memory|sqlite|off)."""
+    if CACHE_MODE in {"off", "none", "0", "false"}:
+        return None
+    if CACHE_MODE == "sqlite":
+        return ResultCache(SqliteBackend(CACHE_PATH, CACHE_MAX_ENTRIES))
+    return ResultCache(MemoryBackend(CACHE_MAX_ENTRIES))
@@ -0,0 +1,224 @@
+# backend/kpi_exec.py
+"""
+Non-blocking BigQuery execution for the KPI endpoints.
+
+A query is submitted from a worker thread, then polled with short HTTP calls
+while the event loop sleeps in between, so no thread is parked on a running
+job. Every query gets a deadline; on timeout or cancellation the BigQuery job
+itself is cancelled. A semaphore caps how many jobs one worker keeps in
+flight.
+
+SingleFlight sits in front of the executor: identical concurrent requests
+share one running job, and the job is only cancelled once every caller has
+gone away.
+"""
+
+import asyncio
+import math
+import os
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+from google.cloud import bigquery
+
+from backend import metrics
+
+QUERY_TIMEOUT_S = float(os.getenv("EXECKPI_KPI_TIMEOUT_S", "60"))
+MAX_CONCURRENCY = int(os.getenv("EXECKPI_KPI_MAX_CONCURRENCY", "16"))
+POLL_INITIAL_S = 0.05
+POLL_MAX_S = 1.0
+DISCONNECT_POLL_S = 0.25
+
+T = TypeVar("T")
+
+
+def parse_timeout(value) -> Optional[float]:
+    """A request's `timeout_s`: None, or a positive number of seconds."""
+    if value is None:
+        return None
+    try:
+        timeout_s = float(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError("timeout_s must be a number of seconds") from e
+    if not (math.isfinite(timeout_s) and timeout_s > 0):
+        raise ValueError("timeout_s must be a positive number of seconds")
+    return timeout_s
+
+
+class QueryTimeout(Exception):
+    """The query did not finish (or start) before its deadline."""
+
+
+class QueryAbandoned(Exception):
+    """The caller went away while the query was running."""
+
+
+def _cancel_job(job: bigquery.QueryJob) -> None:
+    try:
+        job.cancel()
+    except Exception as e:  # noqa: BLE001
+        print(f"[kpi_exec] cancel of job {job.job_id} failed: {e}")
+
+
+class QueryExecutor:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+
+    def _limiter(self) -> asyncio.Semaphore:
+        # semaphores belong to one event loop; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._sem
+
+    async def run(
+        self,
+        client: bigquery.Client,
+        sql: str,
+        job_config: bigquery.QueryJobConfig,
+        fetch: Callable[[bigquery.QueryJob], T],
+        timeout_s: Optional[float] = None,
+    ) -> T:
+        """
+        Run `sql` and return `fetch(job)` once the job is done.
+
+        `fetch` runs in a worker thread and does the row download/conversion.
+        A caller-supplied `timeout_s` can only tighten the server default.
+        The queue, bq_job and fetch stages are timed for the current request
+        (backend/metrics.py) and the job's statistics are recorded.
+        """
+        loop = asyncio.get_running_loop()
+        timeout_s = (
+            min(float(timeout_s), QUERY_TIMEOUT_S) if timeout_s else QUERY_TIMEOUT_S
+        )
+        deadline = loop.time() + timeout_s
+        sem = self._limiter()
+
+        self.queued += 1
+        try:
+            with metrics.stage("queue"):
+                await asyncio.wait_for(sem.acquire(), timeout=timeout_s)
+        except asyncio.TimeoutError as e:
+            self.timed_out += 1
+            raise QueryTimeout(f"no free query slot within {timeout_s:g}s") from e
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        job: Optional[bigquery.QueryJob] = None
+        try:
+            with metrics.stage("bq_job"):
+                job = await run_in_threadpool(client.query, sql, job_config=job_config)
+                delay = POLL_INITIAL_S
+                while not await run_in_threadpool(job.done):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise QueryTimeout(f"query exceeded {timeout_s:g}s")
+                    await asyncio.sleep(min(delay, remaining))
+                    delay = min(delay * 2, POLL_MAX_S)
+            metrics.record_bq_job(job)
+            with metrics.stage("fetch"):
+                result = await run_in_threadpool(fetch, job)
+            self.completed += 1
+            return result
+        except QueryTimeout:
+            self.timed_out += 1
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            sem.release()
+            if job is not None and job.state != "DONE":
+                # fire and forget: the caller is already gone or out of time
+                loop.run_in_executor(None, _cancel_job, job)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+        }
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce identical in-flight work onto one task per key."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[T]],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t: self._forget(key, call))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await self._wait(call.task, is_disconnected)
+        except (asyncio.CancelledError, QueryAbandoned):
+            self.abandoned += 1
+            raise
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # last caller left: stop the shared work (cancels the job)
+                call.task.cancel()
+
+    @staticmethod
+    async def _wait(task: "asyncio.Future", is_disconnected) -> T:
+        if is_disconnected is None:
+            return await asyncio.shield(task)
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                raise QueryAbandoned("client went away")
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "in_flight_keys": len(self._calls),
+        }
@@ -0,0 +1,202 @@
+# backend/kpi_results.py
+"""
+Result shaping for /kpi/query.
+
+Rows are read straight off the BigQuery row iterator (no DataFrame copy) and
+delivered as one JSON body, one page at a time, or as an NDJSON stream that
+emits rows as pages arrive.
+
+The body shape is negotiated: `records` (default, one object per row),
+`columnar` (column names once plus one array per column) or Arrow IPC, which
+is downloaded through the BigQuery Storage read API.
+
+Page tokens are opaque cursors over the query's anonymous result table, so a
+follow-up page is a plain `tabledata.list` call and never re-runs the query.
+"""
+
+import base64
+import datetime as dt
+import decimal
+import importlib.util
+import json
+import os
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from google.cloud import bigquery
+
+MAX_PAGE_SIZE = int(os.getenv("EXECKPI_KPI_MAX_PAGE_SIZE", "10000"))
+STREAM_PAGE_SIZE = int(os.getenv("EXECKPI_KPI_STREAM_PAGE_SIZE", "2000"))
+NDJSON = "application/x-ndjson"
+ARROW = "application/vnd.apache.arrow.stream"
+COLUMNAR = "application/vnd.execkpi.columnar+json"
+
+FORMATS = {"records", "columnar", "arrow", "ndjson"}
+JSON_FORMATS = {"records", "columnar"}
+
+
+class BadCursor(ValueError):
+    """A page_token that we did not issue (or that points elsewhere)."""
+
+
+def negotiate(accept: str, requested: Optional[str] = None) -> str:
+    """Pick the response format: explicit `format` field first, then Accept."""
+    if requested:
+        fmt = str(requested).lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {sorted(FORMATS)}")
+        return fmt
+    accept = accept or ""
+    if ARROW in accept:
+        return "arrow"
+    if NDJSON in accept:
+        return "ndjson"
+    if COLUMNAR in accept:
+        return "columnar"
+    return "records"
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _values(row: Any) -> tuple:
+    # BigQuery Row objects expose values(); DuckDB rows are plain tuples
+    return tuple(row.values()) if hasattr(row, "values") else tuple(row)
+
+
+def tuples_payload(columns: List[str], rows: Iterable[Any], fmt: str = "records"):
+    if fmt == "columnar":
+        values = [_values(row) for row in rows]
+        arrays = list(zip(*values, strict=True)) if values else [()] * len(columns)
+        data = {c: list(a) for c, a in zip(columns, arrays, strict=True)}
+        return jsonable_encoder(
+            {
+                "format": "columnar",
+                "rows": len(values),
+                "columns": columns,
+                "data": data,
+            }
+        )
+    data = [dict(zip(columns, _values(row), strict=False)) for row in rows]
+    return jsonable_encoder({"rows": len(data), "columns": columns, "data": data})
+
+
+def rows_payload(schema, rows: Iterable[Any], fmt: str = "records") -> dict:
+    return tuples_payload([f.name for f in schema], rows, fmt)
+
+
+def parse_page_size(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        size = int(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError("page_size must be an integer") from e
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    return size
+
+
+# --------------------------------------------------------------------------
+# Cursors
+# --------------------------------------------------------------------------
+def _table_id(ref: bigquery.TableReference) -> str:
+    return f"{ref.project}.{ref.dataset_id}.{ref.table_id}"
+
+
+def encode_cursor(table: str, token: str) -> str:
+    raw = json.dumps({"t": table, "p": token}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, project: str) -> Tuple[str, str]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        table, token = data["t"], data["p"]
+        proj, dataset, _ = table.split(".")
+    except Exception as e:  # noqa: BLE001
+        raise BadCursor("malformed page_token") from e
+    # only ever page over anonymous query-result tables in our own project
+    if proj != project or not dataset.startswith("_"):
+        raise BadCursor("page_token does not belong to a query result")
+    return table, token
+
+
+# --------------------------------------------------------------------------
+# Fetchers (run in a worker thread once the job is done)
+# --------------------------------------------------------------------------
+def fetch_all(job: bigquery.QueryJob, fmt: str = "records") -> dict:
+    rows = job.result()
+    return rows_payload(rows.schema, rows, fmt)
+
+
+def _page_payload(rows, table: str, fmt: str) -> dict:
+    page = next(iter(rows.pages), None)
+    payload = rows_payload(rows.schema, page if page is not None else [], fmt)
+    token = rows.next_page_token
+    payload["total_rows"] = rows.total_rows
+    payload["next_page_token"] = encode_cursor(table, token) if token else None
+    return payload
+
+
+def fetch_first_page(
+    job: bigquery.QueryJob, page_size: int, fmt: str = "records"
+) -> dict:
+    rows = job.result(page_size=page_size)
+    return _page_payload(rows, _table_id(job.destination), fmt)
+
+
+def fetch_next_page(
+    client: bigquery.Client, cursor: str, page_size: int, fmt: str = "records"
+) -> dict:
+    table, token = decode_cursor(cursor, client.project)
+    rows = client.list_rows(table, page_size=page_size, page_token=token)
+    return _page_payload(rows, table, fmt)
+
+
+def fetch_arrow(job: bigquery.QueryJob, storage_client=None) -> bytes:
+    """Whole result as an Arrow IPC stream, read via the Storage API."""
+    import pyarrow as pa
+
+    table = job.result().to_arrow(bqstorage_client=storage_client)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def fetch_stream(job: bigquery.QueryJob):
+    return job.result(page_size=STREAM_PAGE_SIZE)
+
+
+# --------------------------------------------------------------------------
+# NDJSON
+# --------------------------------------------------------------------------
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, (dt.date, dt.datetime, dt.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode("ascii")
+    return str(obj)
+
+
+def _line(obj: Any) -> bytes:
+    return (json.dumps(obj, default=_json_default) + "\n").encode("utf-8")
+
+
+async def ndjson_lines(rows) -> AsyncIterator[bytes]:
+    """Header line with columns, then one line per row as pages arrive."""
+    columns = [f.name for f in rows.schema]
+    yield _line({"columns": columns, "total_rows": rows.total_rows})
+    pages = iter(rows.pages)
+    while True:
+        page = await run_in_threadpool(next, pages, None)
+        if page is None:
+            break
+        yield b"".join(
+            _line(dict(zip(columns, _values(row), strict=False))) for row in page
+        )
@@ -1,20 +1,61 @@
 # backend/main.py
 
-import base64
-import json
+import asyncio
+import datetime as dt
 import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
 from math import sqrt
 from pathlib import Path
 from typing import Any, List, Optional
 
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from google.cloud import bigquery
-from google.oauth2 import service_account
 from scipy.stats import chi2, norm
 
-app = FastAPI(title="ExecKPI backend")
+from backend import (
+    ab_engine,
+    ab_resample,
+    ab_sequential,
+    artifact_store,
+    bq_pool,
+    duck_engine,
+    kpi_cache,
+    kpi_exec,
+    kpi_results,
+    metrics,
+    ml_explain,
+    ml_jobs,
+    ml_serving,
+    query_governor,
+    sql_registry,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one shared BigQuery client registry per process; closed on shutdown
+    app.state.bq_registry = bq_pool.get_registry()
+    # scan sql/api_*.sql once; later lookups only re-read changed files
+    _sql_registry.load()
+    # serve the current artifacts (if any) from the first request on
+    _model_store.reload()
+    yield
+    bq_pool.close_registry()
+    duck_engine.close_engine()
+    ab_sequential.close_store()
+    _ml_jobs.close()
+    if _kpi_cache is not None:
+        _kpi_cache.close()
+
+
+app = FastAPI(title="ExecKPI backend", lifespan=lifespan)
 
 # CORS: keep relaxed because Vercel/localhost will call this
 app.add_middleware(
@@ -24,6 +65,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# per-route latency, stage timings and X-Request-ID / Server-Timing headers
+app.add_middleware(metrics.RequestMetrics)
 
 # --------------------------------------------------------------------------
 # Config / paths
@@ -32,34 +75,44 @@ PROJECT = os.getenv("GCP_PROJECT", "exec-kpi")
 DATASET = os.getenv("BQ_DATASET", "execkpi_execkpi")  # dbt dataset name
 SQL_DIR = Path(__file__).resolve().parent.parent / "sql"
 
+# the only queries /kpi/query will run (EXECKPI_SQL_HOT_RELOAD=0 to pin)
+_sql_registry = sql_registry.SqlRegistry(SQL_DIR)
+# dry-run estimates, byte caps, latency budgets and job labels per query
+_governor = query_governor.QueryGovernor(_sql_registry)
+
+# KPI result cache (EXECKPI_KPI_CACHE=memory|sqlite|off)
+_kpi_cache = kpi_cache.from_env()
+_freshness = kpi_cache.TableFreshness()
+
+# async BigQuery execution (EXECKPI_KPI_TIMEOUT_S, EXECKPI_KPI_MAX_CONCURRENCY)
+_executor = kpi_exec.QueryExecutor()
+# identical concurrent /kpi/query calls share one BigQuery job
+_single_flight = kpi_exec.SingleFlight()
+
+# /kpi/batch limits
+BATCH_MAX_ITEMS = int(os.getenv("EXECKPI_KPI_BATCH_MAX", "20"))
+BATCH_FANOUT = int(os.getenv("EXECKPI_KPI_BATCH_FANOUT", "8"))
+
 
 def _bq_client() -> bigquery.Client:
     """
-    Return a BigQuery client for the configured project.
+    Return the shared BigQuery client for the configured project.
 
-    If GOOGLE_APPLICATION_CREDENTIALS_JSON is present (base64-encoded),
-    decode it and build credentials from it. This is for Render.
-    Otherwise, fall back to default creds (local dev).
+    Clients live in the process-wide registry (see bq_pool), so credentials
+    are decoded and the HTTP session is opened only on first use.
     """
-    b64_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    if b64_creds:
-        try:
-            info = json.loads(base64.b64decode(b64_creds))
-            creds = service_account.Credentials.from_service_account_info(info)
-            return bigquery.Client(project=PROJECT, credentials=creds)
-        except Exception as e:  # noqa: BLE001
-            raise HTTPException(
-                status_code=500,
-                detail=f"BigQuery client init failed (bad service account): {e}",
-            ) from e
-    # fallback: local machine with gcloud auth
     try:
-        return bigquery.Client(project=PROJECT)
+        return bq_pool.get_registry().client(PROJECT)
     except Exception as e:  # noqa: BLE001
+        reason = (
+            "bad service account"
+            if os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+            else "no default credentials"
+        )
         # surface this as 500 to the caller
         raise HTTPException(
             status_code=500,
-            detail=f"BigQuery client init failed: {e}",
+            detail=f"BigQuery client init failed ({reason}): {e}",
         ) from e
 
 
@@ -88,6 +141,7 @@ def root() -> dict:
         "service": "exec-kpi-backend",
         "project": PROJECT,
         "dataset": DATASET,
+        "engine": duck_engine.ENGINE,
     }
 
 
@@ -96,46 +150,366 @@ def healthz() -> dict:
     return {"status": "ok"}
 
 
+# queue depths are read from the live objects at scrape time
+metrics.KPI_QUERIES.set_function(
+    lambda: {
+        ("running",): _executor.in_flight,
+        ("queued",): _executor.queued,
+    }
+)
+metrics.ML_JOBS.set_function(
+    lambda: {(status,): n for status, n in _ml_jobs.stats()["jobs"].items()}
+)
+
+
+@app.get("/metrics")
+def metrics_endpoint() -> Response:
+    """Prometheus text exposition of this worker's metrics."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # --------------------------------------------------------------------------
 # KPI / SQL runner
 # --------------------------------------------------------------------------
-@app.post("/kpi/query")
-def kpi_query(payload: dict):
+@contextmanager
+def _query_errors(engine: str = "BigQuery"):
+    """Map execution failures onto HTTP errors."""
+    try:
+        yield
+    except HTTPException:
+        raise
+    except kpi_exec.QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=f"{engine} timeout: {e}") from e
+    except kpi_exec.QueryAbandoned as e:
+        # nobody is listening any more; the job is cancelled once all callers
+        # leave. The status only reaches logs and middleware.
+        print(f"[kpi] {engine} query abandoned: {e}")
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except kpi_results.BadCursor as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except query_governor.QueryTooExpensive as e:
+        # rejected on the dry-run estimate: no job was started
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    except FileNotFoundError as e:
+        # local engine without an extract
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except Exception as e:  # noqa: BLE001
+        reasons = {
+            err.get("reason")
+            for err in getattr(e, "errors", None) or []
+            if isinstance(err, dict)
+        }
+        if "bytesBilledLimitExceeded" in reasons:
+            # the estimate was off; BigQuery enforced maximum_bytes_billed
+            raise HTTPException(
+                status_code=422, detail=f"{engine} query over its byte limit: {e}"
+            ) from e
+        raise HTTPException(
+            status_code=500,
+            detail=f"{engine} query failed: {e}",
+        ) from e
+
+
+def _resolve(payload: dict):
+    """Validate sql_file, params, page_size and timeout_s for a KPI query."""
     sql_file = payload.get("sql_file")
     params: List[dict] = payload.get("params") or []
 
     if not sql_file:
         raise HTTPException(status_code=400, detail="sql_file is required")
 
-    file_path = SQL_DIR / sql_file
-    if not file_path.exists():
+    query = _sql_registry.get(sql_file)
+    if query is None:
         raise HTTPException(
             status_code=404,
             detail=f"SQL file {sql_file} not found",
         )
+    try:
+        params = query.bind(params)
+        page_size = kpi_results.parse_page_size(payload.get("page_size"))
+        timeout_s = kpi_exec.parse_timeout(payload.get("timeout_s"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    metrics.set_name(query.name)
+    return query, params, page_size, timeout_s
+
+
+async def _plan(
+    client: bigquery.Client, query: sql_registry.SqlQuery, params: List[dict]
+) -> query_governor.Plan:
+    """What to run on BigQuery: the query, its fallback, or a 422."""
+    with _query_errors():
+        return await run_in_threadpool(_governor.plan, client, query, params)
+
+
+async def _kpi_local(
+    query: sql_registry.SqlQuery, params: List[dict], fmt: str, **page
+) -> Any:
+    """Run a registry query on the local DuckDB engine (EXECKPI_ENGINE=duckdb)."""
+    engine = duck_engine.get_engine()
+    with _query_errors("DuckDB"), metrics.stage("duckdb"):
+        try:
+            if fmt == "arrow":
+                return await run_in_threadpool(engine.fetch_arrow, query.sql, params)
+            if fmt == "ndjson":
+                return await run_in_threadpool(
+                    engine.fetch_stream, query.sql, params, kpi_results.STREAM_PAGE_SIZE
+                )
+            result = await run_in_threadpool(
+                engine.fetch, query.sql, params, fmt, **page
+            )
+        except ValueError as e:
+            # bad page_token
+            raise HTTPException(status_code=400, detail=str(e)) from e
+    return {**result, "cache": {"hit": False, "age_s": 0.0}}
+
+
+async def _kpi_json(payload: dict, fmt: str, is_disconnected=None) -> dict:
+    """Records/columnar JSON result: paged, cached and coalesced."""
+    query, params, page_size, timeout_s = _resolve(payload)
+    page_token = payload.get("page_token")
+    if duck_engine.is_local():
+        return await _kpi_local(
+            query, params, fmt, page_size=page_size, page_token=page_token
+        )
+    client = await run_in_threadpool(_bq_client)
+
+    if page_token:
+        # continue an earlier paged query: read its result table, no new job
+        with _query_errors():
+            result = await run_in_threadpool(
+                kpi_results.fetch_next_page,
+                client,
+                page_token,
+                page_size or kpi_results.MAX_PAGE_SIZE,
+                fmt,
+            )
+        return {**result, "cache": {"hit": False, "age_s": 0.0}}
+
+    if page_size:
+        variant = f"{fmt}:page:{page_size}"
+        fetch = partial(kpi_results.fetch_first_page, page_size=page_size, fmt=fmt)
+    else:
+        variant = "" if fmt == "records" else fmt
+        fetch = partial(kpi_results.fetch_all, fmt=fmt)
+
+    plan = await _plan(client, query, params)
+    key = kpi_cache.cache_key(plan.sql, plan.params, variant)
+    freshness = None
+    if _kpi_cache is not None:
+        with metrics.stage("cache_lookup"):
+            tables = kpi_cache.referenced_tables(plan.sql, DATASET)
+            freshness = await run_in_threadpool(
+                _freshness.token, client.get_table, tables
+            )
+            # unknown freshness: neither serve nor store a cached result
+            # the SQLite backend does file I/O: keep it off the event loop
+            cached = (
+                await run_in_threadpool(_kpi_cache.get, key, freshness)
+                if freshness is not None
+                else None
+            )
+        if freshness is None:
+            result_label = "bypass"
+        else:
+            result_label = "miss" if cached is None else "hit"
+        metrics.KPI_CACHE_LOOKUPS.inc(name=query.name, result=result_label)
+        if cached is not None:
+            data, age = cached
+            return {
+                **data,
+                "cache": {"hit": True, "age_s": round(age, 3)},
+                "governor": plan.info(),
+            }
+
+    async def execute() -> dict:
+        result = await _executor.run(
+            client,
+            plan.sql,
+            plan.job_config(),
+            fetch=fetch,
+            timeout_s=plan.timeout_s(timeout_s),
+        )
+        if _kpi_cache is not None and freshness is not None:
+            await run_in_threadpool(_kpi_cache.put, key, result, freshness)
+        return result
+
+    with _query_errors():
+        result = await _single_flight.do(key, execute, is_disconnected=is_disconnected)
 
-    sql = file_path.read_text(encoding="utf-8")
+    return {
+        **result,
+        "cache": {"hit": False, "age_s": 0.0},
+        "governor": plan.info(),
+    }
 
-    # build query params for BQ
-    bq_params = [
-        bigquery.ScalarQueryParameter(p["name"], p["type"], p["value"]) for p in params
-    ]
 
-    job_config = bigquery.QueryJobConfig(query_parameters=bq_params)
+@app.post("/kpi/query")
+async def kpi_query(payload: dict, request: Request):
+    """
+    Run a KPI query.
 
-    client = _bq_client()
+    Optional paging: `page_size` returns one page plus `next_page_token`;
+    sending that token back fetches the next page without re-running the
+    query.
+
+    The response format follows `format` or the Accept header: records JSON
+    (default), columnar JSON (`application/vnd.execkpi.columnar+json`), an
+    NDJSON stream (`application/x-ndjson`) or Arrow IPC
+    (`application/vnd.apache.arrow.stream`).
+    """
     try:
-        df = client.query(sql, job_config=job_config).result().to_dataframe()
-    except Exception as e:  # noqa: BLE001
+        fmt = kpi_results.negotiate(
+            request.headers.get("accept", ""), payload.get("format")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if fmt in kpi_results.JSON_FORMATS:
+        result = await _kpi_json(payload, fmt, request.is_disconnected)
+        with metrics.stage("serialize"):
+            return JSONResponse(jsonable_encoder(result))
+
+    query, params, page_size, timeout_s = _resolve(payload)
+    if page_size or payload.get("page_token"):
+        raise HTTPException(status_code=400, detail=f"{fmt} responses are not paged")
+    if fmt == "arrow" and not kpi_results.arrow_available():
+        raise HTTPException(status_code=406, detail="pyarrow is not installed")
+
+    if duck_engine.is_local():
+        result = await _kpi_local(query, params, fmt)
+        if fmt == "ndjson":
+            return StreamingResponse(
+                kpi_results.ndjson_lines(result), media_type=kpi_results.NDJSON
+            )
+        return Response(content=result, media_type=kpi_results.ARROW)
+
+    client = await run_in_threadpool(_bq_client)
+    plan = await _plan(client, query, params)
+    timeout_s = plan.timeout_s(timeout_s)
+    headers = {"X-Query-Sql-File": plan.query.name}
+    if plan.downgraded_from:
+        headers["X-Query-Downgraded-From"] = plan.downgraded_from
+
+    if fmt == "ndjson":
+        with _query_errors():
+            rows = await _executor.run(
+                client,
+                plan.sql,
+                plan.job_config(),
+                fetch=kpi_results.fetch_stream,
+                timeout_s=timeout_s,
+            )
+        return StreamingResponse(
+            kpi_results.ndjson_lines(rows),
+            media_type=kpi_results.NDJSON,
+            headers=headers,
+        )
+
+    storage = await run_in_threadpool(bq_pool.get_registry().storage_client, PROJECT)
+
+    async def execute_arrow() -> bytes:
+        return await _executor.run(
+            client,
+            plan.sql,
+            plan.job_config(),
+            fetch=partial(kpi_results.fetch_arrow, storage_client=storage),
+            timeout_s=timeout_s,
+        )
+
+    key = kpi_cache.cache_key(plan.sql, plan.params, "arrow")
+    with _query_errors():
+        body = await _single_flight.do(
+            key, execute_arrow, is_disconnected=request.is_disconnected
+        )
+    return Response(content=body, media_type=kpi_results.ARROW, headers=headers)
+
+
+@app.post("/kpi/batch")
+async def kpi_batch(payload: dict, request: Request):
+    """
+    Run several KPI queries in one request.
+
+    `queries` is a list of /kpi/query payloads (JSON formats only). They run
+    concurrently, at most EXECKPI_KPI_BATCH_FANOUT at a time, and each item
+    reports its own result or error, so one bad tile does not fail the rest.
+    """
+    items = payload.get("queries")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="queries must be a non-empty list")
+    if len(items) > BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=500,
-            detail=f"BigQuery query failed: {e}",
-        ) from e
+            status_code=400, detail=f"at most {BATCH_MAX_ITEMS} queries per batch"
+        )
 
+    fanout = asyncio.Semaphore(BATCH_FANOUT)
+    started = time.perf_counter()
+
+    async def run_one(item: Any) -> dict:
+        sql_file = item.get("sql_file") if isinstance(item, dict) else None
+        async with fanout:
+            t0 = time.perf_counter()
+            try:
+                if not isinstance(item, dict):
+                    raise HTTPException(
+                        status_code=400, detail="item must be an object"
+                    )
+                try:
+                    fmt = kpi_results.negotiate(
+                        "", item.get("format") or payload.get("format")
+                    )
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e)) from e
+                if fmt not in kpi_results.JSON_FORMATS:
+                    raise HTTPException(
+                        status_code=400, detail=f"{fmt} is not available in a batch"
+                    )
+                result = await _kpi_json(item, fmt, request.is_disconnected)
+                out = {"sql_file": sql_file, "ok": True, **result}
+            except HTTPException as e:
+                out = {
+                    "sql_file": sql_file,
+                    "ok": False,
+                    "status": e.status_code,
+                    "error": e.detail,
+                }
+            out["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            return out
+
+    results = await asyncio.gather(*(run_one(item) for item in items))
     return {
-        "rows": len(df),
-        "columns": list(df.columns),
-        "data": df.to_dict(orient="records"),
+        "results": results,
+        "ok": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+@app.get("/kpi/catalog")
+def kpi_catalog() -> dict:
+    """Queries the UI may run, with their declared params."""
+    return {"queries": _sql_registry.catalog(), "errors": _sql_registry.errors()}
+
+
+@app.post("/kpi/cache/invalidate")
+def kpi_cache_invalidate(payload: Optional[dict] = None) -> dict:
+    """Drop cached KPI results (called by the execkpi_daily DAG after dbt run)."""
+    reason = (payload or {}).get("reason", "manual")
+    _freshness.reset()
+    if _kpi_cache is None:
+        return {"invalidated": False, "reason": reason}
+    _kpi_cache.invalidate()
+    return {"invalidated": True, "reason": reason}
+
+
+@app.get("/kpi/stats")
+def kpi_stats() -> dict:
+    return {
+        "bq_pool": bq_pool.get_registry().stats(),
+        "cache": _kpi_cache.stats() if _kpi_cache is not None else None,
+        "executor": _executor.stats(),
+        "single_flight": _single_flight.stats(),
+        "governor": _governor.stats(),
+        "duckdb": duck_engine.get_engine().stats() if duck_engine.is_local() else None,
     }
 
 
@@ -200,61 +574,424 @@ def ab_test(payload: dict):
     return _to_native(resp)
 
 
+@app.post("/ab/test/batch")
+def ab_test_batch(payload: dict):
+    """
+    Many experiments / arms / segments in one call.
+
+    Body holds parallel arrays `experiment`, `arm`, `successes`, `totals`
+    (optional `segment`, `weights`), plus `alpha`, `correction`
+    (holm|bh|none), `control` and `format` (records|columnar).
+    """
+    fmt = payload.get("format", "records")
+    if fmt not in kpi_results.JSON_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be records|columnar")
+    try:
+        result = ab_engine.run_batch(
+            experiment=payload["experiment"],
+            arm=payload["arm"],
+            successes=payload["successes"],
+            totals=payload["totals"],
+            segment=payload.get("segment"),
+            weights=payload.get("weights"),
+            alpha=float(payload.get("alpha", 0.05)),
+            correction=str(payload.get("correction", "holm")).lower(),
+            control=payload.get("control"),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"bad payload: {e}") from e
+
+    if fmt == "records":
+        result = {k: ab_engine.to_records(v) for k, v in result.items()}
+    return result
+
+
+@app.post("/ab/bayes")
+def ab_bayes(payload: dict):
+    """
+    Beta-Binomial posteriors: P(beat control), P(best) and expected loss.
+
+    Takes `arms`/`successes`/`totals` arrays, or the /ab/test fields
+    (`a_success`, `a_total`, `b_success`, `b_total`). Optional: `control`,
+    `draws`, `seed`, `prior` ([alpha, beta]), `level`.
+    """
+    try:
+        if "arms" in payload:
+            arms = payload["arms"]
+            successes, totals = payload["successes"], payload["totals"]
+        else:
+            arms = ["A", "B"]
+            successes = [int(payload["a_success"]), int(payload["b_success"])]
+            totals = [int(payload["a_total"]), int(payload["b_total"])]
+        prior = payload.get("prior") or [1.0, 1.0]
+        return ab_resample.beta_binomial(
+            arms,
+            successes,
+            totals,
+            control=payload.get("control"),
+            draws=ab_resample.parse_draws(payload.get("draws")),
+            seed=int(payload.get("seed", 42)),
+            prior=(float(prior[0]), float(prior[1])),
+            level=float(payload.get("level", 0.95)),
+        )
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"bad payload: {e}") from e
+
+
+@app.post("/ab/bootstrap")
+async def ab_bootstrap(payload: dict, request: Request):
+    """
+    Bootstrap CIs for revenue per user, per A/B group and vs control.
+
+    Histograms come from `groups` ({"A": {"values": [...], "counts": [...]}})
+    or, by default, from sql/api_ab_revenue_hist.sql (cached like any KPI).
+    Optional: `control`, `draws`, `seed`, `level`.
+    """
+    try:
+        draws = ab_resample.parse_draws(payload.get("draws"))
+        seed = int(payload.get("seed", 42))
+        level = float(payload.get("level", 0.95))
+        if payload.get("groups"):
+            groups = {
+                name: (g["values"], g["counts"])
+                for name, g in payload["groups"].items()
+            }
+        else:
+            hist = await _kpi_json(
+                {"sql_file": "api_ab_revenue_hist.sql"},
+                "columnar",
+                request.is_disconnected,
+            )
+            groups = ab_resample.histograms_from_columns(hist["data"])
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"bad payload: {e}") from e
+
+    try:
+        # CPU-bound: keep it off the event loop
+        return await run_in_threadpool(
+            ab_resample.bootstrap_means,
+            groups,
+            control=payload.get("control"),
+            draws=draws,
+            seed=seed,
+            level=level,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"bad payload: {e}") from e
+
+
+# sequential (always-valid) monitoring: state lives in EXECKPI_AB_SEQ_PATH
+def _fold_sequential(experiment: str, payload: dict, **counts) -> dict:
+    try:
+        return ab_sequential.get_store().fold(
+            experiment,
+            key=payload.get("key"),
+            control=str(payload.get("control", "A")),
+            treatment=str(payload.get("treatment", "B")),
+            alpha=float(payload.get("alpha", 0.05)),
+            tau2=float(payload.get("tau2", ab_sequential.DEFAULT_TAU2)),
+            **counts,
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"bad payload: {e}") from e
+
+
+@app.get("/ab/sequential")
+def ab_sequential_list() -> dict:
+    return {"experiments": ab_sequential.get_store().list()}
+
+
+@app.get("/ab/sequential/{experiment}")
+def ab_sequential_get(experiment: str) -> dict:
+    state = ab_sequential.get_store().get(experiment)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"no state for {experiment}")
+    return state
+
+
+@app.post("/ab/sequential/{experiment}/fold")
+def ab_sequential_fold(experiment: str, payload: dict) -> dict:
+    """
+    Fold one look into the experiment's running mSPRT state.
+
+    Body: `increment` or cumulative `snapshot` as {"A": {"success", "total"},
+    "B": {...}}, plus an optional idempotency `key` (e.g. the run date).
+    """
+    return _fold_sequential(
+        experiment,
+        payload,
+        increment=payload.get("increment"),
+        snapshot=payload.get("snapshot"),
+    )
+
+
+@app.post("/ab/sequential/{experiment}/refresh")
+async def ab_sequential_refresh(experiment: str, payload: dict, request: Request):
+    """
+    Fold one cohort of sql/api_ab_daily.sql for run `day` (default yesterday).
+
+    The cohort is the users who signed up EXECKPI_AB_WINDOW_DAYS before `day`,
+    counted as converted if their first order falls in that window, which has
+    closed by `day`. The execkpi_daily DAG calls this with its run date; the
+    day doubles as the idempotency key, so a retried run does not count twice.
+    """
+    day = payload.get("day") or (dt.date.today() - dt.timedelta(days=1)).isoformat()
+    try:
+        until = dt.date.fromisoformat(str(day))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="day must be YYYY-MM-DD") from e
+    cohort = until - dt.timedelta(days=ab_sequential.WINDOW_DAYS)
+    daily = await _kpi_json(
+        {
+            "sql_file": "api_ab_daily.sql",
+            "params": [
+                {"name": "day", "type": "DATE", "value": cohort.isoformat()},
+                {"name": "until", "type": "DATE", "value": until.isoformat()},
+            ],
+        },
+        "records",
+        request.is_disconnected,
+    )
+    increment = {
+        str(r["ab_group"]): {"success": r["success"], "total": r["total"]}
+        for r in daily["data"]
+    }
+    return await run_in_threadpool(
+        _fold_sequential,
+        experiment,
+        {"key": day, **payload},
+        increment=increment,
+    )
+
+
+@app.delete("/ab/sequential/{experiment}")
+def ab_sequential_reset(experiment: str) -> dict:
+    return {"deleted": ab_sequential.get_store().reset(experiment)}
+
+
 # --------------------------------------------------------------------------
 # ML endpoints
 # --------------------------------------------------------------------------
-def _extract_last_json(stdout: str) -> Optional[dict]:
-    idx = stdout.rfind("{")
-    if idx == -1:
-        return None
-    tail = stdout[idx:]
-    try:
-        return json.loads(tail)
-    except Exception:
-        return None
+# trainings run as background jobs (EXECKPI_ML_JOB_WORKERS at a time); a
+# second /ml/train while one is queued or running gets the same job
+_ml_jobs = ml_jobs.JobQueue()
+TRAIN_SCRIPT = Path(__file__).resolve().parent / "train_explain.py"
 
 
-@app.post("/ml/train")
-def ml_train():
-    import subprocess
+def _ml_job(job_id: str) -> ml_jobs.Job:
+    job = _ml_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+def _reload_model(job: ml_jobs.Job) -> None:
+    # serve the new model right away instead of at the next mtime check
+    _model_store.reload(force=True)
+
+
+@app.post("/ml/train", status_code=202)
+def ml_train() -> dict:
+    """Queue a training run; poll GET /ml/jobs/{job_id} for its result."""
     import sys
 
-    script_path = Path(__file__).resolve().parent / "train_explain.py"
-    if not script_path.exists():
+    if not TRAIN_SCRIPT.exists():
         raise HTTPException(status_code=500, detail="train_explain.py not found")
+    try:
+        job, created = _ml_jobs.submit(
+            "train", [sys.executable, str(TRAIN_SCRIPT)], on_success=_reload_model
+        )
+    except ml_jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e)) from e
+    return {**job.info(), "deduplicated": not created}
 
-    proc = subprocess.run(
-        [sys.executable, str(script_path)],
-        capture_output=True,
-        text=True,
-    )
-    if proc.returncode != 0:
+
+@app.get("/ml/jobs")
+def ml_jobs_list() -> dict:
+    return {
+        "jobs": [_to_native(j.info()) for j in _ml_jobs.jobs()],
+        "stats": _ml_jobs.stats(),
+    }
+
+
+@app.get("/ml/jobs/{job_id}")
+def ml_job_get(job_id: str) -> dict:
+    return _to_native(_ml_job(job_id).info())
+
+
+@app.get("/ml/jobs/{job_id}/logs")
+def ml_job_logs(job_id: str, offset: int = 0, follow: bool = True):
+    """Job output as text/plain, from line `offset`. Follows until it ends."""
+    job = _ml_job(job_id)
+    if follow:
+        lines = _ml_jobs.follow(job, offset)
+    elif job.log_path.exists():
+        lines = job.log_path.read_text("utf-8").splitlines(keepends=True)[offset:]
+    else:
+        lines = []
+    return StreamingResponse(lines, media_type="text/plain")
+
+
+# --------------------------------------------------------------------------
+# Online scoring
+# --------------------------------------------------------------------------
+# in-memory model, hot-swapped when artifacts change (EXECKPI_MODEL_RELOAD_S)
+_model_store = ml_serving.ModelStore()
+# concurrent single-row requests share one predict_proba call
+_batcher = ml_serving.MicroBatcher()
+_predict_stats = ml_serving.PredictStats()
+
+
+@app.post("/ml/predict")
+async def ml_predict(payload: dict):
+    """
+    Score feature rows with the current model.
+
+    Body: {"features": {...}} for one row (micro-batched with concurrent
+    requests) or {"rows": [{...}, ...]} for a batch. Keys are the training
+    feature columns (columns.json); missing ones are 0.0. A `user_id` is
+    passed through to the result.
+    """
+    t0 = time.perf_counter()
+    if _model_store.due():
+        await run_in_threadpool(_model_store.reload)
+    loaded = _model_store.current()
+    if loaded is None:
+        raise HTTPException(status_code=503, detail="No model yet; run /ml/train")
+
+    try:
+        rows, single = ml_serving.parse_rows(payload)
+        X = loaded.matrix(rows)
+    except ml_serving.PredictInputError as e:
+        _predict_stats.errors += 1
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    try:
+        if single:
+            proba = [await _batcher.submit(loaded, X[0])]
+        else:
+            proba = await run_in_threadpool(loaded.predict, X)
+    except Exception as e:  # noqa: BLE001
+        _predict_stats.errors += 1
+        raise HTTPException(status_code=500, detail=f"prediction failed: {e}") from e
+
+    elapsed = time.perf_counter() - t0
+    _predict_stats.record(elapsed, len(rows))
+    return {
+        "model": loaded.name,
+        "version": loaded.version,
+        "predictions": ml_serving.predictions(rows, proba),
+        "elapsed_ms": round(elapsed * 1000.0, 3),
+    }
+
+
+@app.get("/ml/predict/stats")
+def ml_predict_stats() -> dict:
+    return {
+        "store": _model_store.stats(),
+        "batcher": _batcher.stats(),
+        "latency": _predict_stats.stats(),
+        "explain": _explain.stats(),
+    }
+
+
+@app.post("/ml/model/reload")
+def ml_model_reload() -> dict:
+    loaded = _model_store.reload(force=True)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="No ML artifacts yet")
+    return loaded.info()
+
+
+@app.get("/ml/model/versions")
+def ml_model_versions() -> dict:
+    store = _model_store.store
+    return {"latest": store.latest(), "versions": store.versions()}
+
+
+@app.post("/ml/model/rollback")
+def ml_model_rollback(payload: dict) -> dict:
+    """Serve a kept version again: {"version": "<id>"} (see /ml/model/versions)."""
+    version = payload.get("version")
+    previous = _model_store.store.latest()
+    try:
+        _model_store.store.set_latest(str(version or ""))
+    except artifact_store.ArtifactError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    loaded = _model_store.reload(force=True)
+    if loaded is None or loaded.version != version:
+        # keep LATEST on the version still being served, so other workers,
+        # batch scoring and the next restart don't follow a broken one
+        if previous:
+            _model_store.store.set_latest(previous)
         raise HTTPException(
             status_code=500,
-            detail=f"trainer failed: {proc.stderr or proc.stdout}",
+            detail=f"version {version} did not load; see /ml/predict/stats",
         )
-
-    out = proc.stdout
-    parsed = _extract_last_json(out)
-    if parsed is not None:
-        return _to_native(parsed)
-
-    return {"output": out.splitlines()}
+    return loaded.info()
 
 
 @app.get("/ml/latest")
 def ml_latest():
-    metrics_path = Path("artifacts") / "metrics.json"
-    if not metrics_path.exists():
+    version = _model_store.store.latest()
+    data = _model_store.store.read_json(version, "metrics.json") if version else None
+    if data is None:
         raise HTTPException(status_code=404, detail="No ML artifacts yet")
-    data = json.loads(metrics_path.read_text(encoding="utf-8"))
-    return _to_native(data)
+    return _to_native({**data, "_version": version})
+
+
+# --------------------------------------------------------------------------
+# Explanations
+# --------------------------------------------------------------------------
+# global importance from the trainer, per-row SHAP values cached per version
+_explain = ml_explain.ExplainService(_model_store.artifact_dir)
+EXPLAIN_TOP_K = 10
 
 
 @app.get("/ml/shap")
 def ml_shap():
-    shap_path = Path("artifacts") / "shap_summary.json"
-    if not shap_path.exists():
+    summary = _explain.summary()
+    if summary is None:
         raise HTTPException(status_code=404, detail="No SHAP summary yet")
-    data = json.loads(shap_path.read_text(encoding="utf-8"))
-    return _to_native(data)
+    return summary
+
+
+@app.post("/ml/explain")
+async def ml_explain_rows(payload: dict):
+    """
+    SHAP values for feature rows (same body as /ml/predict, plus optional
+    top_k). Each row gets its probability and the top_k features by |SHAP|.
+    """
+    t0 = time.perf_counter()
+    if _model_store.due():
+        await run_in_threadpool(_model_store.reload)
+    loaded = _model_store.current()
+    if loaded is None:
+        raise HTTPException(status_code=503, detail="No model yet; run /ml/train")
+    try:
+        rows, _ = ml_serving.parse_rows(payload)
+        X = loaded.matrix(rows)
+        top_k = int(payload.get("top_k", EXPLAIN_TOP_K))
+    except (ml_serving.PredictInputError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    def run():
+        return loaded.predict(X), _explain.explain(loaded, X)
+
+    try:
+        proba, (values, base, output, hits) = await run_in_threadpool(run)
+    except ValueError as e:  # model type without an explainer
+        raise HTTPException(status_code=501, detail=str(e)) from e
+
+    explanations = ml_serving.predictions(rows, proba)
+    for item, x, v in zip(explanations, X, values, strict=True):
+        item["contributions"] = ml_explain.contributions(loaded.columns, x, v, top_k)
+    return {
+        "model": loaded.name,
+        "version": loaded.version,
+        "output": output,
+        "base_value": base,
+        "explanations": explanations,
+        "cache_hits": hits,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 3),
+    }
@@ -0,0 +1,443 @@
+# backend/metrics.py
+"""
+Prometheus-style metrics and per-request tracing for the backend.
+
+Counters, gauges and histograms live in one process-wide registry, and
+render() writes them in the Prometheus text exposition format (GET /metrics).
+Each uvicorn worker keeps its own numbers, so scrape every worker or run one
+worker per pod.
+
+RequestMetrics is the ASGI middleware. It records per-route latency and
+status counts, labelled by the route template (/ml/jobs/{job_id}) rather than
+the raw path, so labels stay bounded. For each request it also opens a Trace.
+Code running inside the request adds named stages to it with stage("bq_job").
+The stages are also recorded in execkpi_stage_seconds and returned in a
+Server-Timing header, along with X-Request-ID. Requests slower than
+EXECKPI_SLOW_REQUEST_MS are logged with their stage breakdown, and every
+request is logged when EXECKPI_TRACE_LOG=1.
+"""
+
+import bisect
+import contextvars
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SLOW_REQUEST_MS = float(os.getenv("EXECKPI_SLOW_REQUEST_MS", "1000"))
+TRACE_LOG = os.getenv("EXECKPI_TRACE_LOG", "0") == "1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; BigQuery jobs and training runs need the long tail
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+JOB_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# ---------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_num(value)}"
+
+
+class Gauge(_Metric):
+    """A value set directly, or read from `fn` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        fn: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._fn = fn
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Read the values from `fn()` ({label values: value}) on each scrape."""
+        self._fn = fn
+
+    def samples(self) -> Iterator[str]:
+        if self._fn is not None:
+            try:
+                values = dict(self._fn())
+            except Exception as e:  # noqa: BLE001
+                print(f"[metrics] {self.name} collector failed: {e}")
+                return
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_num(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip((*self.buckets, math.inf), counts, strict=True):
+                running += n
+                le = _labels(self.labelnames, key, f'le="{_num(bound)}"')
+                yield f"{self.name}_bucket{le} {running}"
+            labels = _labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_num(total)}"
+            yield f"{self.name}_count{labels} {running}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(m.render() for m in metrics)
+
+
+REGISTRY = Registry()
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ---------------------------------------------------------------------
+# Backend metrics
+# ---------------------------------------------------------------------
+HTTP_REQUESTS = REGISTRY.counter(
+    "execkpi_http_requests_total",
+    "HTTP requests by route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "execkpi_http_request_duration_seconds",
+    "Time from request start to the end of the response body.",
+    ("method", "route"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "execkpi_http_requests_in_flight", "Requests currently being served."
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "execkpi_stage_seconds",
+    "Time spent per request stage (cache lookup, BigQuery job, fetch, serialize).",
+    ("route", "name", "stage"),
+)
+BQ_JOBS = REGISTRY.counter(
+    "execkpi_bq_jobs_total",
+    "Finished BigQuery query jobs by query and cache hit.",
+    ("name", "cache_hit"),
+)
+BQ_BYTES_PROCESSED = REGISTRY.counter(
+    "execkpi_bq_bytes_processed_total",
+    "Bytes processed by BigQuery query jobs.",
+    ("name",),
+)
+BQ_BYTES_BILLED = REGISTRY.counter(
+    "execkpi_bq_bytes_billed_total",
+    "Bytes billed for BigQuery query jobs.",
+    ("name",),
+)
+BQ_SLOT_SECONDS = REGISTRY.counter(
+    "execkpi_bq_slot_seconds_total",
+    "Slot time consumed by BigQuery query jobs.",
+    ("name",),
+)
+KPI_CACHE_LOOKUPS = REGISTRY.counter(
+    "execkpi_kpi_cache_lookups_total",
+    "KPI result cache lookups by query and result (hit/miss/bypass).",
+    ("name", "result"),
+)
+GOVERNOR_DECISIONS = REGISTRY.counter(
+    "execkpi_kpi_governor_total",
+    "Query governor decisions by query (allowed/downgraded/rejected).",
+    ("name", "decision"),
+)
+KPI_QUERIES = REGISTRY.gauge(
+    "execkpi_kpi_queries",
+    "BigQuery queries of this worker by state (running/queued).",
+    ("state",),
+)
+ML_JOBS = REGISTRY.gauge(
+    "execkpi_ml_jobs", "Background ML jobs by status.", ("status",)
+)
+ML_JOB_DURATION = REGISTRY.histogram(
+    "execkpi_ml_job_duration_seconds",
+    "Wall time of finished background ML jobs (e.g. /ml/train).",
+    ("kind", "status"),
+    buckets=JOB_BUCKETS,
+)
+
+
+# ---------------------------------------------------------------------
+# Tracing
+# ---------------------------------------------------------------------
+class Trace:
+    def __init__(self, request_id: str, scope: dict):
+        self.request_id = request_id
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self._scope = scope  # the router adds the matched route to it
+        self.names: List[str] = []  # what the request ran, e.g. sql_files
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.bq: List[dict] = []
+
+    @property
+    def route(self) -> str:
+        return getattr(self._scope.get("route"), "path", "unmatched")
+
+    def add(self, stage: str, seconds: float, name: str = "") -> None:
+        self.stages.append((stage, seconds))
+        STAGE_LATENCY.observe(seconds, route=self.route, name=name, stage=stage)
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{s};dur={secs * 1000:.1f}" for s, secs in self.stages)
+
+    def summary(self, status: int, seconds: float) -> str:
+        line = (
+            f"[trace] {self.request_id} {self.method} {self.path} {status}"
+            f" {seconds * 1000:.1f}ms"
+        )
+        if self.names:
+            line += f" name={','.join(self.names)}"
+        for s, secs in self.stages:
+            line += f" {s}={secs * 1000:.1f}ms"
+        for bq in self.bq:
+            line += (
+                f" bq_job={bq['job_id']} bytes={bq['bytes_processed']}"
+                f" slot_ms={bq['slot_ms']} cache_hit={bq['cache_hit']}"
+            )
+        return line
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "execkpi_trace", default=None
+)
+# per task, so the items of one /kpi/batch request keep their own names
+_name: contextvars.ContextVar[str] = contextvars.ContextVar("execkpi_name", default="")
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def set_name(name: str) -> None:
+    """Label the stages that follow in this task (e.g. with the sql_file)."""
+    _name.set(name or "")
+    trace = current()
+    if trace is not None and name and name not in trace.names:
+        trace.names.append(name)
+
+
+@contextmanager
+def stage(label: str) -> Iterator[None]:
+    """Time a block as a stage of the current request (no-op outside one)."""
+    trace = current()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(label, time.perf_counter() - t0, _name.get())
+
+
+def record_bq_job(job) -> dict:
+    """Count a finished job's statistics under the current name."""
+    name = _name.get()
+    # read from the job resource fetched by the last poll: no extra API call
+    processed = getattr(job, "total_bytes_processed", None) or 0
+    billed = getattr(job, "total_bytes_billed", None) or 0
+    slot_ms = getattr(job, "slot_millis", None) or 0
+    cache_hit = bool(getattr(job, "cache_hit", False))
+    BQ_JOBS.inc(name=name, cache_hit=str(cache_hit).lower())
+    BQ_BYTES_PROCESSED.inc(processed, name=name)
+    BQ_BYTES_BILLED.inc(billed, name=name)
+    BQ_SLOT_SECONDS.inc(slot_ms / 1000.0, name=name)
+    stats = {
+        "bytes_processed": processed,
+        "bytes_billed": billed,
+        "slot_ms": slot_ms,
+        "cache_hit": cache_hit,
+    }
+    trace = current()
+    if trace is not None:
+        trace.bq.append({"job_id": job.job_id, **stats})
+    return stats
+
+
+# ---------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------
+class RequestMetrics:
+    def __init__(
+        self, app, slow_ms: float = SLOW_REQUEST_MS, log_all: bool = TRACE_LOG
+    ):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.log_all = log_all
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64]
+        trace = Trace(request_id or uuid.uuid4().hex[:16], scope)
+        token = _current.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"x-request-id", trace.request_id.encode("latin-1"))]
+                if trace.stages:
+                    extra.append((b"server-timing", trace.server_timing().encode()))
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), *extra],
+                }
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _current.reset(token)
+            seconds = time.perf_counter() - trace.started
+            HTTP_REQUESTS.inc(method=trace.method, route=trace.route, status=status)
+            HTTP_LATENCY.observe(seconds, method=trace.method, route=trace.route)
+            if self.log_all or seconds * 1000 >= self.slow_ms:
+                print(trace.summary(status, seconds))
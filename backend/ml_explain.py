@@ -0,0 +1,360 @@
+# backend/ml_explain.py
+"""
+SHAP explanations for the chosen model.
+
+Global importance is computed by the trainer and written to
+shap_summary.json, which GET /ml/shap serves. It is the mean |SHAP| over a
+sample of the training split, stratified by the target
+(EXECKPI_SHAP_SAMPLE rows). The sample is explained in chunks of
+EXECKPI_SHAP_CHUNK rows. For shap.TreeExplainer (single-threaded) the chunks
+run on a process pool (EXECKPI_SHAP_WORKERS, one thread each); xgboost's own
+TreeSHAP is already multi-threaded. Chunks not started within
+EXECKPI_SHAP_BUDGET_S are skipped. The summary then covers the rows explained
+so far and is marked partial. It is stored with the model version it
+describes.
+
+ExplainService answers POST /ml/explain: per-row SHAP values for the served
+model. It keeps one explainer per model version and an LRU of rows already
+explained, keyed by model version and a hash of the feature vector.
+
+Explainers (exact, no sampling):
+- xgboost: TreeSHAP from the booster itself (pred_contribs), in log-odds
+- random forest / other trees: shap.TreeExplainer, in probability
+- linear models: coef * (x - mean(background)), in log-odds. This equals
+  shap.LinearExplainer for independent features. The background sample is
+  stored in the model version (shap_background.npy).
+"""
+
+import collections
+import hashlib
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from backend import artifact_store
+except ImportError:  # imported next to train_explain as a script
+    import artifact_store
+
+ARTIFACT_DIR = Path(os.getenv("EXECKPI_ARTIFACT_DIR", "artifacts"))
+SAMPLE_ROWS = int(os.getenv("EXECKPI_SHAP_SAMPLE", "5000"))
+CHUNK_ROWS = int(os.getenv("EXECKPI_SHAP_CHUNK", "500"))
+WORKERS = int(os.getenv("EXECKPI_SHAP_WORKERS", str(os.cpu_count() or 1)))
+BUDGET_S = float(os.getenv("EXECKPI_SHAP_BUDGET_S", "120"))
+CACHE_SIZE = int(os.getenv("EXECKPI_SHAP_CACHE_SIZE", "4096"))
+BACKGROUND_ROWS = 200
+SEED = 42
+
+SUMMARY_FILE = "shap_summary.json"
+BACKGROUND_FILE = "shap_background.npy"
+
+
+class Explainer:
+    def __init__(self, model, background: Optional[np.ndarray] = None, threads=0):
+        self.model = model
+        self.threads = threads
+        self._base_value: Optional[float] = None
+        if hasattr(model, "get_booster"):
+            self.kind, self.output = "xgboost", "log_odds"
+        elif hasattr(model, "estimators_") or hasattr(model, "shap_tree_model"):
+            import shap  # type: ignore
+
+            self.kind, self.output = "tree", "probability"
+            if hasattr(model, "shap_tree_model"):  # artifact_store.ForestModel
+                model = model.shap_tree_model()
+            self._tree = shap.TreeExplainer(model)
+        elif hasattr(model, "coef_"):
+            self.kind, self.output = "linear", "log_odds"
+            self._coef = np.ravel(
+                model.coef_[0] if model.coef_.ndim > 1 else model.coef_
+            )
+            self._mean = (
+                np.asarray(background, dtype=np.float64).mean(axis=0)
+                if background is not None and len(background)
+                else np.zeros_like(self._coef)
+            )
+            self._base = float(np.ravel(model.intercept_)[0] + self._coef @ self._mean)
+        else:
+            raise ValueError(f"no SHAP explainer for {type(model).__name__}")
+
+    def explain(self, X: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Rows -> (SHAP values [rows, features], base value)."""
+        X = np.asarray(X, dtype=np.float64)
+        if self.kind == "xgboost":
+            return self._xgboost(X)
+        if self.kind == "linear":
+            return (X - self._mean) * self._coef, self._base
+        values = self._tree.shap_values(X, check_additivity=False)
+        base = np.ravel(self._tree.expected_value)
+        if isinstance(values, list):  # one array per class
+            values = values[-1]
+        elif values.ndim == 3:
+            values = values[:, :, -1]
+        return values, float(base[-1])
+
+    def base_value(self, n_features: int) -> float:
+        """Expected model output (the same for every row)."""
+        if self._base_value is None:
+            self._base_value = self.explain(np.zeros((1, n_features)))[1]
+        return self._base_value
+
+    def _xgboost(self, X: np.ndarray) -> Tuple[np.ndarray, float]:
+        import xgboost as xgb
+
+        booster = self.model.get_booster()
+        if self.threads:
+            booster.set_param({"nthread": self.threads})
+        try:
+            rounds = (0, int(self.model.best_iteration) + 1)
+        except AttributeError:  # refit without early stopping
+            rounds = (0, 0)
+        contribs = booster.predict(
+            xgb.DMatrix(X, nthread=self.threads or -1),
+            pred_contribs=True,
+            iteration_range=rounds,
+        )
+        base = float(contribs[0, -1]) if len(contribs) else 0.0
+        return contribs[:, :-1], base
+
+
+def stratified_sample(y: np.ndarray, n: int, seed: int = SEED) -> np.ndarray:
+    """Row indices, each class in its share of y (at least one row per class)."""
+    y = np.asarray(y)
+    if n >= len(y):
+        return np.arange(len(y))
+    rng = np.random.default_rng(seed)
+    picked = []
+    for cls in np.unique(y):
+        rows = np.flatnonzero(y == cls)
+        take = min(len(rows), max(1, round(n * len(rows) / len(y))))
+        picked.append(rng.choice(rows, size=take, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+# ---------------------------------------------------------------------
+# Worker side: one explainer per process
+# ---------------------------------------------------------------------
+_explainer: Optional[Explainer] = None
+
+
+def _init_worker(model, background: np.ndarray, threads: int) -> None:
+    global _explainer
+    _explainer = Explainer(model, background, threads=threads)
+
+
+def _explain_chunk(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int, float]:
+    values, base = _explainer.explain(X)
+    return np.abs(values).sum(axis=0), values.sum(axis=0), len(X), base
+
+
+class _Inline:
+    """Same interface as the pool for workers=1 (no process start-up)."""
+
+    def __init__(self, initargs):
+        _init_worker(*initargs)
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+
+        fut: Future = Future()
+        fut.set_result(fn(*args))
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def global_importance(
+    model,
+    X: np.ndarray,
+    y: np.ndarray,
+    columns: List[str],
+    sample_rows: int = SAMPLE_ROWS,
+    chunk_rows: int = CHUNK_ROWS,
+    workers: int = WORKERS,
+    budget_s: float = BUDGET_S,
+    seed: int = SEED,
+) -> Tuple[dict, np.ndarray]:
+    """Mean |SHAP| per feature -> (summary for shap_summary.json, background)."""
+    t0 = time.perf_counter()
+    deadline = t0 + budget_s
+    X = np.ascontiguousarray(np.asarray(X, dtype=np.float64))
+    y = np.asarray(y).astype(int)
+    background = X[stratified_sample(y, BACKGROUND_ROWS, seed)]
+    idx = stratified_sample(y, sample_rows, seed)
+    chunks = [X[c] for c in np.array_split(idx, max(1, -(-len(idx) // chunk_rows)))]
+    probe = Explainer(model, background)
+    if probe.kind != "tree":
+        # pred_contribs is multi-threaded and the linear case is one matrix
+        # op; only shap's single-threaded TreeExplainer gains from processes
+        workers = 1
+    workers = max(1, min(workers, len(chunks)))
+
+    initargs = (model, background, 1 if workers > 1 else 0)
+    if workers == 1:
+        pool: Any = _Inline(initargs)
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=initargs,
+        )
+
+    abs_sum = np.zeros(len(columns))
+    total = np.zeros(len(columns))
+    rows = done = 0
+    base = 0.0
+    timed_out = False
+    queue = iter(chunks)
+    running = set()
+    try:
+        while True:
+            # the first chunk always runs, later ones only before the deadline
+            while len(running) < 2 * workers and not timed_out:
+                if (done or running) and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+                chunk = next(queue, None)
+                if chunk is None:
+                    break
+                running.add(pool.submit(_explain_chunk, chunk))
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                a, s, n, base = fut.result()
+                abs_sum += a
+                total += s
+                rows += n
+                done += 1
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    importances = [
+        {
+            "feature": f,
+            "mean_abs_shap": float(a / max(rows, 1)),
+            "mean_shap": float(s / max(rows, 1)),
+        }
+        for f, a, s in zip(columns, abs_sum, total, strict=True)
+    ]
+    importances.sort(key=lambda r: r["mean_abs_shap"], reverse=True)
+    classes, counts = np.unique(y[idx], return_counts=True)
+    summary = {
+        "source": "shap",
+        "explainer": probe.kind,
+        "output": probe.output,
+        "feature_names": list(columns),
+        "importances": importances,
+        "base_value": base,
+        "rows": rows,
+        "sample_rows": int(len(idx)),
+        "strata": {str(c): int(n) for c, n in zip(classes, counts, strict=True)},
+        "chunks": done,
+        "chunks_total": len(chunks),
+        "partial": done < len(chunks),
+        "workers": workers,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+    return summary, background
+
+
+# ---------------------------------------------------------------------
+# Serving
+# ---------------------------------------------------------------------
+def _row_key(version: str, row: np.ndarray) -> Tuple[str, str]:
+    digest = hashlib.blake2b(
+        np.ascontiguousarray(row, dtype=np.float64).tobytes(), digest_size=16
+    )
+    return version, digest.hexdigest()
+
+
+class ExplainService:
+    def __init__(self, artifact_dir: Path = ARTIFACT_DIR, cache_size=CACHE_SIZE):
+        self.store = artifact_store.ArtifactStore(artifact_dir)
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._explainer: Optional[Tuple[str, Explainer]] = None
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+        self._summary: Optional[Tuple[str, Optional[dict]]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def summary(self) -> Optional[dict]:
+        """shap_summary.json of the LATEST version, read once per version."""
+        version = self.store.latest()
+        if version is None:
+            return None
+        cached = self._summary
+        if cached is None or cached[0] != version:
+            cached = (version, self.store.read_json(version, SUMMARY_FILE))
+            self._summary = cached
+        return cached[1]
+
+    def _explainer_for(self, loaded) -> Explainer:
+        current = self._explainer
+        if current is not None and current[0] == loaded.version:
+            return current[1]
+        background = None
+        path = self.store.path(loaded.version) / BACKGROUND_FILE
+        if path.exists():
+            background = np.load(path)
+            if background.ndim != 2 or background.shape[1] != len(loaded.columns):
+                background = None  # from another run
+        explainer = Explainer(loaded.model, background)
+        self._explainer = (loaded.version, explainer)
+        return explainer
+
+    def explain(self, loaded, X: np.ndarray) -> Tuple[np.ndarray, float, str, int]:
+        """Rows -> (SHAP values, base value, output space, cache hits)."""
+        with self._lock:
+            explainer = self._explainer_for(loaded)
+            keys = [_row_key(loaded.version, row) for row in X]
+            values = np.empty(X.shape, dtype=np.float64)
+            todo = []
+            for i, key in enumerate(keys):
+                hit = self._cache.get(key)
+                if hit is None:
+                    todo.append(i)
+                    continue
+                self._cache.move_to_end(key)
+                values[i] = hit
+            hits = len(keys) - len(todo)
+            self.hits += hits
+            self.misses += len(todo)
+        base = explainer.base_value(X.shape[1])
+        if todo:
+            fresh, _ = explainer.explain(X[todo])
+            values[todo] = fresh
+            with self._lock:
+                for i, row in zip(todo, fresh, strict=True):
+                    self._cache[keys[i]] = row
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return values, base, explainer.output, hits
+
+    def stats(self) -> dict:
+        return {
+            "explainer": self._explainer[1].kind if self._explainer else None,
+            "cached_rows": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def contributions(
+    columns: List[str], x: np.ndarray, values: np.ndarray, top_k: int
+) -> List[Dict[str, Any]]:
+    """Largest |SHAP| features of one row, with their input values."""
+    order = np.argsort(-np.abs(values))[:top_k]
+    return [
+        {"feature": columns[j], "value": float(x[j]), "shap": float(values[j])}
+        for j in order
+    ]
@@ -0,0 +1,300 @@
+# backend/ml_jobs.py
+"""
+Background job queue for long-running ML work (POST /ml/train).
+
+A job is a subprocess (the trainer keeps its own process pool and memory
+out of the API worker). It runs on a small thread pool of
+EXECKPI_ML_JOB_WORKERS slots. At most EXECKPI_ML_JOB_QUEUE more jobs may
+wait; beyond that submit() raises JobQueueFull. A job submitted with the same
+key as a queued or running job is not started again: the caller gets the
+existing job.
+
+Output (stdout + stderr) goes line by line to <EXECKPI_ML_JOB_DIR>/<id>.log,
+which follow() tails for streaming. The job reports its result by writing
+JSON to the path in $EXECKPI_JOB_RESULT, so nothing is parsed from stdout.
+Only the last EXECKPI_ML_JOB_HISTORY finished jobs (and their files) are
+kept.
+"""
+
+import collections
+import json
+import os
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from backend import metrics
+
+WORKERS = int(os.getenv("EXECKPI_ML_JOB_WORKERS", "1"))
+MAX_PENDING = int(os.getenv("EXECKPI_ML_JOB_QUEUE", "4"))
+JOB_DIR = Path(os.getenv("EXECKPI_ML_JOB_DIR", "artifacts/jobs"))
+HISTORY = int(os.getenv("EXECKPI_ML_JOB_HISTORY", "50"))
+TAIL_LINES = 20
+RESULT_ENV = "EXECKPI_JOB_RESULT"
+
+ACTIVE = ("queued", "running")
+
+
+class JobQueueFull(Exception):
+    """Too many jobs queued or running."""
+
+
+class Job:
+    def __init__(self, kind: str, argv: Sequence[str], key: str, job_dir: Path):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.argv = list(argv)
+        self.key = key
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.returncode: Optional[int] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.progress: Optional[str] = None
+        self.lines = 0
+        self.tail: collections.deque = collections.deque(maxlen=TAIL_LINES)
+        self.log_path = job_dir / f"{self.id}.log"
+        self.result_path = job_dir / f"{self.id}.result.json"
+        self._proc: Optional[subprocess.Popen] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE
+
+    def info(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": round(end - self.started_at, 3) if self.started_at else None,
+            "progress": self.progress,
+            "log_lines": self.lines,
+            "log_tail": list(self.tail),
+            "returncode": self.returncode,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        max_pending: int = MAX_PENDING,
+        job_dir: Path = JOB_DIR,
+        history: int = HISTORY,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.job_dir = Path(job_dir)
+        self.history = history
+        self._jobs: Dict[str, Job] = {}  # insertion order = submit order
+        self._cond = threading.Condition()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.deduplicated = 0
+        self.rejected = 0
+
+    # -----------------------------------------------------------------
+    # Submit / lookup
+    # -----------------------------------------------------------------
+    def submit(
+        self,
+        kind: str,
+        argv: Sequence[str],
+        key: Optional[str] = None,
+        env: Optional[dict] = None,
+        on_success: Optional[Callable[[Job], None]] = None,
+    ) -> Tuple[Job, bool]:
+        """Queue a job -> (job, created). An active job with `key` is reused."""
+        key = key or kind
+        with self._cond:
+            if self._closed:
+                raise JobQueueFull("job queue is shutting down")
+            active = [j for j in self._jobs.values() if not j.done]
+            for job in active:
+                if job.key == key:
+                    self.deduplicated += 1
+                    return job, False
+            if len(active) >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(
+                    f"{len(active)} jobs queued or running; try again later"
+                )
+            self.job_dir.mkdir(parents=True, exist_ok=True)
+            job = Job(kind, argv, key, self.job_dir)
+            self._jobs[job.id] = job
+            self._evict()
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="ml-job"
+                )
+            self._pool.submit(self._run, job, env or {}, on_success)
+        print(f"[ml_jobs] {kind} job {job.id} queued")
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._cond:
+            return list(reversed(self._jobs.values()))
+
+    def _evict(self) -> None:
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+            job.log_path.unlink(missing_ok=True)
+
+    # -----------------------------------------------------------------
+    # Worker side
+    # -----------------------------------------------------------------
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        with self._cond:
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            job._proc = None
+            self._cond.notify_all()
+        if job.started_at is not None:
+            metrics.ML_JOB_DURATION.observe(
+                job.finished_at - job.started_at, kind=job.kind, status=status
+            )
+
+    def _run(self, job: Job, env: dict, on_success) -> None:
+        with self._cond:
+            if self._closed:
+                self._finish(job, "cancelled", "shut down before start")
+                return
+            job.status = "running"
+            job.started_at = time.time()
+        run_env = {
+            **os.environ,
+            **env,
+            "PYTHONUNBUFFERED": "1",
+            RESULT_ENV: str(job.result_path),
+        }
+        try:
+            with open(job.log_path, "w", encoding="utf-8") as log:
+                proc = subprocess.Popen(
+                    job.argv,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    env=run_env,
+                )
+                with self._cond:
+                    job._proc = proc
+                    if self._closed:  # close() ran before the process existed
+                        proc.terminate()
+                for line in proc.stdout:
+                    line = line.rstrip("\n")
+                    log.write(line + "\n")
+                    log.flush()
+                    with self._cond:
+                        job.lines += 1
+                        job.tail.append(line)
+                        if line.startswith("["):
+                            job.progress = line
+                        self._cond.notify_all()
+                job.returncode = proc.wait()
+        except Exception as e:  # noqa: BLE001
+            self._finish(job, "failed", f"{type(e).__name__}: {e}")
+            return
+
+        if job.result_path.exists():
+            try:
+                job.result = json.loads(job.result_path.read_text("utf-8"))
+            except ValueError as e:
+                job.error = f"unreadable result: {e}"
+            job.result_path.unlink(missing_ok=True)
+
+        if self._closed:
+            self._finish(job, "cancelled", "shut down while running")
+        elif job.returncode != 0:
+            last = job.tail[-1] if job.tail else ""
+            self._finish(job, "failed", f"exit code {job.returncode}: {last}")
+        else:
+            if on_success is not None:
+                try:
+                    on_success(job)
+                except Exception as e:  # noqa: BLE001
+                    print(f"[ml_jobs] on_success for {job.id} failed: {e}")
+            self._finish(job, "succeeded")
+        print(f"[ml_jobs] {job.kind} job {job.id} {job.status}")
+
+    # -----------------------------------------------------------------
+    # Logs
+    # -----------------------------------------------------------------
+    def follow(self, job: Job, offset: int = 0, wait_s: float = 1.0) -> Iterator[str]:
+        """Yield log lines from `offset` on until the job is done."""
+        while not job.log_path.exists():
+            if job.done:
+                return
+            with self._cond:
+                self._cond.wait(wait_s)
+        with open(job.log_path, encoding="utf-8") as f:
+            for _ in range(offset):
+                if not f.readline():
+                    break
+            pending = ""
+            while True:
+                chunk = f.readline()
+                if chunk:
+                    pending += chunk
+                    if pending.endswith("\n"):
+                        yield pending
+                        pending = ""
+                    continue
+                if job.done:
+                    rest = f.read()
+                    if pending or rest:
+                        yield pending + rest
+                    return
+                with self._cond:
+                    if not job.done:
+                        self._cond.wait(wait_s)
+
+    # -----------------------------------------------------------------
+    # Admin
+    # -----------------------------------------------------------------
+    def stats(self) -> dict:
+        with self._cond:
+            statuses = collections.Counter(j.status for j in self._jobs.values())
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "jobs": dict(statuses),
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+        }
+
+    def close(self) -> None:
+        """Stop running jobs and drop queued ones (the queue can be reused)."""
+        with self._cond:
+            self._closed = True
+            pool, self._pool = self._pool, None
+            running = [j._proc for j in self._jobs.values() if j._proc is not None]
+        for proc in running:
+            proc.terminate()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        with self._cond:
+            for job in self._jobs.values():
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    job.error = "shut down before start"
+                    job.finished_at = time.time()
+            self._closed = False
+            self._cond.notify_all()
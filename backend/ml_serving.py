@@ -0,0 +1,272 @@
+# backend/ml_serving.py
+"""
+Online scoring for POST /ml/predict.
+
+ModelStore keeps the chosen model and its feature order in memory, loaded
+from the version that artifacts/LATEST points to (backend/artifact_store.py).
+It checks LATEST at most every EXECKPI_MODEL_RELOAD_S seconds and swaps in a
+new model atomically. Requests in flight keep the model they started with. If
+a version fails to load, the old model keeps serving.
+
+MicroBatcher coalesces concurrent single-row requests: rows queue up until
+EXECKPI_PREDICT_MAX_BATCH rows or EXECKPI_PREDICT_MAX_WAIT_MS have
+accumulated. The batch is then scored with one predict_proba call in a worker
+thread. PredictStats keeps a window of recent latencies for p50/p95/p99 and
+throughput.
+"""
+
+import asyncio
+import collections
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    from backend import artifact_store
+    from backend.feature_prep import coerce_cell
+except ImportError:  # imported next to train_explain as a script
+    import artifact_store
+    from feature_prep import coerce_cell
+
+ARTIFACT_DIR = Path(os.getenv("EXECKPI_ARTIFACT_DIR", "artifacts"))
+RELOAD_CHECK_S = float(os.getenv("EXECKPI_MODEL_RELOAD_S", "5"))
+MAX_BATCH = int(os.getenv("EXECKPI_PREDICT_MAX_BATCH", "256"))
+MAX_WAIT_S = float(os.getenv("EXECKPI_PREDICT_MAX_WAIT_MS", "2")) / 1000.0
+MAX_ROWS = int(os.getenv("EXECKPI_PREDICT_MAX_ROWS", "10000"))  # per request
+STATS_WINDOW = 2048
+THRESHOLD = 0.5  # same cut-off as the trainer's accuracy
+
+# passed through to the response, never used as a feature
+ID_FIELDS = ("user_id",)
+
+
+class PredictInputError(ValueError):
+    """Rows that do not match the model's feature columns."""
+
+
+class LoadedModel:
+    def __init__(self, model, columns: List[str], name: str, version: str):
+        self.model = model
+        self.columns = columns
+        self.index = {c: i for i, c in enumerate(columns)}
+        self.name = name
+        self.version = version
+        self.loaded_at = time.time()
+
+    def matrix(self, rows: List[dict]) -> np.ndarray:
+        """Feature dicts -> matrix in training column order (missing -> 0.0)."""
+        X = np.zeros((len(rows), len(self.columns)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            for key, value in row.items():
+                j = self.index.get(key)
+                if j is None:
+                    if key in ID_FIELDS:
+                        continue
+                    raise PredictInputError(f"unknown feature {key!r} in row {i}")
+                X[i, j] = coerce_cell(value)
+        return X
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        model = self.model
+        if hasattr(model, "predict_proba"):
+            return model.predict_proba(X)[:, 1]
+        if hasattr(model, "decision_function"):
+            return 1 / (1 + np.exp(-model.decision_function(X)))
+        return model.predict(X).astype(float)
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "features": len(self.columns),
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelStore:
+    def __init__(self, artifact_dir: Path = ARTIFACT_DIR):
+        self.artifact_dir = Path(artifact_dir)
+        self.store = artifact_store.ArtifactStore(self.artifact_dir)
+        self._current: Optional[LoadedModel] = None
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+
+    def _version(self) -> Optional[str]:
+        return self.store.latest()
+
+    def load(self, version: str) -> LoadedModel:
+        """Load one stored version (does not change what is served)."""
+        model, columns, manifest = self.store.load(version)
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features is not None and n_features != len(columns):
+            raise ValueError(f"model has {n_features} features, columns {len(columns)}")
+        return LoadedModel(model, columns, manifest["name"], version)
+
+    def reload(self, force: bool = False) -> Optional[LoadedModel]:
+        """Load the LATEST version if it changed (always when forced)."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = self._version()
+            current = self._current
+            if version is None or (
+                not force and current is not None and current.version == version
+            ):
+                return current
+            try:
+                loaded = self.load(version)
+            except Exception as e:  # noqa: BLE001
+                # keep serving the old model; try again on the next check
+                self.reload_errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[ml_serving] reload failed: {self.last_error}")
+                return current
+            self._current = loaded
+            self.reloads += 1
+            print(f"[ml_serving] serving {loaded.name} ({loaded.version})")
+            return loaded
+
+    def due(self) -> bool:
+        return time.monotonic() - self._checked_at >= RELOAD_CHECK_S
+
+    def current(self) -> Optional[LoadedModel]:
+        return self._current
+
+    def stats(self) -> dict:
+        return {
+            "model": self._current.info() if self._current else None,
+            "artifact_dir": str(self.artifact_dir),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+        }
+
+
+class MicroBatcher:
+    def __init__(self, max_batch: int = MAX_BATCH, max_wait_s: float = MAX_WAIT_S):
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_s
+        self._pending: List[Tuple[LoadedModel, np.ndarray, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, loaded: LoadedModel, x: np.ndarray) -> float:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((loaded, x, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_s, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # a hot swap can land mid-batch: score each model's rows separately
+        by_model: Dict[int, list] = {}
+        for item in batch:
+            by_model.setdefault(id(item[0]), []).append(item)
+        for items in by_model.values():
+            task = asyncio.ensure_future(self._run(items))
+            # hold a reference until done so the task is not collected
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items: list) -> None:
+        loaded = items[0][0]
+        X = np.vstack([x for _, x, _ in items])
+        self.batches += 1
+        self.rows += len(items)
+        try:
+            proba = await run_in_threadpool(loaded.predict, X)
+        except Exception as e:  # noqa: BLE001
+            for _, _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, _, fut), p in zip(items, proba, strict=True):
+            if not fut.done():
+                fut.set_result(float(p))
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else None,
+            "pending": len(self._pending),
+        }
+
+
+class PredictStats:
+    """Latency/throughput over the last STATS_WINDOW requests."""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self._window: collections.deque = collections.deque(maxlen=window)
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+
+    def record(self, latency_s: float, rows: int) -> None:
+        self.requests += 1
+        self.rows += rows
+        self._window.append((time.monotonic(), latency_s, rows))
+
+    def stats(self) -> dict:
+        out: Dict[str, Any] = {
+            "requests": self.requests,
+            "rows": self.rows,
+            "errors": self.errors,
+            "window": len(self._window),
+        }
+        if self._window:
+            ts, lat, rows = (np.array(v) for v in zip(*self._window, strict=True))
+            p50, p95, p99 = np.percentile(lat * 1000.0, [50, 95, 99])
+            span = max(ts[-1] - ts[0], 1e-9)
+            out.update(
+                p50_ms=float(p50),
+                p95_ms=float(p95),
+                p99_ms=float(p99),
+                max_ms=float(lat.max() * 1000.0),
+                rows_per_s=float(rows.sum() / span) if len(ts) > 1 else None,
+            )
+        return out
+
+
+def parse_rows(payload: dict) -> Tuple[List[dict], bool]:
+    """{"features": {...}} or {"rows": [{...}, ...]} -> (rows, single)."""
+    if "rows" in payload:
+        rows = payload["rows"]
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise PredictInputError("rows must be a list of feature objects")
+        if not rows:
+            raise PredictInputError("rows is empty")
+        if len(rows) > MAX_ROWS:
+            raise PredictInputError(f"at most {MAX_ROWS} rows per request")
+        return rows, False
+    if isinstance(payload.get("features"), dict):
+        return [payload["features"]], True
+    raise PredictInputError("pass features (one row) or rows (a batch)")
+
+
+def predictions(rows: List[dict], proba) -> List[dict]:
+    out = []
+    for row, p in zip(rows, proba, strict=True):
+        item = {k: row[k] for k in ID_FIELDS if k in row}
+        item["probability"] = float(p)
+        item["label"] = int(p >= THRESHOLD)
+        out.append(item)
+    return out
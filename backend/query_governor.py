@@ -0,0 +1,264 @@
+# backend/query_governor.py
+"""
+Cost and latency guardrails for KPI queries on BigQuery.
+
+Before a query runs, it is dry-run to estimate the bytes it would scan. The
+estimate is memoised per SQL hash + params for EXECKPI_KPI_ESTIMATE_TTL_S, so
+a dashboard refresh costs one metadata call per query, not one per request.
+
+    estimate <= cap              run it
+    estimate >  cap, @fallback   run the fallback (sampled/aggregated) variant
+                                 if that one fits, and say so in the response
+    otherwise                    QueryTooExpensive (HTTP 422), no job started
+
+The cap is the file's `-- @max_bytes` or EXECKPI_KPI_MAX_BYTES, whichever is
+lower. The same cap is also sent as maximum_bytes_billed, so BigQuery fails
+the job itself if the estimate was wrong. A file's `-- @budget_ms` becomes
+the job deadline, and the executor cancels the job once it passes.
+
+Every job runs with the query cache on and with labels (app, sql_file, plus
+EXECKPI_BQ_LABELS="env=prod,team=bi"), so billing exports can be split per
+KPI file.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import GoogleAPIError
+from google.cloud import bigquery
+
+from backend import kpi_cache, metrics, sql_registry
+
+MAX_BYTES = sql_registry.parse_bytes(os.getenv("EXECKPI_KPI_MAX_BYTES", "10GB"))
+DRY_RUN = os.getenv("EXECKPI_KPI_DRY_RUN", "1").lower() not in {"0", "false", "no"}
+ESTIMATE_TTL_S = float(os.getenv("EXECKPI_KPI_ESTIMATE_TTL_S", "900"))
+ESTIMATE_MAX_ENTRIES = int(os.getenv("EXECKPI_KPI_ESTIMATE_MAX", "1024"))
+EXTRA_LABELS = os.getenv("EXECKPI_BQ_LABELS", "").strip()
+
+_LABEL_UNSAFE = re.compile(r"[^a-z0-9_-]+")
+
+
+class QueryTooExpensive(Exception):
+    """The query (and any fallback) would scan more than its byte cap."""
+
+    def __init__(self, sql_file: str, estimate: int, limit: int):
+        self.sql_file = sql_file
+        self.estimate = estimate
+        self.limit = limit
+        super().__init__(
+            f"{sql_file} would scan {_fmt_bytes(estimate)},"
+            f" over its {_fmt_bytes(limit)} limit"
+        )
+
+
+def _fmt_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def label_value(value: str) -> str:
+    """BigQuery label values: lowercase letters, digits, _ and -, <= 63 chars."""
+    return _LABEL_UNSAFE.sub("_", value.lower())[:63]
+
+
+def _parse_labels(spec: str) -> Dict[str, str]:
+    labels = {}
+    for item in filter(None, (i.strip() for i in spec.split(","))):
+        key, _, value = item.partition("=")
+        labels[label_value(key)] = label_value(value)
+    return labels
+
+
+def _query_parameters(params: List[dict]) -> List[bigquery.ScalarQueryParameter]:
+    return [
+        bigquery.ScalarQueryParameter(p["name"], p["type"], p["value"]) for p in params
+    ]
+
+
+class Plan:
+    """What will actually run for a request, after the governor's checks."""
+
+    def __init__(
+        self,
+        query: sql_registry.SqlQuery,
+        params: List[dict],
+        max_bytes: int,
+        estimate: Optional[int],
+        downgraded_from: Optional[str],
+        labels: Dict[str, str],
+    ):
+        self.query = query
+        self.params = params
+        self.max_bytes = max_bytes
+        self.estimate = estimate
+        self.downgraded_from = downgraded_from
+        self.labels = labels
+
+    @property
+    def sql(self) -> str:
+        return self.query.sql
+
+    def job_config(self) -> bigquery.QueryJobConfig:
+        return bigquery.QueryJobConfig(
+            query_parameters=_query_parameters(self.params),
+            maximum_bytes_billed=self.max_bytes,
+            use_query_cache=True,
+            labels=self.labels,
+        )
+
+    def timeout_s(self, requested: Optional[float] = None) -> Optional[float]:
+        """The file's latency budget, tightened by a request `timeout_s`."""
+        limits = [float(requested)] if requested else []
+        if self.query.budget_ms:
+            limits.append(self.query.budget_ms / 1000.0)
+        return min(limits) if limits else None
+
+    def info(self) -> dict:
+        return {
+            "sql_file": self.query.name,
+            "estimated_bytes": self.estimate,
+            "max_bytes_billed": self.max_bytes,
+            "downgraded_from": self.downgraded_from,
+        }
+
+
+class QueryGovernor:
+    def __init__(
+        self,
+        registry: sql_registry.SqlRegistry,
+        max_bytes: int = MAX_BYTES,
+        dry_run: bool = DRY_RUN,
+        ttl_s: float = ESTIMATE_TTL_S,
+        max_entries: int = ESTIMATE_MAX_ENTRIES,
+        labels: str = EXTRA_LABELS,
+    ):
+        self.registry = registry
+        self.max_bytes = max_bytes
+        self.dry_run = dry_run
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.labels = {"app": "execkpi", **_parse_labels(labels)}
+        # cache key -> (bytes, estimated_at)
+        self._estimates: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.dry_runs = 0
+        self.estimate_hits = 0
+        self.dry_run_errors = 0
+        self.allowed = 0
+        self.downgraded = 0
+        self.rejected = 0
+
+    def limit(self, query: sql_registry.SqlQuery) -> int:
+        if query.max_bytes is None:
+            return self.max_bytes
+        return min(query.max_bytes, self.max_bytes)
+
+    # -----------------------------------------------------------------
+    # Estimates
+    # -----------------------------------------------------------------
+    def estimate(
+        self, client: bigquery.Client, query: sql_registry.SqlQuery, params: List[dict]
+    ) -> Optional[int]:
+        """Bytes the query would scan (dry run, memoised); None if unknown."""
+        if not self.dry_run:
+            return None
+        key = kpi_cache.cache_key(query.sql, params, "dry_run")
+        now = time.time()
+        with self._lock:
+            hit = self._estimates.get(key)
+            if hit is not None and now - hit[1] <= self.ttl_s:
+                self._estimates.move_to_end(key)
+                self.estimate_hits += 1
+                return hit[0]
+
+        config = bigquery.QueryJobConfig(
+            query_parameters=_query_parameters(params),
+            dry_run=True,
+            use_query_cache=False,  # the worst case, not today's cache state
+        )
+        try:
+            with metrics.stage("dry_run"):
+                job = client.query(query.sql, job_config=config)
+            estimate = int(job.total_bytes_processed or 0)
+        except GoogleAPIError as e:
+            # the real job still has maximum_bytes_billed as a backstop
+            self.dry_run_errors += 1
+            print(f"[query_governor] dry run of {query.name} failed: {e}")
+            return None
+
+        with self._lock:
+            self.dry_runs += 1
+            self._estimates[key] = (estimate, now)
+            self._estimates.move_to_end(key)
+            while len(self._estimates) > self.max_entries:
+                self._estimates.popitem(last=False)
+        return estimate
+
+    # -----------------------------------------------------------------
+    # Decision
+    # -----------------------------------------------------------------
+    def _candidates(self, query: sql_registry.SqlQuery):
+        seen = set()
+        while query is not None and query.name not in seen:
+            seen.add(query.name)
+            yield query
+            query = self.registry.get(query.fallback) if query.fallback else None
+
+    def plan(
+        self, client: bigquery.Client, query: sql_registry.SqlQuery, params: List[dict]
+    ) -> Plan:
+        """
+        Pick what to run: `query` if it fits its byte cap, else the first
+        fallback that does. Raises QueryTooExpensive if none fits.
+        """
+        first = None
+        for candidate in self._candidates(query):
+            if candidate is query:
+                bound = params
+            else:
+                given = [p for p in params if p["name"] in candidate.params]
+                bound = candidate.bind(given)
+            limit = self.limit(candidate)
+            estimate = self.estimate(client, candidate, bound)
+            if first is None:
+                first = (estimate, limit)
+            if estimate is None or estimate <= limit:
+                downgraded = None if candidate is query else query.name
+                decision = "allowed" if downgraded is None else "downgraded"
+                self._count(query.name, decision)
+                if downgraded:
+                    print(
+                        f"[query_governor] {query.name} over its limit;"
+                        f" running {candidate.name} instead"
+                    )
+                labels = {**self.labels, "sql_file": label_value(candidate.name)}
+                return Plan(candidate, bound, limit, estimate, downgraded, labels)
+        self._count(query.name, "rejected")
+        raise QueryTooExpensive(query.name, first[0], first[1])
+
+    def _count(self, name: str, decision: str) -> None:
+        with self._lock:
+            setattr(self, decision, getattr(self, decision) + 1)
+        metrics.GOVERNOR_DECISIONS.inc(name=name, decision=decision)
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._estimates)
+        return {
+            "dry_run": self.dry_run,
+            "max_bytes": self.max_bytes,
+            "estimates_cached": cached,
+            "dry_runs": self.dry_runs,
+            "estimate_hits": self.estimate_hits,
+            "dry_run_errors": self.dry_run_errors,
+            "allowed": self.allowed,
+            "downgraded": self.downgraded,
+            "rejected": self.rejected,
+        }
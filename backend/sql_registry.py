@@ -0,0 +1,291 @@
+# backend/sql_registry.py
+"""
+Registry of the KPI queries the API is allowed to run.
+
+`sql/api_*.sql` is scanned once at startup. Each file declares its parameters
+in header comments:
+
+    -- @param start DATE  first day to include (NULL = open)
+
+and may set its BigQuery guardrails (see backend/query_governor.py):
+
+    -- @max_bytes 1GB                               cap on bytes billed
+    -- @budget_ms 15000                             latency budget (job deadline)
+    -- @fallback api_features_conversion_sample.sql cheaper variant when over cap
+
+Requests are checked against the registry before anything reaches BigQuery:
+unknown files, unknown or mistyped params and unparsable values are rejected.
+Files are re-scanned when they change on disk (at most every couple of
+seconds), so editing a query does not need a restart.
+"""
+
+import datetime as dt
+import decimal
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+HOT_RELOAD = os.getenv("EXECKPI_SQL_HOT_RELOAD", "1") not in {"0", "false", "no"}
+RELOAD_CHECK_S = float(os.getenv("EXECKPI_SQL_RELOAD_CHECK_S", "2"))
+
+_PARAM_DECL = re.compile(
+    r"^[ \t]*--[ \t]*@param[ \t]+(\w+)[ \t]+(\w+)[ \t]*(.*)$", re.MULTILINE
+)
+_DIRECTIVE = re.compile(
+    r"^[ \t]*--[ \t]*@(max_bytes|budget_ms|fallback)[ \t]+(\S+)", re.MULTILINE
+)
+_PARAM_USE = re.compile(r"(?<!@)@(\w+)")
+_SIZE = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT]?B?)$", re.IGNORECASE)
+_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+_COMMENT = re.compile(r"--[^\n]*")
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+
+
+def _parse_date(v: str) -> str:
+    return dt.date.fromisoformat(v).isoformat()
+
+
+def _parse_int(v: Any) -> int:
+    if isinstance(v, bool):
+        raise ValueError(f"not an integer: {v!r}")
+    if isinstance(v, float) and not v.is_integer():
+        raise ValueError(f"not an integer: {v!r}")
+    return int(v)
+
+
+def _parse_float(v: Any) -> float:
+    if isinstance(v, bool):
+        raise ValueError(f"not a number: {v!r}")
+    f = float(v)
+    if not math.isfinite(f):
+        raise ValueError(f"not a finite number: {v!r}")
+    return f
+
+
+def _parse_numeric(v: Any) -> str:
+    try:
+        d = decimal.Decimal(str(v).strip())
+    except decimal.InvalidOperation:
+        raise ValueError(f"not a number: {v!r}") from None
+    if not d.is_finite():
+        raise ValueError(f"not a finite number: {v!r}")
+    return str(d)
+
+
+def _parse_bool(v: Any) -> bool:
+    if isinstance(v, bool):
+        return v
+    if str(v).lower() in {"true", "1"}:
+        return True
+    if str(v).lower() in {"false", "0"}:
+        return False
+    raise ValueError(f"not a boolean: {v!r}")
+
+
+# declared type -> value check (returns the normalised value)
+PARAM_TYPES = {
+    "STRING": str,
+    "INT64": _parse_int,
+    "FLOAT64": _parse_float,
+    "NUMERIC": _parse_numeric,
+    "BOOL": _parse_bool,
+    "DATE": _parse_date,
+    "TIMESTAMP": lambda v: dt.datetime.fromisoformat(str(v)).isoformat(),
+}
+
+
+def parse_bytes(value: str) -> int:
+    """'500MB' / '2GB' / '1048576' -> bytes (binary units)."""
+    m = _SIZE.match(str(value).strip())
+    if not m:
+        raise ValueError(f"not a byte size: {value!r}")
+    unit = m.group(2).upper()[:1] if len(m.group(2)) == 2 else m.group(2).upper()
+    return int(float(m.group(1)) * _UNITS[unit])
+
+
+class ParamError(ValueError):
+    """A request param that does not match the query's declaration."""
+
+
+class ParamSpec:
+    def __init__(self, name: str, type_: str, description: str = ""):
+        self.name = name
+        self.type = type_.upper()
+        self.description = description.strip()
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "type": self.type, "description": self.description}
+
+
+class SqlQuery:
+    def __init__(self, name: str, path: Path, sql: str, mtime: float):
+        self.name = name
+        self.path = path
+        self.sql = sql
+        self.mtime = mtime
+        self.sha256 = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        self.description = _description(sql)
+        self.params: Dict[str, ParamSpec] = {}
+        for pname, ptype, desc in _PARAM_DECL.findall(sql):
+            if ptype.upper() not in PARAM_TYPES:
+                raise ValueError(f"{name}: @param {pname} has unknown type {ptype}")
+            self.params[pname] = ParamSpec(pname, ptype, desc)
+        undeclared = _used_params(sql) - set(self.params)
+        if undeclared:
+            raise ValueError(f"{name}: undeclared params {sorted(undeclared)}")
+        directives = dict(_DIRECTIVE.findall(sql))
+        try:
+            self.max_bytes: Optional[int] = (
+                parse_bytes(directives["max_bytes"])
+                if "max_bytes" in directives
+                else None
+            )
+            self.budget_ms: Optional[float] = (
+                float(directives["budget_ms"]) if "budget_ms" in directives else None
+            )
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from e
+        self.fallback: Optional[str] = directives.get("fallback")
+
+    def bind(self, params: List[dict]) -> List[dict]:
+        """
+        Validate request params and return the full, normalised list.
+
+        Declared params the request leaves out are bound as NULL.
+        """
+        given: Dict[str, Any] = {}
+        for p in params:
+            name = p.get("name") if isinstance(p, dict) else None
+            spec = self.params.get(name) if name else None
+            if spec is None:
+                raise ParamError(f"{self.name} has no param {name!r}")
+            if p.get("type") and str(p["type"]).upper() != spec.type:
+                raise ParamError(f"param {name} must be {spec.type}, got {p['type']}")
+            value = p.get("value")
+            if value is not None and value != "":
+                try:
+                    value = PARAM_TYPES[spec.type](value)
+                except (TypeError, ValueError) as e:
+                    raise ParamError(f"param {name}: bad {spec.type} value") from e
+            else:
+                value = None
+            given[name] = value
+        return [
+            {"name": n, "type": spec.type, "value": given.get(n)}
+            for n, spec in self.params.items()
+        ]
+
+    def as_dict(self) -> dict:
+        return {
+            "sql_file": self.name,
+            "description": self.description,
+            "params": [p.as_dict() for p in self.params.values()],
+            "sha256": self.sha256,
+            "max_bytes": self.max_bytes,
+            "budget_ms": self.budget_ms,
+            "fallback": self.fallback,
+        }
+
+
+def _description(sql: str) -> str:
+    for line in sql.splitlines():
+        line = line.strip()
+        if line.startswith("--") and not re.match(r"--\s*@", line):
+            return line.lstrip("-").strip()
+        if line and not line.startswith("--"):
+            break
+    return ""
+
+
+def _used_params(sql: str) -> set:
+    body = _STRING.sub("''", _COMMENT.sub("", sql))
+    return set(_PARAM_USE.findall(body))
+
+
+def _fallback_problem(query: SqlQuery, queries: Dict[str, SqlQuery]) -> str:
+    fallback = queries.get(query.fallback)
+    if fallback is None:
+        return f"@fallback {query.fallback} is not a loaded query"
+    for name, spec in fallback.params.items():
+        # the governor binds the request's params to the fallback by name
+        ours = query.params.get(name)
+        if ours is None:
+            return f"@fallback {fallback.name} declares @{name}, which {query.name} does not"
+        if ours.type != spec.type:
+            return f"@fallback {fallback.name} types @{name} as {spec.type}"
+    return ""
+
+
+def _check_fallbacks(queries: Dict[str, SqlQuery], errors: Dict[str, str]) -> None:
+    """Drop queries whose @fallback is missing or takes other params."""
+    changed = True
+    while changed:  # dropping one query can orphan another's fallback
+        changed = False
+        for name, query in list(queries.items()):
+            problem = query.fallback and _fallback_problem(query, queries)
+            if problem:
+                errors[name] = problem
+                del queries[name]
+                changed = True
+                print(f"[sql_registry] skipping {name}: {problem}")
+
+
+class SqlRegistry:
+    def __init__(self, sql_dir: Path, pattern: str = "api_*.sql"):
+        self.sql_dir = sql_dir
+        self.pattern = pattern
+        self._queries: Dict[str, SqlQuery] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._loaded = False
+        self.reloads = 0
+
+    def load(self) -> None:
+        """(Re)scan the SQL dir, only re-reading files whose mtime changed."""
+        with self._lock:
+            queries: Dict[str, SqlQuery] = {}
+            errors: Dict[str, str] = {}
+            for path in sorted(self.sql_dir.glob(self.pattern)):
+                mtime = path.stat().st_mtime
+                old = self._queries.get(path.name)
+                if old is not None and old.mtime == mtime:
+                    queries[path.name] = old
+                    continue
+                try:
+                    sql = path.read_text(encoding="utf-8")
+                    queries[path.name] = SqlQuery(path.name, path, sql, mtime)
+                except Exception as e:  # noqa: BLE001
+                    errors[path.name] = str(e)
+                    print(f"[sql_registry] skipping {path.name}: {e}")
+            _check_fallbacks(queries, errors)
+            if self._loaded and (
+                queries.keys() != self._queries.keys()
+                or any(q is not self._queries.get(n) for n, q in queries.items())
+            ):
+                self.reloads += 1
+            self._queries, self._errors = queries, errors
+            self._checked_at = time.time()
+            self._loaded = True
+
+    def _maybe_reload(self) -> None:
+        if not self._loaded:
+            self.load()
+        elif HOT_RELOAD and time.time() - self._checked_at > RELOAD_CHECK_S:
+            self.load()
+
+    def get(self, name: str) -> Optional[SqlQuery]:
+        self._maybe_reload()
+        return self._queries.get(name)
+
+    def catalog(self) -> List[dict]:
+        self._maybe_reload()
+        return [q.as_dict() for q in self._queries.values()]
+
+    def errors(self) -> Dict[str, str]:
+        return dict(self._errors)
@@ -0,0 +1,386 @@
+# backend/train_engine.py
+"""
+Parallel model search for the trainer (backend/train_explain.py).
+
+Every candidate model gets a baseline trial (the previous fixed
+hyperparameters) plus the trials of a grid or random search. Each trial is
+scored by stratified k-fold CV AUC on the training split. The (trial, fold)
+fits run across a process pool. The data is sent once per worker, and each
+fit is limited to its model's CPU budget (n_jobs plus BLAS/OpenMP threads),
+so `workers x budget` stays within the machine.
+
+XGBoost trains up to EXECKPI_XGB_MAX_ROUNDS rounds with early stopping on a
+slice of the training fold. The final refit uses the mean best round count.
+After the wall-clock budget (EXECKPI_TRAIN_BUDGET_S) no new fits start.
+Fits already running finish, and trials with missing folds are dropped.
+
+Seeds are fixed per fit (folds, subsamples, models), so the results do not
+depend on the number of workers.
+"""
+
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+SEED = int(os.getenv("EXECKPI_TRAIN_SEED", "42"))
+SEARCH = os.getenv("EXECKPI_TRAIN_SEARCH", "grid").strip().lower()  # grid|random|none
+TRIALS = int(os.getenv("EXECKPI_TRAIN_TRIALS", "6"))  # per model, random search
+CV_FOLDS = int(os.getenv("EXECKPI_TRAIN_CV_FOLDS", "3"))
+BUDGET_S = float(os.getenv("EXECKPI_TRAIN_BUDGET_S", "900"))
+WORKERS = int(os.getenv("EXECKPI_TRAIN_WORKERS", "0"))  # 0 = from CPU budgets
+SPACE_PATH = os.getenv("EXECKPI_TRAIN_SPACE", "").strip()  # JSON search space
+XGB_MAX_ROUNDS = int(os.getenv("EXECKPI_XGB_MAX_ROUNDS", "1000"))
+XGB_EARLY_STOP = int(os.getenv("EXECKPI_XGB_EARLY_STOP", "30"))
+
+MODELS = ("logistic_regression", "random_forest", "xgboost")
+
+# threads per fit, e.g. EXECKPI_TRAIN_CPUS="xgboost=4,random_forest=2"
+CPU_BUDGET = {"logistic_regression": 1, "random_forest": 2, "xgboost": 2}
+for _item in filter(None, os.getenv("EXECKPI_TRAIN_CPUS", "").split(",")):
+    _name, _, _cpus = _item.partition("=")
+    CPU_BUDGET[_name.strip()] = max(1, int(_cpus))
+
+# the trainer's previous fixed hyperparameters (each model's baseline trial)
+DEFAULTS: Dict[str, dict] = {
+    "logistic_regression": {},
+    "random_forest": {"n_estimators": 200},
+    "xgboost": {
+        "max_depth": 5,
+        "learning_rate": 0.08,
+        "subsample": 0.9,
+        "colsample_bytree": 0.9,
+    },
+}
+
+SPACE: Dict[str, Dict[str, list]] = {
+    "logistic_regression": {"C": [0.1, 1.0, 10.0]},
+    "random_forest": {
+        "n_estimators": [200, 400],
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 5],
+    },
+    "xgboost": {
+        "max_depth": [3, 5, 7],
+        "learning_rate": [0.05, 0.08, 0.15],
+        "min_child_weight": [1, 5],
+        "subsample": [0.9],
+        "colsample_bytree": [0.9],
+    },
+}
+
+
+class TrainConfigError(ValueError):
+    """Unknown search mode, model or search-space entry."""
+
+
+def load_space(path: str = SPACE_PATH) -> Dict[str, Dict[str, list]]:
+    if not path:
+        return SPACE
+    with open(path, encoding="utf-8") as f:
+        space = json.load(f)
+    unknown = set(space) - set(MODELS)
+    if unknown:
+        raise TrainConfigError(f"unknown models in search space: {sorted(unknown)}")
+    return space
+
+
+def plan_trials(
+    space: Dict[str, Dict[str, list]],
+    search: str = SEARCH,
+    trials: int = TRIALS,
+    seed: int = SEED,
+    models=MODELS,
+) -> List[Tuple[str, dict]]:
+    """
+    (model, params) per trial, baseline first. Models are interleaved, so
+    every model has trials done early if the time budget runs out.
+    """
+    if search not in {"grid", "random", "none"}:
+        raise TrainConfigError(
+            f"EXECKPI_TRAIN_SEARCH must be grid|random|none, got {search!r}"
+        )
+    rng = np.random.default_rng(seed)
+    per_model = []
+    for name in models:
+        if name not in DEFAULTS:
+            raise TrainConfigError(f"unknown model {name!r}")
+        plan = [{}]
+        grid = space.get(name, {})
+        if search != "none" and grid:
+            keys = sorted(grid)
+            combos = [
+                dict(zip(keys, v, strict=True))
+                for v in itertools.product(*(grid[k] for k in keys))
+            ]
+            if search == "random" and trials < len(combos):
+                picked = rng.choice(len(combos), size=trials, replace=False)
+                combos = [combos[i] for i in sorted(picked)]
+            plan += combos
+        per_model.append([(name, p) for p in plan])
+    return [t for group in itertools.zip_longest(*per_model) for t in group if t]
+
+
+def build_model(
+    name: str, params: dict, seed: int, n_jobs: int, early_stop: bool = False
+):
+    merged = {**DEFAULTS[name], **params}
+    if name == "logistic_regression":
+        return LogisticRegression(max_iter=1000, random_state=seed, **merged)
+    if name == "random_forest":
+        return RandomForestClassifier(random_state=seed, n_jobs=n_jobs, **merged)
+    import xgboost as xgb
+
+    merged.setdefault("n_estimators", XGB_MAX_ROUNDS)
+    return xgb.XGBClassifier(
+        eval_metric="auc",
+        n_jobs=n_jobs,
+        random_state=seed,
+        early_stopping_rounds=XGB_EARLY_STOP if early_stop else None,
+        **merged,
+    )
+
+
+def predict_proba(model, X) -> np.ndarray:
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(X)[:, 1]
+    if hasattr(model, "decision_function"):
+        return 1 / (1 + np.exp(-model.decision_function(X)))
+    return model.predict(X).astype(float)
+
+
+def fit(
+    name: str, params: dict, X, y, seed: int, n_jobs: int, rounds: Optional[int] = None
+):
+    """Fit one model within its CPU budget. Returns (model, best round or None)."""
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=n_jobs):
+        if name != "xgboost":
+            model = build_model(name, params, seed, n_jobs)
+            model.fit(X, y)
+            return model, None
+        if rounds is not None:
+            model = build_model(name, {**params, "n_estimators": rounds}, seed, n_jobs)
+            model.fit(X, y, verbose=False)
+            return model, rounds
+        # early stopping on a slice of the training data, not the scoring fold
+        fit_idx, es_idx = train_test_split(
+            np.arange(len(y)), test_size=0.1, random_state=seed, stratify=y
+        )
+        model = build_model(name, params, seed, n_jobs, early_stop=True)
+        model.fit(
+            X[fit_idx], y[fit_idx], eval_set=[(X[es_idx], y[es_idx])], verbose=False
+        )
+        return model, int(model.best_iteration) + 1
+
+
+# ----------------------------------------------------------------------
+# Worker side: data and folds are set once per process
+# ----------------------------------------------------------------------
+_X: Optional[np.ndarray] = None
+_y: Optional[np.ndarray] = None
+_FOLDS: List[Tuple[np.ndarray, np.ndarray]] = []
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray, folds: int, seed: int) -> None:
+    global _X, _y, _FOLDS
+    _X, _y = X, y
+    _FOLDS = list(
+        StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y)
+    )
+
+
+def _run_fold(trial: int, name: str, params: dict, fold: int, seed: int) -> dict:
+    train_idx, val_idx = _FOLDS[fold]
+    t0 = time.perf_counter()
+    try:
+        model, rounds = fit(
+            name, params, _X[train_idx], _y[train_idx], seed, CPU_BUDGET.get(name, 1)
+        )
+        auc = float(roc_auc_score(_y[val_idx], predict_proba(model, _X[val_idx])))
+    except Exception as e:  # noqa: BLE001
+        # a bad trial (e.g. a model that rejects the data) must not stop the search
+        return {"trial": trial, "fold": fold, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "trial": trial,
+        "fold": fold,
+        "auc": auc,
+        "rounds": rounds,
+        "fit_s": time.perf_counter() - t0,
+    }
+
+
+class _Inline:
+    """Same interface as the pool for workers=1 (no process start-up)."""
+
+    def __init__(self, initargs):
+        _init_worker(*initargs)
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+
+        fut: Future = Future()
+        fut.set_result(fn(*args))
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) // max(CPU_BUDGET.values()))
+
+
+def search(
+    X_train,
+    y_train,
+    X_test,
+    y_test,
+    models=MODELS,
+    space: Optional[Dict[str, Dict[str, list]]] = None,
+    search: str = SEARCH,
+    trials: int = TRIALS,
+    folds: int = CV_FOLDS,
+    budget_s: float = BUDGET_S,
+    workers: int = WORKERS,
+    seed: int = SEED,
+) -> Dict[str, Any]:
+    """
+    Run the CV search, refit each model's best trial on the full training
+    split and score it on the holdout. Returns {"models", "trials", "summary"}.
+    """
+    t0 = time.perf_counter()
+    deadline = t0 + budget_s
+    # keep the dtype prepared by feature_prep (float32 when it was safe)
+    X = np.ascontiguousarray(np.asarray(X_train))
+    if X.dtype.kind != "f":
+        X = X.astype(np.float64)
+    y = np.asarray(y_train).astype(int)
+    plan = plan_trials(
+        space if space is not None else load_space(), search, trials, seed, models
+    )
+    workers = workers or _default_workers()
+    tasks = [
+        (i, name, params, k)
+        for i, (name, params) in enumerate(plan)
+        for k in range(folds)
+    ]
+    print(
+        f"[train_engine] {len(plan)} trials x {folds} folds on {workers} worker(s),"
+        f" budget {budget_s:.0f}s"
+    )
+
+    initargs = (X, y, folds, seed)
+    if workers == 1:
+        pool: Any = _Inline(initargs)
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=initargs,
+        )
+
+    results: Dict[int, List[dict]] = {}
+    errors: Dict[int, str] = {}
+    timed_out = False
+    queue = iter(tasks)
+    running = set()
+    try:
+        while True:
+            # keep the pool busy, but only start fits before the deadline
+            while len(running) < 2 * workers and not timed_out:
+                if time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+                task = next(queue, None)
+                if task is None:
+                    break
+                running.add(pool.submit(_run_fold, *task, seed))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                res = fut.result()
+                if "error" in res:
+                    errors.setdefault(res["trial"], res["error"])
+                    continue
+                results.setdefault(res["trial"], []).append(res)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    for i, error in sorted(errors.items()):
+        print(f"[train_engine] trial {i} ({plan[i][0]}) failed: {error}")
+    trial_rows = []
+    for i, (name, params) in enumerate(plan):
+        runs = results.get(i, [])
+        if len(runs) < folds:
+            continue
+        aucs = [r["auc"] for r in runs]
+        rounds = [r["rounds"] for r in runs if r["rounds"] is not None]
+        trial_rows.append(
+            {
+                "model": name,
+                "params": {**DEFAULTS[name], **params},
+                "cv_auc": float(np.mean(aucs)),
+                "cv_auc_std": float(np.std(aucs)),
+                "rounds": int(round(np.mean(rounds))) if rounds else None,
+                "fit_s": float(sum(r["fit_s"] for r in runs)),
+            }
+        )
+    search_s = time.perf_counter() - t0
+
+    # refit the best trial per model on the whole machine (the pool is done)
+    X_te = np.asarray(X_test, dtype=X.dtype)
+    y_te = np.asarray(y_test).astype(int)
+    cpus = os.cpu_count() or 1
+    fitted: Dict[str, dict] = {}
+    for name in models:
+        rows = [r for r in trial_rows if r["model"] == name]
+        if not rows:
+            print(
+                f"[train_engine] {name}: no completed trial (failed or out of budget)"
+            )
+            continue
+        best = max(rows, key=lambda r: r["cv_auc"])
+        t1 = time.perf_counter()
+        model, _ = fit(name, best["params"], X, y, seed, cpus, rounds=best["rounds"])
+        proba = predict_proba(model, X_te)
+        fitted[name] = {
+            "model": model,
+            "params": best["params"],
+            "cv_auc": best["cv_auc"],
+            "cv_auc_std": best["cv_auc_std"],
+            "trials": len(rows),
+            "auc": float(roc_auc_score(y_te, proba)),
+            "accuracy": float(accuracy_score(y_te, (proba >= 0.5).astype(int))),
+            "refit_s": time.perf_counter() - t1,
+        }
+        if best["rounds"] is not None:
+            fitted[name]["n_estimators"] = best["rounds"]
+
+    summary = {
+        "search": search,
+        "cv_folds": folds,
+        "seed": seed,
+        "workers": workers,
+        "cpu_budget": {m: CPU_BUDGET.get(m, 1) for m in models},
+        "trials_planned": len(plan),
+        "trials_completed": len(trial_rows),
+        "trials_failed": len(errors),
+        "budget_s": budget_s,
+        "timed_out": timed_out,
+        "search_s": search_s,
+        "elapsed_s": time.perf_counter() - t0,
+    }
+    return {"models": fitted, "trials": trial_rows, "summary": summary}
@@ -1,27 +1,41 @@
 """
 ExecKPI trainer: load BQ features, train 3 models, pick best, save artifacts,
-and compute SHAP feature importance (now that columns are coerced).
+and compute SHAP feature importance (backend/ml_explain.py).
 """
 
 # backend/train_explain.py
 
-import base64
+import io
 import json
 import os
-import pickle
 from pathlib import Path
-from typing import Any, Optional
 
 import numpy as np
 import pandas as pd
-from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
-from google.oauth2 import service_account
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import accuracy_score, roc_auc_score
 from sklearn.model_selection import train_test_split
 
+try:
+    from backend import (
+        artifact_store,
+        artifact_sync,
+        duck_engine,
+        feature_loader,
+        feature_prep,
+        ml_explain,
+        train_engine,
+    )
+    from backend.bq_pool import get_registry
+except ImportError:  # run as a script: python backend/train_explain.py
+    import artifact_store
+    import artifact_sync
+    import duck_engine
+    import feature_loader
+    import feature_prep
+    import ml_explain
+    import train_engine
+    from bq_pool import get_registry
+
 # ---------------------------------------------------------------------
 # CONFIG
 # ---------------------------------------------------------------------
@@ -29,7 +43,7 @@ ARTIFACT_DIR = Path(os.getenv("EXECKPI_ARTIFACT_DIR", "artifacts"))
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", os.getenv("GCP_PROJECT", "exec-kpi"))
 FEATURE_TABLE_ENV = os.getenv("EXECKPI_FEATURE_TABLE", "").strip()
 
-S3_BUCKET = os.getenv("EXECKPI_S3_BUCKET", "").strip()
+S3_BUCKET = artifact_sync.BUCKET
 
 CANDIDATE_TABLES = [
     FEATURE_TABLE_ENV if FEATURE_TABLE_ENV else None,
@@ -41,215 +55,129 @@ CANDIDATE_TABLES = [
 # BQ helpers
 # ---------------------------------------------------------------------
 def _bq_client() -> bigquery.Client:
-    b64_creds = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    if b64_creds:
-        info = json.loads(base64.b64decode(b64_creds))
-        creds = service_account.Credentials.from_service_account_info(info)
-        return bigquery.Client(project=PROJECT_ID, credentials=creds)
-    return bigquery.Client(project=PROJECT_ID)
+    return get_registry().client(PROJECT_ID)
 
 
-def find_existing_features_table(client: bigquery.Client) -> str:
+def find_existing_features_table(client: bigquery.Client) -> bigquery.Table:
     print("[trainer] probing candidate feature tables in BigQuery...")
-    for table_fq in CANDIDATE_TABLES:
-        if not table_fq:
-            continue
-        print(f"[trainer] -> trying {table_fq}")
-        try:
-            client.query(f"SELECT * FROM `{table_fq}` LIMIT 1").result().to_dataframe()
-            print(f"[trainer] using feature table: {table_fq}")
-            return table_fq
-        except NotFound:
-            print(f"[trainer]    not found: {table_fq}")
-        except Exception as e:
-            print(f"[trainer]    error probing {table_fq}: {e}")
-    raise RuntimeError(
-        "Could not find features_conversion in any known dataset.\n"
-        "Run: dbt build (writes to exec-kpi:execkpi_execkpi) or set EXECKPI_FEATURE_TABLE."
-    )
+    return feature_loader.find_table(client, CANDIDATE_TABLES)
 
 
-def _coerce_cell(v: Any) -> float:
-    if v is None:
-        return 0.0
-    if isinstance(v, (list, tuple)):
-        return _coerce_cell(v[0]) if v else 0.0
-    if isinstance(v, (int, float, np.integer, np.floating)):
-        return float(v)
-    if isinstance(v, str):
-        s = v.strip()
-        if s.startswith("[") and s.endswith("]"):
-            s = s[1:-1].strip()
-        try:
-            return float(s)
-        except Exception:
-            return 0.0
-    return 0.0
+def feature_batches():
+    """(source name, iterator of Arrow record batches)."""
+    if duck_engine.is_local():
+        return (
+            f"duckdb:{duck_engine.SCHEMA}.features_conversion",
+            duck_engine.get_engine().record_batches(
+                f"SELECT * FROM {duck_engine.SCHEMA}.features_conversion"
+            ),
+        )
+    client = _bq_client()
+    table = find_existing_features_table(client)
+    storage = get_registry().storage_client(PROJECT_ID)
+    return (
+        feature_loader.table_fq(table),
+        feature_loader.iter_batches(client, storage, table),
+    )
 
 
 def load_features() -> pd.DataFrame:
-    client = _bq_client()
-    table_fq = find_existing_features_table(client)
+    target_col = "will_convert_14d"
+    id_cols = {"user_id"}
+
+    table_fq, batches = feature_batches()
     print(f"[trainer] loading from {table_fq}...")
-    df = client.query(f"SELECT * FROM `{table_fq}`").result().to_dataframe()
+    # each Arrow batch is coerced to float columns before the next is read
+    df, report = feature_prep.coerce_batches(
+        (batch.to_pandas() for batch in batches), keep=[*id_cols, target_col]
+    )
     print(f"[trainer] loaded {len(df)} rows, {len(df.columns)} columns")
 
     if df.empty:
         raise RuntimeError(f"Feature table {table_fq} returned 0 rows")
 
-    target_col = "will_convert_14d"
-    id_cols = {"user_id"}
-
-    feature_cols = [c for c in df.columns if c not in id_cols | {target_col}]
-    print(f"[trainer] cleaning {len(feature_cols)} feature columns...")
-
-    for col in feature_cols:
-        df[col] = df[col].map(_coerce_cell).astype(float)
+    for col, r in report.items():
+        if r["nulls"] or r["coerced"] or r["failed"]:
+            print(
+                f"[trainer]    {col}: {r['nulls']} nulls, {r['coerced']} parsed, "
+                f"{r['failed']} unparsable -> 0.0"
+            )
+    n32 = sum(r["float32"] for r in report.values())
+    print(f"[trainer] {n32}/{len(report)} feature columns stored as float32")
 
     df._feature_table_fq = table_fq  # type: ignore[attr-defined]
+    df._coercion_report = report  # type: ignore[attr-defined]
     return df
 
 
-# ---------------------------------------------------------------------
-# Model candidates
-# ---------------------------------------------------------------------
-def get_model_candidates():
-    import xgboost as xgb
-
-    models = [
-        ("logistic_regression", LogisticRegression(max_iter=1000), True),
-        (
-            "random_forest",
-            RandomForestClassifier(n_estimators=200, random_state=42),
-            True,
-        ),
-        (
-            "xgboost",
-            xgb.XGBClassifier(
-                n_estimators=200,
-                max_depth=5,
-                learning_rate=0.08,
-                subsample=0.9,
-                colsample_bytree=0.9,
-                eval_metric="auc",
-                n_jobs=4,
-            ),
-            True,
-        ),
-    ]
-    return models
-
-
-def train_and_eval(model, X_train, X_test, y_train, y_test, supports_proba: bool):
-    model.fit(X_train, y_train)
-
-    if supports_proba and hasattr(model, "predict_proba"):
-        proba = model.predict_proba(X_test)[:, 1]
-    else:
-        if hasattr(model, "decision_function"):
-            scores = model.decision_function(X_test)
-            proba = 1 / (1 + np.exp(-scores))
-        else:
-            preds = model.predict(X_test)
-            proba = preds.astype(float)
-
-    auc = float(roc_auc_score(y_test, proba))
-    acc = float(accuracy_score(y_test, (proba >= 0.5).astype(int)))
-    return auc, acc
-
-
 # ---------------------------------------------------------------------
 # SHAP
 # ---------------------------------------------------------------------
-def maybe_compute_shap(
-    best_name: str, best_model, X_train: pd.DataFrame, artifact_dir: Path
-):
-    try:
-        import shap  # type: ignore
-    except Exception:
-        print("[trainer][shap] shap not installed, skipping.")
-        return
-
-    if best_name not in {"xgboost", "random_forest"}:
-        return
-
-    n = min(200, len(X_train))
-    sample = X_train.sample(n=n, random_state=42)
-    X_np = sample.to_numpy(dtype=float, copy=True)
+def compute_shap(
+    best_name: str, best_model, X_train: pd.DataFrame, y_train: pd.Series
+) -> dict:
+    """Global SHAP importance -> files for the model version (may be empty)."""
     print("[trainer][shap] computing feature importance...")
-    print(f"[trainer][shap] X_np shape: {X_np.shape}, dtype: {X_np.dtype}")
-
     try:
-        explainer = shap.TreeExplainer(best_model)
-        shap_vals = explainer.shap_values(X_np)
-
-        if isinstance(shap_vals, list):
-            shap_vals = shap_vals[0]
-
-        mean_abs = np.mean(np.abs(shap_vals), axis=0)
-        feature_names = list(sample.columns)
-
-        feats = [
-            {"feature": f, "mean_abs_shap": float(m)}
-            for f, m in zip(feature_names, mean_abs, strict=False)
-        ]
-        feats.sort(key=lambda x: x["mean_abs_shap"], reverse=True)
-
-        artifact_dir.mkdir(parents=True, exist_ok=True)
-        out_path = artifact_dir / "shap_importance.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(
-                {
-                    "source": "shap",
-                    "feature_names": feature_names,
-                    "importances": feats,
-                },
-                f,
-                indent=2,
-            )
-        print("[trainer][shap] saved to artifacts/shap_importance.json")
-    except Exception as e:
+        summary, background = ml_explain.global_importance(
+            best_model, X_train.to_numpy(), y_train.to_numpy(), list(X_train.columns)
+        )
+    except Exception as e:  # noqa: BLE001
+        # e.g. shap not installed for a random forest; the model is still saved
         print(f"[trainer][shap] failed: {e}")
+        return {}
+    summary["model"] = best_name
+    print(
+        f"[trainer][shap] {summary['rows']}/{summary['sample_rows']} rows explained"
+        f" in {summary['elapsed_s']}s{' (partial)' if summary['partial'] else ''}"
+    )
+    buf = io.BytesIO()
+    np.save(buf, background)
+    return {
+        ml_explain.SUMMARY_FILE: json.dumps(summary, indent=2).encode("utf-8"),
+        ml_explain.BACKGROUND_FILE: buf.getvalue(),
+    }
 
 
 # ---------------------------------------------------------------------
 # Save artifacts
 # ---------------------------------------------------------------------
-def save_artifacts(best_name, best_model, columns, all_metrics, artifact_dir: Path):
-    artifact_dir.mkdir(parents=True, exist_ok=True)
-
-    model_path = artifact_dir / "model.pkl"
-    with open(model_path, "wb") as f:
-        pickle.dump(best_model, f)
-
-    cols_path = artifact_dir / "columns.json"
-    with open(cols_path, "w", encoding="utf-8") as f:
-        json.dump(columns, f, indent=2)
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
 
-    metrics_path = artifact_dir / "metrics.json"
-    with open(metrics_path, "w", encoding="utf-8") as f:
-        json.dump(all_metrics, f, indent=2)
 
+def save_artifacts(
+    best_name, best_model, columns, all_metrics, artifact_dir: Path, files=None
+):
+    """Commit one artifact version and point LATEST at it."""
+    store = artifact_store.ArtifactStore(artifact_dir)
+    manifest = store.commit(
+        best_model,
+        best_name,
+        columns,
+        {
+            "metrics.json": json.dumps(all_metrics, indent=2).encode("utf-8"),
+            **(files or {}),
+        },
+    )
+    print(
+        f"[trainer] saved version {manifest['version']} ({manifest['format']})"
+        f" -> {store.path(manifest['version'])}"
+    )
     return {
-        "model_path": str(model_path),
-        "columns_path": str(cols_path),
-        "metrics_path": str(metrics_path),
+        "version": manifest["version"],
+        "format": manifest["format"],
+        "version_dir": str(store.path(manifest["version"])),
     }
 
 
-def maybe_upload_to_s3(artifact_dir: Path, bucket: str):
+def maybe_upload_to_s3(artifact_dir: Path, bucket: str, version: str):
     if not bucket:
         return
     try:
-        import boto3
-
-        s3 = boto3.client("s3")
-        files = ["model.pkl", "metrics.json", "shap_importance.json", "columns.json"]
-        for fname in files:
-            fpath = artifact_dir / fname
-            if fpath.exists():
-                s3.upload_file(str(fpath), bucket, fname)
-        print(f"[trainer] uploaded artifacts to s3://{bucket}/")
+        artifact_sync.sync_version(artifact_dir, version, bucket)
     except Exception as e:
         print(f"[trainer] S3 upload failed: {e}")
 
@@ -266,6 +194,7 @@ def main():
         raise RuntimeError(f"Target column {target_col} not found in features table")
 
     feature_table_fq = getattr(df, "_feature_table_fq", "UNKNOWN")
+    coercion_report = getattr(df, "_coercion_report", {})
 
     X = df.drop(columns=[target_col, "user_id"], errors="ignore")
     y = df[target_col].astype(int)
@@ -276,53 +205,69 @@ def main():
         X, y, test_size=0.2, random_state=42, stratify=y
     )
 
-    candidates = get_model_candidates()
+    result = train_engine.search(X_train, y_train, X_test, y_test)
     all_metrics: dict[str, dict] = {}
-    best_name: Optional[str] = None
-    best_model = None
-    best_auc = -1.0
-    best_acc = -1.0
-
-    for name, model, supports_proba in candidates:
-        print(f"[trainer] training {name} ...")
-        auc, acc = train_and_eval(
-            model, X_train, X_test, y_train, y_test, supports_proba
-        )
+    for name, res in result["models"].items():
         all_metrics[name] = {
-            "auc": auc,
-            "accuracy": acc,
+            "auc": res["auc"],
+            "accuracy": res["accuracy"],
+            "cv_auc": res["cv_auc"],
+            "cv_auc_std": res["cv_auc_std"],
+            "trials": res["trials"],
+            "params": res["params"],
             "rows": int(len(df)),
             "target": target_col,
             "feature_table": feature_table_fq,
         }
-        print(f"[trainer] {name}: auc={auc:.4f}, acc={acc:.4f}")
-
-        if auc > best_auc or (auc == best_auc and acc > best_acc):
-            best_auc = auc
-            best_acc = acc
-            best_name = name
-            best_model = model
+        print(
+            f"[trainer] {name}: cv_auc={res['cv_auc']:.4f}, "
+            f"auc={res['auc']:.4f}, acc={res['accuracy']:.4f}"
+        )
 
-    if best_model is None or best_name is None:
+    if not result["models"]:
         raise RuntimeError("No models trained successfully")
 
+    # choose on CV AUC (the holdout only reports), ties broken by accuracy
+    best_name = max(
+        result["models"],
+        key=lambda n: (result["models"][n]["cv_auc"], result["models"][n]["accuracy"]),
+    )
+    best_model = result["models"][best_name]["model"]
+    best_auc = all_metrics[best_name]["auc"]
+    best_acc = all_metrics[best_name]["accuracy"]
+
     print(f"[trainer] best model: {best_name} (auc={best_auc:.4f}, acc={best_acc:.4f})")
 
     all_metrics["_chosen"] = {
         "name": best_name,
         "auc": best_auc,
         "accuracy": best_acc,
+        "cv_auc": all_metrics[best_name]["cv_auc"],
         "feature_table": feature_table_fq,
     }
+    all_metrics["_search"] = result["summary"]
+    all_metrics["_features"] = coercion_report
 
+    # SHAP first: the model, metrics and explanations go live as one version
+    shap_files = compute_shap(best_name, best_model, X_train, y_train)
     paths = save_artifacts(
-        best_name, best_model, list(X.columns), all_metrics, ARTIFACT_DIR
+        best_name, best_model, list(X.columns), all_metrics, ARTIFACT_DIR, shap_files
     )
-    maybe_compute_shap(best_name, best_model, X_train, ARTIFACT_DIR)
-    maybe_upload_to_s3(ARTIFACT_DIR, S3_BUCKET)
+    maybe_upload_to_s3(ARTIFACT_DIR, S3_BUCKET, paths["version"])
 
+    summary = {**all_metrics["_chosen"], **paths}
     print("[trainer] training complete.")
-    print(json.dumps({**all_metrics["_chosen"], **paths}, indent=2))
+    print(json.dumps(summary, indent=2))
+
+    # structured result for the API job queue (backend/ml_jobs.py)
+    result_path = os.getenv("EXECKPI_JOB_RESULT", "").strip()
+    if result_path:
+        summary["models"] = {
+            name: {k: all_metrics[name][k] for k in ("auc", "accuracy", "cv_auc")}
+            for name in result["models"]
+        }
+        summary["search"] = result["summary"]
+        _write_atomic(Path(result_path), json.dumps(summary).encode("utf-8"))
 
 
 if __name__ == "__main__":
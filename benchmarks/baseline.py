@@ -0,0 +1,79 @@
+# benchmarks/baseline.py
+"""
+Timing summaries and stored baselines.
+
+A suite's results are {benchmark: summary}. `--save` writes them to
+benchmarks/baselines/<suite>.json, and `--check` compares a new run against
+that file. A benchmark regresses when its p50 latency grows (or, for load
+tests, its throughput drops) by more than the tolerance.
+"""
+
+import json
+import os
+import platform
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def summarize(samples_s: Sequence[float]) -> dict:
+    """Latency summary (ms) of per-operation timings in seconds."""
+    ms = np.asarray(samples_s, dtype=float) * 1000.0
+    return {
+        "n": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "min_ms": round(float(ms.min()), 4),
+    }
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(terse=True),
+        "cpus": os.cpu_count(),
+    }
+
+
+def path(suite: str) -> Path:
+    return BASELINE_DIR / f"{suite}.json"
+
+
+def load(suite: str) -> dict:
+    p = path(suite)
+    return json.loads(p.read_text("utf-8")) if p.exists() else {}
+
+
+def save(suite: str, results: Dict[str, dict]) -> Path:
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    p = path(suite)
+    data = {"machine": machine(), "results": results}
+    p.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", "utf-8")
+    return p
+
+
+def compare(
+    results: Dict[str, dict], baseline: dict, tolerance: float = 0.5
+) -> List[str]:
+    """Regressions of `results` against a stored baseline, as messages."""
+    regressions = []
+    for name, base in (baseline.get("results") or {}).items():
+        new = results.get(name)
+        if new is None:
+            continue
+        if new["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {new['p50_ms']:.3f}ms vs baseline {base['p50_ms']:.3f}ms"
+            )
+        if "rps" in base and new.get("rps", 0.0) < base["rps"] / (1 + tolerance):
+            regressions.append(
+                f"{name}: {new.get('rps', 0.0):.1f} req/s vs baseline"
+                f" {base['rps']:.1f} req/s"
+            )
+        if new.get("errors"):
+            regressions.append(f"{name}: {new['errors']} failed requests")
+    return regressions
@@ -0,0 +1,156 @@
+# benchmarks/fake_bq.py
+"""
+Local BigQuery stand-in for benchmarks and load tests.
+
+FakeBigQueryClient answers every query with a synthetic KPI frame of
+`rows` rows (day, revenue, orders, users). A job reports done `latency_s`
+after it was submitted, so the executor's polling, the semaphore and
+single-flight coalescing all run as they do against BigQuery. Jobs carry the
+statistics the metrics layer reads (bytes processed, slot-ms, cache hit).
+
+feature_batches() yields synthetic features_conversion Arrow batches with
+numeric, string-typed and null cells, like the ones the trainer coerces.
+"""
+
+import datetime as dt
+import itertools
+import time
+from types import SimpleNamespace
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+KPI_COLUMNS = ("day", "revenue", "orders", "users")
+
+
+class _Row:
+    __slots__ = ("_values",)
+
+    def __init__(self, values: tuple):
+        self._values = values
+
+    def values(self) -> tuple:
+        return self._values
+
+
+class FakeRowIterator:
+    def __init__(self, rows: List[_Row], page_size: Optional[int] = None):
+        self._rows = rows
+        self._page_size = page_size or len(rows) or 1
+        self.schema = [SimpleNamespace(name=c) for c in KPI_COLUMNS]
+        self.total_rows = len(rows)
+        self.next_page_token = None
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    @property
+    def pages(self) -> Iterator[List[_Row]]:
+        for i in range(0, len(self._rows), self._page_size):
+            yield self._rows[i : i + self._page_size]
+
+    def to_arrow(self, bqstorage_client=None) -> pa.Table:
+        columns = list(zip(*(r.values() for r in self._rows), strict=True))
+        return pa.table(dict(zip(KPI_COLUMNS, columns, strict=True)))
+
+
+class FakeQueryJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, rows: List[_Row], latency_s: float):
+        self.job_id = f"fake-{next(self._ids)}"
+        self._rows = rows
+        self._ready_at = time.monotonic() + latency_s
+        self.state = "RUNNING"
+        self.destination = SimpleNamespace(
+            project="exec-kpi", dataset_id="_fake", table_id=self.job_id
+        )
+        self.total_bytes_processed = len(rows) * 32
+        self.total_bytes_billed = max(10 * 1024 * 1024, len(rows) * 32)
+        self.slot_millis = int(latency_s * 1000)
+        self.cache_hit = False
+
+    def done(self) -> bool:
+        if time.monotonic() >= self._ready_at:
+            self.state = "DONE"
+        return self.state == "DONE"
+
+    def result(self, page_size: Optional[int] = None) -> FakeRowIterator:
+        wait = self._ready_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.state = "DONE"
+        return FakeRowIterator(self._rows, page_size)
+
+    def cancel(self) -> None:
+        self.state = "DONE"
+
+
+class FakeBigQueryClient:
+    project = "exec-kpi"
+
+    def __init__(self, rows: int = 1000, latency_s: float = 0.05, seed: int = 0):
+        self.latency_s = latency_s
+        self.queries = 0
+        self.dry_runs = 0
+        rng = np.random.default_rng(seed)
+        start = dt.date(2024, 1, 1)
+        revenue = rng.gamma(2.0, 500.0, size=rows).round(2)
+        orders = rng.poisson(40, size=rows)
+        users = rng.poisson(300, size=rows)
+        self._rows = [
+            _Row(
+                (
+                    start + dt.timedelta(days=i),
+                    float(revenue[i]),
+                    int(orders[i]),
+                    int(users[i]),
+                )
+            )
+            for i in range(rows)
+        ]
+
+    def query(self, sql: str, job_config=None) -> FakeQueryJob:
+        if getattr(job_config, "dry_run", False):
+            # estimates come back at once, like BigQuery's dry runs
+            self.dry_runs += 1
+            return FakeQueryJob(self._rows, 0.0)
+        self.queries += 1
+        return FakeQueryJob(self._rows, self.latency_s)
+
+    def get_table(self, table):
+        return SimpleNamespace(
+            modified=dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc),
+            table_type="TABLE",
+            num_rows=len(self._rows),
+        )
+
+    def list_rows(self, table, page_size=None, page_token=None) -> FakeRowIterator:
+        return FakeRowIterator(self._rows, page_size)
+
+
+def feature_batches(
+    rows: int = 100_000,
+    features: int = 20,
+    batch_rows: int = 65_536,
+    seed: int = 0,
+) -> Iterator[pa.RecordBatch]:
+    """Synthetic features_conversion batches: float, string and null cells."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, batch_rows):
+        n = min(batch_rows, rows - start)
+        cols = {
+            "user_id": pa.array(np.arange(start, start + n)),
+            "will_convert_14d": pa.array(rng.integers(0, 2, size=n)),
+        }
+        for j in range(features):
+            values = rng.normal(size=n)
+            if j % 5 == 0:
+                # numbers exported as strings, with some blanks
+                cells = [f"{v:.4f}" if i % 50 else "" for i, v in enumerate(values)]
+                cols[f"f{j}"] = pa.array(cells)
+            else:
+                mask = rng.random(n) < 0.01
+                cols[f"f{j}"] = pa.array(values, mask=mask)
+        yield pa.RecordBatch.from_pydict(cols)
@@ -0,0 +1,194 @@
+# benchmarks/load.py
+"""
+Concurrent load test of the API.
+
+By default the app runs in-process (httpx ASGI transport, lifespan included).
+BigQuery is replaced by fake_bq.FakeBigQueryClient, and a small XGBoost model
+is committed to a temp artifact dir for the /ml endpoints, so no credentials
+are needed. Each scenario sends `requests` requests from `concurrency`
+concurrent clients and reports throughput plus p50/p99 latency.
+
+With --url the same scenarios hit a running server instead. The real
+BigQuery is then used, and /ml needs trained artifacts.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks import fake_bq
+from benchmarks.baseline import summarize
+
+N_FEATURES = 8
+COLUMNS = [f"f{j}" for j in range(N_FEATURES)]
+
+
+def _row(i: int) -> dict:
+    return {c: ((i * 31 + j * 7) % 100) / 50.0 - 1.0 for j, c in enumerate(COLUMNS)}
+
+
+# name -> (method, path, body for request i)
+SCENARIOS: Dict[str, Tuple[str, str, Callable[[int], Optional[dict]]]] = {
+    "kpi_query": (
+        "POST",
+        "/kpi/query",
+        lambda i: {"sql_file": "api_revenue_daily.sql", "params": []},
+    ),
+    "ab_test": (
+        "POST",
+        "/ab/test",
+        lambda i: {
+            "a_success": 1000 + i % 50,
+            "a_total": 10000,
+            "b_success": 1050,
+            "b_total": 10000,
+        },
+    ),
+    "ml_predict": ("POST", "/ml/predict", lambda i: {"features": _row(i)}),
+    "ml_predict_batch": (
+        "POST",
+        "/ml/predict",
+        lambda i: {"rows": [_row(i * 100 + k) for k in range(100)]},
+    ),
+    "ml_explain": (
+        "POST",
+        "/ml/explain",
+        lambda i: {"features": _row(i % 20), "top_k": 3},
+    ),
+    "ml_latest": ("GET", "/ml/latest", lambda i: None),
+}
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    method: str,
+    path: str,
+    body: Callable[[int], Optional[dict]],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    """Send `requests` requests from `concurrency` workers; summarize."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, json=body(i))
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {
+        **summarize(latencies),
+        "rps": round(len(latencies) / elapsed, 2),
+        "errors": errors,
+        "concurrency": concurrency,
+    }
+
+
+def _commit_model(artifact_dir: Path) -> None:
+    from xgboost import XGBClassifier
+
+    from backend.artifact_store import ArtifactStore
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, N_FEATURES))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    model = XGBClassifier(n_estimators=50, max_depth=4).fit(X, y)
+    metrics = {"best_model": "xgboost", "auc": 0.9, "n_features": N_FEATURES}
+    ArtifactStore(artifact_dir).commit(
+        model, "xgboost", COLUMNS, {"metrics.json": json.dumps(metrics).encode()}
+    )
+
+
+@contextlib.contextmanager
+def local_app(rows: int, latency_s: float, cache: bool):
+    """backend.main wired to the fake BigQuery client and a temp model."""
+    from backend import main, ml_explain, ml_serving
+
+    fake = fake_bq.FakeBigQueryClient(rows=rows, latency_s=latency_s)
+    saved = {
+        name: getattr(main, name)
+        for name in ("_bq_client", "_kpi_cache", "_model_store", "_explain")
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        _commit_model(Path(tmp))
+        main._bq_client = lambda: fake
+        if not cache:
+            main._kpi_cache = None
+        main._model_store = ml_serving.ModelStore(Path(tmp))
+        main._explain = ml_explain.ExplainService(Path(tmp))
+        try:
+            yield main.app
+        finally:
+            for name, value in saved.items():
+                setattr(main, name, value)
+
+
+async def _run(
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    url: Optional[str],
+    rows: int,
+    latency_s: float,
+    cache: bool,
+) -> Dict[str, dict]:
+    results = {}
+
+    async def run_all(client: httpx.AsyncClient):
+        for name in scenarios:
+            method, path, body = SCENARIOS[name]
+            # warm up: model load, SQL registry, first-request imports
+            await drive(client, method, path, body, concurrency, concurrency)
+            results[name] = await drive(
+                client, method, path, body, requests, concurrency
+            )
+
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            await run_all(client)
+    else:
+        # the app's own log lines would drown the report
+        with (
+            local_app(rows, latency_s, cache) as app,
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            transport = httpx.ASGITransport(app=app)
+            async with app.router.lifespan_context(app):
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://bench", timeout=60
+                ) as client:
+                    await run_all(client)
+    for name, summary in results.items():
+        print(f"[load] {name}: {summary}")
+    return results
+
+
+def run(
+    only=None,
+    requests: int = 400,
+    concurrency: int = 16,
+    url: Optional[str] = None,
+    rows: int = 1000,
+    latency_s: float = 0.05,
+    cache: bool = False,
+) -> Dict[str, dict]:
+    scenarios = [s for s in SCENARIOS if not only or s in only]
+    return asyncio.run(
+        _run(scenarios, requests, concurrency, url, rows, latency_s, cache)
+    )
@@ -0,0 +1,138 @@
+# benchmarks/micro.py
+"""
+Micro-benchmarks of the hot Python paths.
+
+    ab_test          POST /ab/test handler (z-test + CI), called directly
+    to_native        numpy -> JSON-safe conversion of a 1k-entry result
+    coerce_cell      per-cell feature coercion (numbers, strings, nulls)
+    load_features    trainer feature load + coercion of 50k synthetic rows
+    train[<model>]   train_engine.search for one model: 2-fold CV + refit
+                     of its default params on 2k rows (search "none", so
+                     the number of trials does not change the timing)
+"""
+
+import contextlib
+import io
+import time
+import warnings
+from functools import partial
+from typing import Callable, Dict
+
+import numpy as np
+
+from backend import feature_prep, train_engine, train_explain
+from backend import main as api
+from benchmarks import fake_bq
+from benchmarks.baseline import summarize
+
+
+def bench(fn: Callable[[], object], repeat: int, number: int = 1) -> dict:
+    """Time `repeat` samples of `number` calls; summary is per call."""
+    fn()  # warm up caches and lazy imports
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return summarize(samples)
+
+
+def _quiet(fn: Callable[[], object]) -> Callable[[], object]:
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return fn()
+
+    return run
+
+
+def ab_test() -> dict:
+    payload = {
+        "a_success": 13880,
+        "a_total": 49962,
+        "b_success": 13971,
+        "b_total": 50038,
+        "alpha": 0.05,
+    }
+    return bench(lambda: api.ab_test(payload), repeat=50, number=100)
+
+
+def to_native() -> dict:
+    result = {
+        f"k{i}": {
+            "rate": np.float64(i / 1000),
+            "count": np.int64(i),
+            "significant": np.bool_(i % 2),
+            "bins": [np.float32(j) for j in range(10)],
+        }
+        for i in range(1000)
+    }
+    return bench(lambda: api._to_native(result), repeat=30)
+
+
+def coerce_cell() -> dict:
+    cells = ["1.5", " 2 ", "", None, 3, 4.25, "[7.0]", "n/a", [1.0, 2.0], np.nan]
+    cells = cells * 1000
+
+    def run():
+        for v in cells:
+            feature_prep.coerce_cell(v)
+
+    return bench(run, repeat=20)
+
+
+def load_features(rows: int = 50_000) -> dict:
+    real = train_explain.feature_batches
+
+    def batches():
+        return "fake", fake_bq.feature_batches(rows=rows, batch_rows=16_384)
+
+    train_explain.feature_batches = batches
+    try:
+        return bench(_quiet(train_explain.load_features), repeat=5)
+    finally:
+        train_explain.feature_batches = real
+
+
+def train_search(model: str, rows: int = 2_000, features: int = 20) -> dict:
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(rows, features)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(size=rows) > 0.5).astype(int)
+    split = int(rows * 0.8)
+
+    def run():
+        return train_engine.search(
+            X[:split],
+            y[:split],
+            X[split:],
+            y[split:],
+            models=(model,),
+            search="none",
+            folds=2,
+            workers=1,
+            budget_s=600,
+        )
+
+    return bench(_quiet(run), repeat=3)
+
+
+BENCHMARKS: Dict[str, Callable[[], dict]] = {
+    "ab_test": ab_test,
+    "to_native": to_native,
+    "coerce_cell": coerce_cell,
+    "load_features": load_features,
+    **{
+        f"train[{model}]": partial(train_search, model) for model in train_engine.MODELS
+    },
+}
+
+
+def run(only=None) -> Dict[str, dict]:
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        results[name] = fn()
+        print(f"[bench] {name}: {results[name]}")
+    return results
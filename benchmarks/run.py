@@ -0,0 +1,84 @@
+# benchmarks/run.py
+"""
+Run the benchmark suites and compare them with the stored baselines.
+
+    python -m benchmarks.run micro                 # micro-benchmarks
+    python -m benchmarks.run load [--url URL]      # concurrent load test
+    python -m benchmarks.run all --check           # exit 1 on a regression
+                                                   # (same machine as baseline)
+    python -m benchmarks.run all --save            # record new baselines
+"""
+
+import argparse
+import sys
+
+from benchmarks import baseline, load, micro
+
+SUITES = ("micro", "load")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ExecKPI benchmarks")
+    parser.add_argument("suite", choices=[*SUITES, "all"], nargs="?", default="all")
+    parser.add_argument("--only", nargs="*", help="benchmark/scenario names")
+    parser.add_argument("--save", action="store_true", help="write baselines")
+    parser.add_argument("--check", action="store_true", help="fail on regressions")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="allowed slowdown before --check fails (0.5 = 50%%)",
+    )
+    parser.add_argument("--url", help="load-test a running server instead")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=1000, help="fake KPI rows")
+    parser.add_argument(
+        "--latency-ms", type=float, default=50, help="fake BigQuery job latency"
+    )
+    parser.add_argument("--cache", action="store_true", help="keep the KPI cache on")
+    args = parser.parse_args(argv)
+
+    suites = SUITES if args.suite == "all" else (args.suite,)
+    regressions = []
+    for suite in suites:
+        print(f"[bench] suite {suite}")
+        if suite == "micro":
+            results = micro.run(args.only)
+        else:
+            results = load.run(
+                args.only,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                url=args.url,
+                rows=args.rows,
+                latency_s=args.latency_ms / 1000.0,
+                cache=args.cache,
+            )
+        if args.check:
+            base = baseline.load(suite)
+            found = baseline.compare(results, base, args.tolerance)
+            if not base:
+                print(f"[bench] no baseline for {suite}; run with --save first")
+            elif base.get("machine") != baseline.machine():
+                # timings from another machine say nothing: warn about them,
+                # and only fail on failed requests (no timing fits inf)
+                print(f"[bench] baseline machine differs: {base.get('machine')}")
+                for msg in found:
+                    print(f"[bench] warning (not checked) {msg}")
+                regressions += baseline.compare(results, base, float("inf"))
+            else:
+                regressions += found
+        if args.save:
+            if args.only or args.url:
+                print(f"[bench] not saving {suite}: partial or remote run")
+            else:
+                print(f"[bench] baseline written to {baseline.save(suite, results)}")
+
+    for msg in regressions:
+        print(f"[bench] REGRESSION {msg}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
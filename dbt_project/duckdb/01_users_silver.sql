@@ -0,0 +1,4 @@
+-- silver: thelook.users as-is
+select
+  *
+from thelook.users
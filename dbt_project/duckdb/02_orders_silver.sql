@@ -0,0 +1,4 @@
+-- silver: thelook.orders as-is
+select
+  *
+from thelook.orders
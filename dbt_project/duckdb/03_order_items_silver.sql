@@ -0,0 +1,4 @@
+-- silver: thelook.order_items as-is
+select
+  *
+from thelook.order_items
@@ -0,0 +1,4 @@
+-- silver: thelook.events as-is
+select
+  *
+from thelook.events
@@ -0,0 +1,45 @@
+-- WEEKLY RETENTION BY SIGNUP COHORT (weeks start on Monday, as in BigQuery)
+with cohorts as (
+  select
+    u.id as user_id,
+    date_trunc('week', date(u.created_at)) as cohort_week
+  from execkpi_execkpi.users_silver u
+),
+activity as (
+  select
+    e.user_id,
+    date_trunc('week', date(e.created_at)) as activity_week
+  from execkpi_execkpi.events_silver e
+  where e.user_id is not null
+),
+joined as (
+  select
+    c.cohort_week,
+    a.user_id,
+    cast(date_diff('week', c.cohort_week, a.activity_week) as bigint) as week_n
+  from cohorts c
+  join activity a
+    on a.user_id = c.user_id
+  where date_diff('week', c.cohort_week, a.activity_week) between 0 and 12
+),
+cohort_sizes as (
+  select cohort_week, count(distinct user_id) as cohort_users
+  from cohorts
+  group by cohort_week
+),
+retention as (
+  select
+    j.cohort_week,
+    j.week_n,
+    count(distinct j.user_id) as active_users
+  from joined j
+  group by j.cohort_week, j.week_n
+)
+select
+  r.cohort_week,
+  r.week_n,
+  safe_divide(r.active_users, cs.cohort_users) as retention_rate
+from retention r
+join cohort_sizes cs
+  on cs.cohort_week = r.cohort_week
+order by r.cohort_week, r.week_n
@@ -0,0 +1,14 @@
+-- DETERMINISTIC 50/50 A/B ASSIGNMENT PER USER
+-- DuckDB has no FARM_FINGERPRINT: hash() gives a stable split, but not the
+-- same users per group as BigQuery.
+with users as (
+  select id as user_id
+  from execkpi_execkpi.users_silver
+)
+select
+  user_id,
+  case
+    when hash(cast(user_id as varchar)) % 100 < 50 then 'A'
+    else 'B'
+  end as ab_group
+from users
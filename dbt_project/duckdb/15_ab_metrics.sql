@@ -0,0 +1,17 @@
+-- PER-GROUP CONVERSION METRICS
+with base as (
+  select
+    g.ab_group,
+    f.converted
+  from execkpi_execkpi.funnel_users as f
+  join execkpi_execkpi.ab_group as g
+    on f.user_id = g.user_id
+)
+select
+  ab_group,
+  count(*) as users,
+  sum(cast(converted as bigint)) as converters,
+  safe_divide(sum(cast(converted as bigint)), count(*)) as conversion_rate
+from base
+group by ab_group
+order by ab_group
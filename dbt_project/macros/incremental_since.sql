@@ -0,0 +1,15 @@
+{#
+  First day an incremental gold model recomputes.
+
+  The DAG passes its run date (`--vars '{"execkpi_run_date": "{{ ds }}"}'`);
+  without it we count back from today. `execkpi_lookback_days` re-processes a
+  few days before that, so late-arriving events and order status changes are
+  merged into partitions that were already built.
+#}
+{% macro incremental_since(extra_days=0) %}
+  {%- set run_date = var('execkpi_run_date', none) -%}
+  date_sub(
+    {% if run_date %}date('{{ run_date }}'){% else %}current_date(){% endif %},
+    interval {{ var('execkpi_lookback_days') | int + extra_days }} day
+  )
+{%- endmacro %}
@@ -1,10 +1,35 @@
-{{ config(materialized='view', alias='features_conversion') }}
+{{
+  config(
+    materialized='incremental',
+    alias='features_conversion',
+    incremental_strategy='merge',
+    unique_key='user_id',
+    cluster_by=['user_id']
+  )
+}}
 
 -- Purpose: feature view (R/F/M + source mix) + 14-day conversion label
+-- Incremental runs recompute only users with an event or order in the lookback
+-- window: everything else about a user (anchor, 30d features, label) is fixed.
 
-with last_event as (
+with
+{% if is_incremental() %}
+changed_users as (
+  select user_id
+  from {{ ref('events_silver') }}
+  where date(created_at) >= {{ incremental_since() }}
+  union distinct
+  select user_id
+  from {{ ref('orders_silver') }}
+  where date(created_at) >= {{ incremental_since() }}
+),
+{% endif %}
+last_event as (
   select user_id, max(created_at) as anchor_ts
   from {{ ref('events_silver') }}
+  {% if is_incremental() %}
+  where user_id in (select user_id from changed_users)
+  {% endif %}
   group by 1
 ),
 rfm as (
@@ -38,6 +63,9 @@ source_mix as (
     safe_divide(countif(traffic_source = 'Ads'),     count(*)) as pct_ads,
     safe_divide(countif(traffic_source = 'Social'),  count(*)) as pct_social
   from {{ ref('events_silver') }}
+  {% if is_incremental() %}
+  where user_id in (select user_id from changed_users)
+  {% endif %}
   group by 1
 ),
 label as (
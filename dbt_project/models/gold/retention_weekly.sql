@@ -1,10 +1,26 @@
-{{ config(materialized='view', alias='retention_weekly') }}
+{{
+  config(
+    materialized='incremental',
+    alias='retention_weekly',
+    incremental_strategy='merge',
+    unique_key=['cohort_week', 'week_n'],
+    partition_by={'field': 'cohort_week', 'data_type': 'date', 'granularity': 'month'},
+    cluster_by=['week_n']
+  )
+}}
+
+-- A cohort keeps changing for 12 weeks after it starts, so an incremental run
+-- recomputes every cohort that can still see activity from the lookback window.
 
 with cohorts as (
   select
     u.id as user_id,
     date_trunc(date(u.created_at), week(monday)) as cohort_week
   from {{ ref('users_silver') }} u
+  {% if is_incremental() %}
+  where date_trunc(date(u.created_at), week(monday))
+    >= date_trunc({{ incremental_since(extra_days=84) }}, week(monday))
+  {% endif %}
 ),
 activity as (
   select
@@ -12,6 +28,10 @@ activity as (
     date_trunc(date(e.created_at), week(monday)) as activity_week
   from {{ ref('events_silver') }} e
   where e.user_id is not null
+  {% if is_incremental() %}
+    and date(e.created_at)
+      >= date_trunc({{ incremental_since(extra_days=84) }}, week(monday))
+  {% endif %}
 ),
 joined as (
   select
@@ -43,4 +63,3 @@ select
 from retention r
 join cohort_sizes cs
   on cs.cohort_week = r.cohort_week
-order by cohort_week, week_n
@@ -1,4 +1,13 @@
-{{ config(materialized='view', alias='revenue_daily') }}
+{{
+  config(
+    materialized='incremental',
+    alias='revenue_daily',
+    incremental_strategy='merge',
+    unique_key='day',
+    partition_by={'field': 'day', 'data_type': 'date', 'granularity': 'month'},
+    cluster_by=['day']
+  )
+}}
 
 -- DAILY ORDERS / REVENUE / AOV (COMPLETED ORDERS)
 with items as (
@@ -9,6 +18,10 @@ with items as (
   from {{ ref('orders_silver') }} as o
   join {{ ref('order_items_silver') }} as oi
     on o.order_id = oi.order_id
+  {% if is_incremental() %}
+  -- only days inside the lookback window are recomputed and merged
+  where date(o.created_at) >= {{ incremental_since() }}
+  {% endif %}
 )
 select
   day,
@@ -20,4 +33,3 @@ select
   ) as aov
 from items
 group by day
-order by day
@@ -2,16 +2,20 @@ import { useEffect, useState } from "react";
 import
   {
     runSQL,
+    getCatalog,
     getABSample,
     runABTest,
     trainML,
+    waitMLJob,
     latestML,
     getShap,
   } from "./api";
 import type {
+  KPICatalog,
   KPIResponse,
   ABSampleResponse,
   ABTestResult,
+  MLJob,
   ShapSummary,
 } from "./api";
 
@@ -184,16 +188,37 @@ function KPIPanel ( {
   );
   const [ sqlFile, setSqlFile ] = useState<string>( "api_revenue_daily.sql" );
   const [ loading, setLoading ] = useState( false );
+  const [ catalog, setCatalog ] = useState<KPICatalog[ "queries" ] | null>( null );
+
+  // discover the available queries once; fall back to the static list
+  useEffect( () =>
+  {
+    getCatalog()
+      .then( ( c ) => setCatalog( c.queries ) )
+      .catch( () => setCatalog( null ) );
+  }, [] );
+
+  const sqlFiles = catalog ? catalog.map( ( q ) => q.sql_file ) : KPI_SQL_FILES;
+
+  // only send the params the selected query declares
+  const paramsFor = ( file: string ) =>
+  {
+    const values: Record<string, string> = { start, end };
+    const declared = catalog?.find( ( q ) => q.sql_file === file )?.params
+      ?? ( file === "api_revenue_daily.sql"
+        ? [ { name: "start", type: "DATE" }, { name: "end", type: "DATE" } ]
+        : [] );
+    return declared
+      .filter( ( p ) => p.name in values )
+      .map( ( p ) => ( { name: p.name, type: p.type, value: values[ p.name ] } ) );
+  };
 
   const fetchKPI = () =>
   {
     setLoading( true );
     setError( null );
     setOutput( { status: "loading-kpi" } );
-    runSQL( sqlFile, [
-      { name: "start", type: "DATE", value: start },
-      { name: "end", type: "DATE", value: end },
-    ] )
+    runSQL( sqlFile, paramsFor( sqlFile ) )
       .then( ( data ) => setOutput( data ) )
       .catch( ( err: unknown ) =>
         setError( err instanceof Error ? err.message : "Request failed" ),
@@ -225,7 +250,7 @@ function KPIPanel ( {
               minWidth: "210px",
             } }
           >
-            { KPI_SQL_FILES.map( ( f ) => (
+            { sqlFiles.map( ( f ) => (
               <option key={ f } value={ f }>
                 { f }
               </option>
@@ -487,6 +512,7 @@ function MLPanel ( {
 } )
 {
   const [ training, setTraining ] = useState( false );
+  const [ trainProgress, setTrainProgress ] = useState<string | null>( null );
   const [ loadingLatest, setLoadingLatest ] = useState( false );
   const [ loadingShap, setLoadingShap ] = useState( false );
   const [ panelError, setPanelError ] = useState<string | null>( null );
@@ -497,14 +523,28 @@ function MLPanel ( {
     setPanelError( null );
     setError( null );
     trainML()
-      .then( ( data ) => setOutput( data ) )
+      .then( ( job ) => waitMLJob( job.job_id, ( j: MLJob ) => setTrainProgress( j.progress ) ) )
+      .then( ( job ) =>
+      {
+        setOutput( job.result ?? job );
+        if ( job.status !== "succeeded" )
+        {
+          const msg = job.error ?? `Training ${ job.status }`;
+          setPanelError( msg );
+          setError( msg );
+        }
+      } )
       .catch( ( err: unknown ) =>
       {
         const msg = err instanceof Error ? err.message : "Request failed";
         setPanelError( msg );
         setError( msg );
       } )
-      .finally( () => setTraining( false ) );
+      .finally( () =>
+      {
+        setTraining( false );
+        setTrainProgress( null );
+      } );
   };
 
   const handleLatest = () =>
@@ -595,6 +635,10 @@ function MLPanel ( {
       </div>
       { panelError ? (
         <p style={ { color: "crimson", marginTop: "0.5rem" } }>{ panelError }</p>
+      ) : training ? (
+        <p style={ { color: "#6b7280", marginTop: "0.5rem" } }>
+          { trainProgress ?? "Training job queued…" }
+        </p>
       ) : (
         <p style={ { color: "#6b7280", marginTop: "0.5rem" } }>
           Uses artifacts/metrics.json and artifacts/shap_summary.json from
@@ -7,6 +7,19 @@ export type KPIResponse = {
   rows: number;
   columns: string[];
   data: Record<string, unknown>[];
+  cache?: { hit: boolean; age_s: number };
+  // present when the request asked for a page (page_size / page_token)
+  total_rows?: number;
+  next_page_token?: string | null;
+};
+
+// GET /kpi/catalog: queries the backend will run, with declared params
+export type KPICatalog = {
+  queries: Array<{
+    sql_file: string;
+    description: string;
+    params: Array<{ name: string; type: string; description: string }>;
+  }>;
 };
 
 export type ABSampleResponse = {
@@ -36,20 +49,33 @@ export type ShapSummary = {
   importances: Array<{
     feature: string;
     mean_abs_shap: number;
+    mean_shap?: number;
   }>;
+  explainer?: string;
+  rows?: number;
+  partial?: boolean;
 };
 
 export async function runSQL(
   sqlFile: string,
-  params: Array<{ name: string; type: string; value: string }>
+  params: Array<{ name: string; type: string; value: string }>,
+  page?: { pageSize: number; pageToken?: string | null }
 ): Promise<KPIResponse> {
   const res = await axios.post(`${API_BASE}/kpi/query`, {
     sql_file: sqlFile,
     params,
+    ...( page
+      ? { page_size: page.pageSize, page_token: page.pageToken ?? undefined }
+      : {} ),
   });
   return res.data as KPIResponse;
 }
 
+export async function getCatalog(): Promise<KPICatalog> {
+  const res = await axios.get(`${API_BASE}/kpi/catalog`);
+  return res.data as KPICatalog;
+}
+
 export async function getABSample(): Promise<ABSampleResponse> {
   const res = await axios.get(`${API_BASE}/ab/sample`);
   return res.data as ABSampleResponse;
@@ -66,9 +92,41 @@ export async function runABTest(payload: {
   return res.data as ABTestResult;
 }
 
-export async function trainML(): Promise<unknown> {
+// POST /ml/train queues a background job; poll GET /ml/jobs/{job_id}
+export type MLJob = {
+  job_id: string;
+  kind: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  elapsed_s: number | null;
+  progress: string | null;
+  log_tail: string[];
+  result: Record<string, unknown> | null;
+  error: string | null;
+  deduplicated?: boolean;
+};
+
+export async function trainML(): Promise<MLJob> {
   const res = await axios.post(`${API_BASE}/ml/train`);
-  return res.data;
+  return res.data as MLJob;
+}
+
+export async function getMLJob(jobId: string): Promise<MLJob> {
+  const res = await axios.get(`${API_BASE}/ml/jobs/${jobId}`);
+  return res.data as MLJob;
+}
+
+// resolves once the job has finished (any terminal status)
+export async function waitMLJob(
+  jobId: string,
+  onUpdate?: (job: MLJob) => void,
+  intervalMs = 2000
+): Promise<MLJob> {
+  for (;;) {
+    const job = await getMLJob(jobId);
+    onUpdate?.(job);
+    if (job.status !== "queued" && job.status !== "running") return job;
+    await new Promise((r) => setTimeout(r, intervalMs));
+  }
 }
 
 export async function latestML(): Promise<unknown> {
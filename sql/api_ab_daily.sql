@@ -0,0 +1,30 @@
+-- API-friendly: one signup cohort's A/B increment for sequential monitoring (/ab/sequential)
+-- @param day DATE  signup day of the cohort
+-- @param until DATE  end of the conversion window (exclusive)
+-- total = users who signed up on @day, success = those of them whose first
+-- completed order falls in [@day, @until). Every cohort gets the same window,
+-- so success <= total and each day's rate measures the same thing.
+WITH first_conversion AS (
+  SELECT
+    user_id,
+    MIN(DATE(created_at)) AS day
+  FROM `execkpi_execkpi.orders_silver`
+  WHERE status = 'Complete'
+  GROUP BY user_id
+),
+cohort AS (
+  SELECT id AS user_id
+  FROM `execkpi_execkpi.users_silver`
+  WHERE DATE(created_at) = @day
+)
+SELECT
+  g.ab_group,
+  COUNTIF(s.user_id IS NOT NULL) AS total,
+  COUNTIF(s.user_id IS NOT NULL AND c.day >= @day AND c.day < @until) AS success
+FROM `execkpi_execkpi.ab_group` AS g
+LEFT JOIN cohort AS s
+  ON g.user_id = s.user_id
+LEFT JOIN first_conversion AS c
+  ON g.user_id = c.user_id
+GROUP BY g.ab_group
+ORDER BY g.ab_group;
@@ -1,4 +1,7 @@
 -- API-friendly: ab_group
+-- A view over the users table; LIMIT does not reduce the bytes scanned.
+-- @max_bytes 1GB
+-- @budget_ms 30000
 SELECT
   user_id,
   ab_group
@@ -0,0 +1,23 @@
+-- API-friendly: revenue-per-user histogram by A/B group (input for /ab/bootstrap)
+-- Users are bucketed by completed-order revenue rounded to whole units;
+-- revenue_sum keeps the exact total per bucket.
+WITH user_revenue AS (
+  SELECT
+    o.user_id,
+    SUM(oi.sale_price) AS revenue
+  FROM `execkpi_execkpi.orders_silver` AS o
+  JOIN `execkpi_execkpi.order_items_silver` AS oi
+    ON o.order_id = oi.order_id
+  WHERE o.status = 'Complete'
+  GROUP BY o.user_id
+)
+SELECT
+  g.ab_group,
+  ROUND(COALESCE(r.revenue, 0), 0) AS revenue_bucket,
+  COUNT(*) AS users,
+  SUM(COALESCE(r.revenue, 0)) AS revenue_sum
+FROM `execkpi_execkpi.ab_group` AS g
+LEFT JOIN user_revenue AS r
+  ON g.user_id = r.user_id
+GROUP BY ab_group, revenue_bucket
+ORDER BY ab_group, revenue_bucket;
@@ -1,4 +1,9 @@
 -- API-friendly: features_conversion
+-- LIMIT does not reduce the bytes scanned: over the cap, the sampled
+-- variant runs instead.
+-- @max_bytes 1GB
+-- @budget_ms 30000
+-- @fallback api_features_conversion_sample.sql
 SELECT
   user_id,
   days_since_signup,
@@ -0,0 +1,17 @@
+-- API-friendly: features_conversion, 1% block sample (reads ~1% of the table)
+-- @max_bytes 1GB
+-- @budget_ms 30000
+SELECT
+  user_id,
+  days_since_signup,
+  orders_30d,
+  revenue_30d,
+  frequency_30d,
+  pct_email,
+  pct_direct,
+  pct_organic,
+  pct_ads,
+  pct_social,
+  will_convert_14d
+FROM `execkpi_execkpi.features_conversion` TABLESAMPLE SYSTEM (1 PERCENT)
+LIMIT 5000;
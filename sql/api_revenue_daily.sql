@@ -1,4 +1,6 @@
 -- API-friendly: revenue_daily
+-- @param start DATE  first day to include (NULL = open)
+-- @param end   DATE  last day to include (NULL = open)
 SELECT
   day,
   orders,
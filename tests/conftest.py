@@ -0,0 +1,81 @@
+import datetime as dt
+from types import SimpleNamespace
+
+import pytest
+
+import backend.main as main
+from backend import query_governor
+
+
+class _Rows(list):
+    schema = []
+
+
+class FakeJob:
+    job_id = "job-1"
+    state = "DONE"
+    total_bytes_billed = 10485760
+    slot_millis = 1500
+    cache_hit = False
+
+    def __init__(self, rows, columns, total_bytes_processed):
+        self._rows = rows
+        self._columns = columns
+        self.total_bytes_processed = total_bytes_processed
+
+    def done(self):
+        return True
+
+    def result(self, page_size=None):
+        rows = _Rows(SimpleNamespace(values=lambda r=r: r) for r in self._rows)
+        rows.schema = [SimpleNamespace(name=c) for c in self._columns]
+        return rows
+
+
+class FakeBigQueryClient:
+    """
+    One-row KPI answers for the API tests. Dry runs report `sizes[table]`
+    bytes for the first table name found in the SQL, and are counted apart
+    from real jobs.
+    """
+
+    project = "exec-kpi"
+
+    def __init__(self, rows=None, columns=("day", "revenue"), sizes=None):
+        self.rows = rows if rows is not None else [(dt.date(2024, 1, 1), 10.0)]
+        self.columns = columns
+        self.sizes = sizes or {}
+        self.queries = 0
+        self.dry_runs = 0
+        self.configs = []
+
+    def query(self, sql, job_config=None):
+        if getattr(job_config, "dry_run", False):
+            self.dry_runs += 1
+            size = next((n for t, n in self.sizes.items() if t in sql), 1000)
+            return FakeJob([], self.columns, size)
+        self.queries += 1
+        self.configs.append(job_config)
+        return FakeJob(self.rows, self.columns, 1000)
+
+    def get_table(self, table):
+        return SimpleNamespace(modified=dt.datetime(2024, 1, 1))
+
+
+@pytest.fixture
+def fake_bq(monkeypatch):
+    """
+    Point backend.main at a FakeBigQueryClient, with the result cache off and
+    a fresh query governor. Call it with client kwargs; returns the client.
+    """
+
+    def install(**kwargs):
+        client = FakeBigQueryClient(**kwargs)
+        monkeypatch.setattr(main, "_bq_client", lambda: client)
+        monkeypatch.setattr(main, "_kpi_cache", None)
+        monkeypatch.setattr(
+            main, "_governor", query_governor.QueryGovernor(main._sql_registry)
+        )
+        return client
+
+    return install
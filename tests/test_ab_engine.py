@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from backend.ab_engine import AbInputError, _adjust, run_batch
+from backend.main import ab_test
+
+
+def test_single_pair_matches_ab_test():
+    single = ab_test(
+        {"a_success": 120, "a_total": 1000, "b_success": 150, "b_total": 980}
+    )
+    pairs = run_batch(["exp"], ["A"], [120], [1000], alpha=0.05)
+    assert pairs["pairs"]["arm_a"] == []  # one arm alone has no pair
+
+    out = run_batch(["exp", "exp"], ["A", "B"], [120, 150], [1000, 980])
+    pair, fam = out["pairs"], out["families"]
+    assert pair["uplift"][0] == pytest.approx(single["uplift"])
+    assert pair["p_value"][0] == pytest.approx(single["p_value"])
+    assert pair["ci_low"][0] == pytest.approx(
+        single["ci_95"][0], rel=1e-3
+    )  # 1.96 vs exact z
+    assert fam["srm_p"][0] == pytest.approx(single["srm_p"])
+
+
+def test_families_and_control():
+    out = run_batch(
+        experiment=["e1", "e1", "e1", "e2", "e2"],
+        arm=["A", "B", "C", "A", "B"],
+        successes=[100, 120, 90, 10, 12],
+        totals=[1000, 1000, 1000, 100, 100],
+        control="B",
+    )
+    pairs = out["pairs"]
+    assert list(
+        zip(pairs["experiment"], pairs["arm_a"], pairs["arm_b"], strict=True)
+    ) == [
+        ("e1", "B", "A"),
+        ("e1", "B", "C"),
+        ("e2", "B", "A"),
+    ]
+    assert out["families"]["arms"] == [3, 2]
+
+
+def test_adjustments_match_reference():
+    p = np.array([0.01, 0.04, 0.03, 0.2, 0.5])
+    family = np.array([0, 0, 0, 1, 1])
+    holm = _adjust(p, family, "holm")
+    bh = _adjust(p, family, "bh")
+    np.testing.assert_allclose(holm, [0.03, 0.06, 0.06, 0.4, 0.5])
+    np.testing.assert_allclose(bh, [0.03, 0.04, 0.04, 0.4, 0.5])
+
+
+def test_rejects_bad_input():
+    with pytest.raises(AbInputError):
+        run_batch(["e"], ["A", "B"], [1], [10])
+    with pytest.raises(AbInputError):
+        run_batch(["e", "e"], ["A", "A"], [1, 1], [10, 10])
+    with pytest.raises(AbInputError):
+        run_batch(["e", "e"], ["A", "B"], [11, 1], [10, 10])
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from backend.ab_resample import (
+    ResampleInputError,
+    beta_binomial,
+    bootstrap_means,
+    compress_histogram,
+    histograms_from_columns,
+)
+
+
+def test_beta_binomial_is_seeded_and_sensible():
+    args = (["A", "B"], [120, 150], [1000, 980])
+    first = beta_binomial(*args, draws=5000, seed=7)
+    again = beta_binomial(*args, draws=5000, seed=7)
+    assert first == again
+
+    control, treat = first["arms"]
+    assert control["control"] and "prob_beat_control" not in control
+    assert 0.95 < treat["prob_beat_control"] < 1.0
+    assert treat["expected_loss"] < control["expected_loss"]
+    lo, hi = treat["credible_interval"]
+    assert lo < treat["posterior_mean"] < hi
+
+
+def test_compress_keeps_mean_and_isolates_heavy_values():
+    rng = np.random.default_rng(0)
+    values = np.arange(2000, dtype=float)
+    counts = np.r_[100_000, rng.integers(1, 50, 1999)]
+    v, c = compress_histogram(values, counts, bins=64)
+    assert len(v) <= 64
+    assert c.sum() == counts.sum()
+    assert (v @ c) / c.sum() == pytest.approx((values @ counts) / counts.sum())
+    assert 0.0 in v  # zero-revenue users keep their own bin
+
+
+def test_bootstrap_interval_covers_lift():
+    groups = {
+        "A": ([0.0, 10.0, 50.0], [9000, 800, 200]),
+        "B": ([0.0, 10.0, 50.0], [8800, 900, 300]),
+    }
+    out = bootstrap_means(groups, draws=4000, seed=1)
+    a, b = out["groups"]
+    assert a["mean"] == pytest.approx(1.8)
+    assert b["lift"] == pytest.approx(0.6)
+    lo, hi = b["lift_interval"]
+    assert lo < 0.6 < hi
+    assert b["prob_above_control"] > 0.9
+
+
+def test_compressed_bootstrap_keeps_interval_width():
+    # 70% zero revenue, lognormal tail: thousands of distinct values
+    rng = np.random.default_rng(3)
+    groups = {}
+    for name in ("A", "B"):
+        paid = rng.random(20_000) >= 0.7
+        revenue = np.where(paid, np.round(rng.lognormal(3, 1.2, 20_000), 2), 0.0)
+        values, counts = np.unique(revenue, return_counts=True)
+        groups[name] = (values, counts)
+    assert len(groups["A"][0]) > 1000
+
+    exact = bootstrap_means(groups, draws=4000, seed=5, bins=10**6)
+    merged = bootstrap_means(groups, draws=4000, seed=5, bins=64)
+    assert merged["groups"][0]["bins"] <= 64
+    for e, m in zip(exact["groups"], merged["groups"], strict=True):
+        assert m["mean"] == pytest.approx(e["mean"])
+        width = np.diff(m["interval"])[0] / np.diff(e["interval"])[0]
+        assert width == pytest.approx(1.0, abs=0.06)
+    width = np.diff(merged["groups"][1]["lift_interval"])[0]
+    assert width / np.diff(exact["groups"][1]["lift_interval"])[0] == pytest.approx(
+        1.0, abs=0.06
+    )
+
+
+def test_histograms_from_columns_and_errors():
+    data = {"ab_group": ["A", "A", "B"], "users": [3, 2, 4], "revenue_sum": [0, 9, 8]}
+    assert histograms_from_columns(data) == {
+        "A": ([0.0, 4.5], [3, 2]),
+        "B": ([2.0], [4]),
+    }
+    with pytest.raises(ResampleInputError):
+        beta_binomial(["A", "B"], [5, 1], [4, 10])
+    with pytest.raises(ResampleInputError):
+        bootstrap_means({"A": ([1.0], [1])})
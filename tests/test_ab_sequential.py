@@ -0,0 +1,48 @@
+import pytest
+
+from backend.ab_sequential import SequentialError, SequentialStore, msprt
+
+
+def _inc(a_s, a_n, b_s, b_n):
+    return {"A": {"success": a_s, "total": a_n}, "B": {"success": b_s, "total": b_n}}
+
+
+def test_msprt_no_evidence_without_effect():
+    lam, p, (lo, hi) = msprt(10000, 1000, 10000, 1000, tau2=1e-4, alpha=0.05)
+    assert lam < 1 and p == 1.0
+    assert lo < 0 < hi
+
+
+def test_fold_is_incremental_and_idempotent(tmp_path):
+    store = SequentialStore(tmp_path / "seq.sqlite")
+    for day in range(20):
+        state = store.fold("exp", increment=_inc(100, 1000, 130, 1000), key=f"d{day}")
+    assert state["looks"] == 20
+    assert state["group"]["B"]["total"] == 20000
+    assert state["decision"] == "treatment_better"
+
+    p_before = state["p_value"]
+    again = store.fold("exp", increment=_inc(100, 1000, 130, 1000), key="d3")
+    assert again["folded"] is False and again["looks"] == 20
+
+    # a null look can never raise the always-valid p-value
+    after = store.fold("exp", increment=_inc(500, 1000, 100, 1000))
+    assert after["p_value"] <= p_before
+
+    # state survives reopening
+    store.close()
+    reopened = SequentialStore(tmp_path / "seq.sqlite")
+    assert reopened.get("exp")["looks"] == 21
+
+
+def test_snapshot_folds_difference(tmp_path):
+    store = SequentialStore(tmp_path / "seq.sqlite")
+    store.fold("exp", snapshot=_inc(10, 100, 12, 100))
+    state = store.fold("exp", snapshot=_inc(25, 250, 30, 260))
+    assert state["group"]["A"] == {"success": 25, "total": 250, "rate": 0.1}
+    with pytest.raises(SequentialError):
+        store.fold("exp", snapshot=_inc(1, 10, 1, 10))
+    with pytest.raises(SequentialError):
+        store.fold("exp", increment=_inc(1, 10, 1, 10), snapshot=_inc(1, 10, 1, 10))
+    with pytest.raises(SequentialError):
+        store.fold("exp", increment=_inc(11, 10, 1, 10))
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+
+from backend.artifact_store import ArtifactError, ArtifactStore
+from backend.ml_explain import Explainer
+
+
+def _data():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(500, 5))
+    y = (X[:, 0] + X[:, 1] ** 2 > 1).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize(
+    "model, fmt",
+    [
+        (XGBClassifier(n_estimators=30, max_depth=4), "xgboost-ubj"),
+        (RandomForestClassifier(n_estimators=25, random_state=0), "forest-npy"),
+        (LogisticRegression(), "linear-json"),
+    ],
+    ids=["xgboost", "random_forest", "logistic_regression"],
+)
+def test_native_formats_round_trip(tmp_path, model, fmt):
+    X, y = _data()
+    model.fit(X, y)
+    store = ArtifactStore(tmp_path)
+    manifest = store.commit(model, "m", list("abcde"), {"metrics.json": b"{}"})
+    assert manifest["format"] == fmt and not list(tmp_path.rglob("*.pkl"))
+
+    loaded, columns, _ = store.load(manifest["version"])
+    assert columns == list("abcde") and loaded.n_features_in_ == 5
+    np.testing.assert_allclose(
+        loaded.predict_proba(X)[:, 1], model.predict_proba(X)[:, 1], atol=1e-6
+    )
+    # the exported forest is still explainable (values add up to the output)
+    values, base = Explainer(loaded, background=X).explain(X[:20])
+    if fmt == "forest-npy":
+        np.testing.assert_allclose(
+            values.sum(axis=1) + base, model.predict_proba(X[:20])[:, 1], atol=1e-6
+        )
+
+
+def test_versions_pointer_and_pruning(tmp_path):
+    X, y = _data()
+    store = ArtifactStore(tmp_path, keep=2)
+    model = LogisticRegression().fit(X, y)
+    first = store.commit(model, "lr", list("abcde"), {"metrics.json": b"1"})
+    # identical content is the same version
+    assert store.commit(model, "lr", list("abcde"), {"metrics.json": b"1"}) == first
+
+    versions = [first["version"]]
+    for i in range(2, 5):
+        versions.append(
+            store.commit(model, "lr", list("abcde"), {"metrics.json": b"%d" % i})[
+                "version"
+            ]
+        )
+    assert store.latest() == versions[-1]
+    assert [m["version"] for m in store.versions()] == versions[:1:-1]
+
+    store.set_latest(versions[-2])  # roll back
+    assert store.latest() == versions[-2]
+    with pytest.raises(ArtifactError):
+        store.set_latest(versions[0])  # pruned
+    assert store.latest() == versions[-2]
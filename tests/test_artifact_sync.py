@@ -0,0 +1,73 @@
+import boto3
+import numpy as np
+import pytest
+from moto import mock_aws
+from sklearn.linear_model import LogisticRegression
+
+from backend import artifact_sync
+from backend.artifact_store import ArtifactStore
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="models")
+        yield client
+
+
+def _version(root):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(100, 2))
+    model = LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    # 11 MB with a 5 MB part size -> a 3-part multipart upload
+    blob = rng.integers(0, 255, size=11 * MB, dtype=np.uint8).tobytes()
+    store = ArtifactStore(root)
+    return store.commit(model, "logistic_regression", ["f0", "f1"], {"bg.bin": blob})
+
+
+def test_sync_uploads_once_then_skips_unchanged(tmp_path, s3):
+    manifest = _version(tmp_path)
+    version = manifest["version"]
+    sync = {"prefix": "ml/", "client": s3, "workers": 4, "multipart_bytes": 5 * MB}
+
+    first = artifact_sync.sync_version(tmp_path, version, "models", **sync)
+    n_files = len(manifest["files"]) + 1  # + manifest.json
+    assert first["uploaded"] == n_files and first["skipped"] == 0
+    head = s3.head_object(Bucket="models", Key=f"ml/versions/{version}/bg.bin")
+    assert head["ETag"].strip('"').endswith("-3")
+    latest = s3.get_object(Bucket="models", Key="ml/LATEST")["Body"].read()
+    assert latest.decode().strip() == version
+
+    again = artifact_sync.sync_version(tmp_path, version, "models", **sync)
+    assert again["uploaded"] == 0 and again["skipped"] == n_files
+    assert again["bytes"] == 0
+
+    # a partial remote copy is resumed: only the missing object is sent
+    s3.delete_object(Bucket="models", Key=f"ml/versions/{version}/bg.bin")
+    resumed = artifact_sync.sync_version(tmp_path, version, "models", **sync)
+    assert resumed["uploaded"] == 1 and resumed["bytes"] == 11 * MB
+
+
+def test_failed_file_leaves_manifest_and_latest_unwritten(tmp_path, s3, monkeypatch):
+    version = _version(tmp_path)["version"]
+    real_put = artifact_sync._put
+
+    def flaky_put(client, bucket, key, path, multipart_bytes):
+        if key.endswith("bg.bin"):
+            raise OSError("connection reset")
+        return real_put(client, bucket, key, path, multipart_bytes)
+
+    monkeypatch.setattr(artifact_sync, "_put", flaky_put)
+    with pytest.raises(artifact_sync.SyncError, match="bg.bin"):
+        artifact_sync.sync_version(tmp_path, version, "models", client=s3)
+
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket="models").get("Contents", [])}
+    assert f"versions/{version}/columns.json" in keys
+    assert f"versions/{version}/manifest.json" not in keys
+    assert "LATEST" not in keys
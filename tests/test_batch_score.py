@@ -0,0 +1,43 @@
+import datetime as dt
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.linear_model import LogisticRegression
+
+from backend import batch_score
+from backend.artifact_store import ArtifactStore
+
+
+def test_scores_every_user_in_chunks(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 2))
+    model = LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    artifacts = tmp_path / "artifacts"
+    ArtifactStore(artifacts).commit(model, "logistic_regression", ["f0", "f1"])
+
+    # string cells and a dropped column are coerced like the training data
+    table = pa.table(
+        {
+            "user_id": np.arange(300),
+            "f0": [str(v) for v in X[:, 0]],
+            "will_convert_14d": np.zeros(300, dtype=int),
+        }
+    )
+    batches = table.to_batches(max_chunksize=64)
+    monkeypatch.setattr(batch_score, "feature_batches", lambda: ("test", batches))
+
+    out = tmp_path / "scores"
+    day = dt.date(2024, 1, 2)
+    for _ in range(2):  # a re-run replaces the date's output
+        summary = batch_score.run(
+            day, out=out, table="", workers=1, chunk_rows=100, artifact_dir=artifacts
+        )
+
+    assert summary["rows"] == 300 and summary["parts"] == 3
+    assert sorted(p.name for p in out.iterdir()) == ["2024-01-02"]
+    scored = pq.read_table(out / "2024-01-02").to_pandas()
+    assert scored["user_id"].tolist() == list(range(300))
+    expected = model.predict_proba(np.column_stack([X[:, 0], np.zeros(300)]))[:, 1]
+    np.testing.assert_allclose(scored["score"], expected, rtol=1e-6)
+    assert set(scored["scored_date"]) == {day}
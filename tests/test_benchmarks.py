@@ -0,0 +1,34 @@
+from benchmarks import baseline, load
+
+
+def test_compare_flags_slowdowns_and_throughput_drops():
+    base = {
+        "results": {
+            "fast": {"p50_ms": 10.0},
+            "served": {"p50_ms": 5.0, "rps": 100.0},
+            "gone": {"p50_ms": 1.0},
+        }
+    }
+    results = {
+        "fast": {"p50_ms": 14.0},
+        "served": {"p50_ms": 5.0, "rps": 40.0, "errors": 2},
+    }
+    out = baseline.compare(results, base, tolerance=0.5)
+    assert len(out) == 2
+    assert out[0].startswith("served: 40.0 req/s") and "2 failed" in out[1]
+
+    slower = {"fast": {"p50_ms": 16.0}}
+    assert baseline.compare(slower, base, tolerance=0.5)[0].startswith("fast: p50")
+
+
+def test_load_scenarios_run_against_the_fake_backend():
+    results = load.run(
+        ["kpi_query", "ab_test", "ml_predict"],
+        requests=20,
+        concurrency=4,
+        rows=50,
+        latency_s=0.01,
+    )
+    for name in ("kpi_query", "ab_test", "ml_predict"):
+        assert results[name]["n"] == 20 and results[name]["errors"] == 0
+        assert results[name]["rps"] > 0
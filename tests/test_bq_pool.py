@@ -0,0 +1,27 @@
+from backend.bq_pool import ClientRegistry
+
+
+class _FakeClient:
+    def __init__(self, project):
+        self.project = project
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_registry_reuses_client_per_project():
+    registry = ClientRegistry(factory=_FakeClient)
+    a = registry.client("exec-kpi")
+    b = registry.client("exec-kpi")
+    other = registry.client("other-project")
+    assert a is b
+    assert other is not a
+
+    stats = registry.stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] == 1
+
+    registry.close()
+    assert a.closed and other.closed
+    assert registry.stats()["clients"] == []
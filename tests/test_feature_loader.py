@@ -0,0 +1,83 @@
+import datetime as dt
+from types import SimpleNamespace
+
+import pandas as pd
+import pyarrow as pa
+from google.api_core.exceptions import Forbidden, NotFound
+
+from backend.feature_loader import find_table, iter_batches
+from backend.feature_prep import coerce_batches, coerce_features
+
+
+class _Client:
+    def __init__(self, batches):
+        self.batches = batches
+        self.downloads = 0
+
+    def list_rows(self, table):
+        self.downloads += 1
+        return SimpleNamespace(to_arrow_iterable=lambda **kw: iter(self.batches))
+
+
+def _table(minute):
+    return SimpleNamespace(
+        project="p",
+        dataset_id="d",
+        table_id="features_conversion",
+        table_type="TABLE",
+        modified=dt.datetime(2024, 1, 1, 0, minute, tzinfo=dt.timezone.utc),
+        num_rows=4,
+    )
+
+
+def _batches():
+    return [
+        pa.record_batch({"user_id": [1, 2], "x": [0.5, None]}),
+        pa.record_batch({"user_id": [3, 4], "x": [1.5, 2.0]}),
+    ]
+
+
+def test_cache_is_reused_until_table_changes(tmp_path):
+    client = _Client(_batches())
+    first = list(iter_batches(client, None, _table(0), str(tmp_path)))
+    again = list(iter_batches(client, None, _table(0), str(tmp_path)))
+    assert client.downloads == 1
+    assert pa.Table.from_batches(again).equals(pa.Table.from_batches(first))
+
+    list(iter_batches(client, None, _table(5), str(tmp_path)))
+    assert client.downloads == 2
+    assert len(list(tmp_path.glob("*.parquet"))) == 1  # stale key removed
+
+
+def test_abandoned_download_leaves_no_cache(tmp_path):
+    client = _Client(_batches())
+    stream = iter_batches(client, None, _table(0), str(tmp_path))
+    next(stream)
+    stream.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_coerce_batches_matches_whole_frame():
+    parts = [
+        pd.DataFrame({"user_id": [1, 2], "x": ["1.5", None], "n": [1, 2]}),
+        pd.DataFrame({"user_id": [3], "x": ["[2]"], "n": [3]}),
+    ]
+    frame, report = coerce_batches(iter(parts), keep=["user_id"])
+    whole, expected = coerce_features(pd.concat(parts, ignore_index=True), ["x", "n"])
+    pd.testing.assert_frame_equal(frame[["x", "n"]], whole)
+    assert frame["user_id"].tolist() == [1, 2, 3]
+    assert report == expected
+
+
+def test_find_table_skips_candidates_that_fail():
+    errors = {"bad id": ValueError("malformed"), "p.d.gone": NotFound("gone")}
+    errors["p.d.secret"] = Forbidden("denied")
+
+    def get_table(table_fq):
+        if table_fq in errors:
+            raise errors[table_fq]
+        return _table(0)
+
+    client = SimpleNamespace(get_table=get_table)
+    table = find_table(client, ["", "bad id", "p.d.secret", "p.d.gone", "p.d.ok"])
+    assert table.table_id == "features_conversion"
@@ -0,0 +1,60 @@
+import decimal
+
+import numpy as np
+import pandas as pd
+
+from backend.feature_prep import coerce_cell, coerce_features
+
+
+def test_matches_scalar_reference_on_mixed_cells():
+    rng = np.random.default_rng(3)
+    pool = [
+        None,
+        np.nan,
+        3,
+        2.5,
+        True,
+        decimal.Decimal("1.25"),
+        " 4.5 ",
+        "[7]",
+        "[ 1.5 ]",
+        "abc",
+        "",
+        [8.0, 9.0],
+        [],
+        ("6",),
+        np.array([0.5]),
+    ]
+    df = pd.DataFrame(
+        {
+            "mixed": [pool[i] for i in rng.integers(0, len(pool), 2000)],
+            "strings": rng.choice(["1", " 2.5", "[3]", "x", None], 2000),
+            "ints": rng.integers(0, 100, 2000),
+            "floats": np.where(rng.random(2000) < 0.1, np.nan, rng.random(2000)),
+            "nullable": pd.array(rng.integers(0, 5, 2000), dtype="Int64"),
+        }
+    )
+    df.loc[::7, "nullable"] = pd.NA
+
+    frame, report = coerce_features(df, list(df.columns))
+    for col in df.columns:
+        expected = [coerce_cell(v) for v in df[col].astype(object)]
+        np.testing.assert_allclose(frame[col].to_numpy(), expected, rtol=1e-6)
+        assert not frame[col].isna().any()
+
+    assert report["strings"]["failed"] == int((df["strings"] == "x").sum())
+    assert report["floats"]["nulls"] == int(df["floats"].isna().sum())
+    assert report["nullable"]["nulls"] == len(range(0, 2000, 7))
+
+
+def test_float32_only_where_safe():
+    df = pd.DataFrame(
+        {
+            "small": [1.0, 2.5, 1234.56],
+            "big_ids": [2**31 + 1, 2**40 + 3, 5],
+        }
+    )
+    frame, report = coerce_features(df, ["small", "big_ids"])
+    assert frame["small"].dtype == np.float32 and report["small"]["float32"]
+    assert frame["big_ids"].dtype == np.float64 and not report["big_ids"]["float32"]
+    assert frame["big_ids"].iloc[1] == 2**40 + 3
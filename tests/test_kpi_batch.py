@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+import backend.main as main
+
+
+def test_batch_reports_per_item_results(fake_bq):
+    client = fake_bq()
+    payload = {
+        "queries": [
+            {"sql_file": "api_revenue_daily.sql", "params": []},
+            {"sql_file": "api_missing.sql"},
+            {"sql_file": "api_revenue_daily.sql", "format": "ndjson"},
+            {"sql_file": "api_revenue_daily.sql", "timeout_s": "soon"},
+        ]
+    }
+    with TestClient(main.app) as tc:
+        body = tc.post("/kpi/batch", json=payload).json()
+
+    ok, missing, ndjson, bad_timeout = body["results"]
+    assert ok["ok"] and ok["data"] == [{"day": "2024-01-01", "revenue": 10.0}]
+    assert (missing["ok"], missing["status"]) == (False, 404)
+    assert (ndjson["ok"], ndjson["status"]) == (False, 400)
+    assert (bad_timeout["ok"], bad_timeout["status"]) == (False, 400)
+    assert (body["ok"], body["failed"]) == (1, 3)
+    assert client.queries == 1
+
+
+def test_batch_rejects_empty_or_oversized():
+    with TestClient(main.app) as tc:
+        assert tc.post("/kpi/batch", json={"queries": []}).status_code == 400
+        too_many = [{"sql_file": "x"}] * (main.BATCH_MAX_ITEMS + 1)
+        assert tc.post("/kpi/batch", json={"queries": too_many}).status_code == 400
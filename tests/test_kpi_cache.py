@@ -0,0 +1,64 @@
+import datetime as dt
+from types import SimpleNamespace
+
+from backend.kpi_cache import (
+    MemoryBackend,
+    ResultCache,
+    SqliteBackend,
+    TableFreshness,
+    cache_key,
+    referenced_tables,
+)
+
+
+def test_cache_key_ignores_param_order():
+    p1 = [{"name": "start", "value": "2024-01-01"}, {"name": "end", "value": None}]
+    assert cache_key("select 1", p1) == cache_key("select 1", p1[::-1])
+    assert cache_key("select 1", p1) != cache_key("select 2", p1)
+
+
+def test_referenced_tables():
+    sql = "select * from `execkpi_execkpi.revenue_daily` join exec-kpi.execkpi_execkpi.ab_group"
+    assert referenced_tables(sql, "execkpi_execkpi") == [
+        "execkpi_execkpi.ab_group",
+        "execkpi_execkpi.revenue_daily",
+    ]
+
+
+def test_memory_cache_lru_and_freshness():
+    cache = ResultCache(MemoryBackend(max_entries=2), ttl_s=60)
+    cache.put("a", {"rows": 1}, "t1")
+    cache.put("b", {"rows": 2}, "t1")
+    assert cache.get("a", "t1")[0] == {"rows": 1}
+    cache.put("c", {"rows": 3}, "t1")  # evicts "b", the least recently used
+    assert cache.get("b", "t1") is None
+    assert cache.get("a", "t2") is None  # table changed since it was cached
+    assert cache.stats()["evictions"] == 1
+
+
+def test_freshness_failures_are_not_memoised():
+    modified = SimpleNamespace(modified=dt.datetime(2024, 1, 1))
+    calls = []
+
+    def get_table(table):
+        calls.append(table)
+        if len(calls) == 1:
+            raise RuntimeError("metadata unavailable")
+        return modified
+
+    fresh = TableFreshness(check_s=60)
+    assert fresh.token(get_table, ["p.d.t"]) is None
+    assert fresh.token(get_table, ["p.d.t"]) == "p.d.t=2024-01-01T00:00:00"
+    assert fresh.token(get_table, ["p.d.t"]) == "p.d.t=2024-01-01T00:00:00"
+    assert len(calls) == 2
+
+
+def test_sqlite_cache_roundtrip(tmp_path):
+    cache = ResultCache(SqliteBackend(tmp_path / "c.sqlite", max_entries=8), ttl_s=60)
+    cache.put("k", {"rows": 1, "data": [{"day": "2024-01-01"}]}, "t")
+    payload, age = cache.get("k", "t")
+    assert payload["data"][0]["day"] == "2024-01-01"
+    assert age >= 0
+    cache.invalidate()
+    assert cache.get("k", "t") is None
+    cache.close()
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from backend.kpi_exec import QueryExecutor, QueryTimeout, SingleFlight, parse_timeout
+
+
+class _Job:
+    job_id = "job-1"
+
+    def __init__(self, polls_needed):
+        self.polls_left = polls_needed
+        self.state = "RUNNING"
+        self.cancelled = False
+
+    def done(self):
+        self.polls_left -= 1
+        if self.polls_left <= 0:
+            self.state = "DONE"
+        return self.state == "DONE"
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _Client:
+    def __init__(self, polls_needed):
+        self.jobs = []
+        self.polls_needed = polls_needed
+
+    def query(self, sql, job_config=None):
+        job = _Job(self.polls_needed)
+        self.jobs.append(job)
+        return job
+
+
+def test_executor_returns_fetched_result():
+    executor = QueryExecutor(max_concurrency=2)
+    client = _Client(polls_needed=2)
+    out = asyncio.run(executor.run(client, "select 1", None, fetch=lambda j: j.job_id))
+    assert out == "job-1"
+    assert executor.stats()["completed"] == 1
+
+
+def test_executor_timeout_cancels_job():
+    executor = QueryExecutor(max_concurrency=2)
+    client = _Client(polls_needed=10_000)
+
+    async def go():
+        with pytest.raises(QueryTimeout):
+            await executor.run(client, "select 1", None, fetch=str, timeout_s=0.2)
+        await asyncio.sleep(0.05)  # let the fire-and-forget cancel run
+
+    asyncio.run(go())
+    assert client.jobs[0].cancelled
+    assert executor.stats()["timed_out"] == 1
+    assert executor.stats()["in_flight"] == 0
+
+
+def test_parse_timeout_rejects_bad_values():
+    assert parse_timeout(None) is None
+    assert parse_timeout("2.5") == 2.5
+    for bad in ("soon", -1, 0, float("inf"), "nan", [1]):
+        with pytest.raises(ValueError):
+            parse_timeout(bad)
+
+
+def test_single_flight_coalesces_identical_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"rows": 1}
+
+    async def go():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    results = asyncio.run(go())
+    assert len(calls) == 1
+    assert all(r == {"rows": 1} for r in results)
+    assert flight.stats()["executed"] == 1
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight_keys"] == 0
@@ -0,0 +1,56 @@
+import pytest
+
+from backend.kpi_results import (
+    BadCursor,
+    decode_cursor,
+    encode_cursor,
+    negotiate,
+    parse_page_size,
+    rows_payload,
+)
+
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor("exec-kpi._anon123.anon_tbl", "tok-1")
+    assert decode_cursor(cursor, "exec-kpi") == ("exec-kpi._anon123.anon_tbl", "tok-1")
+
+
+def test_cursor_rejects_non_result_tables():
+    cursor = encode_cursor("exec-kpi.execkpi_execkpi.users", "tok-1")
+    with pytest.raises(BadCursor):
+        decode_cursor(cursor, "exec-kpi")
+    with pytest.raises(BadCursor):
+        decode_cursor("not-a-cursor", "exec-kpi")
+
+
+def test_parse_page_size_bounds():
+    assert parse_page_size(None) is None
+    assert parse_page_size("500") == 500
+    with pytest.raises(ValueError):
+        parse_page_size(0)
+
+
+class _Field:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Row:
+    def __init__(self, *values):
+        self._values = values
+
+    def values(self):
+        return self._values
+
+
+def test_columnar_payload_and_negotiation():
+    schema = [_Field("day"), _Field("revenue")]
+    rows = [_Row("2024-01-01", 1.0), _Row("2024-01-02", 2.5)]
+    out = rows_payload(schema, rows, "columnar")
+    assert out["columns"] == ["day", "revenue"]
+    assert out["data"] == {"day": ["2024-01-01", "2024-01-02"], "revenue": [1.0, 2.5]}
+    assert rows_payload(schema, [], "columnar")["data"] == {"day": [], "revenue": []}
+
+    assert negotiate("application/json") == "records"
+    assert negotiate("application/vnd.apache.arrow.stream") == "arrow"
+    assert negotiate("application/json", "columnar") == "columnar"
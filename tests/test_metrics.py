@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    h = registry.histogram("t_seconds", "test", ("route",), buckets=(0.1, 1))
+    for v in (0.05, 0.1, 0.5, 3):
+        h.observe(v, route='/a"b')
+    c = registry.counter("t_total", "test")
+    c.inc()
+    c.inc(2)
+
+    text = registry.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{route="/a\\"b",le="0.1"} 2' in text
+    assert 't_seconds_bucket{route="/a\\"b",le="1"} 3' in text
+    assert 't_seconds_bucket{route="/a\\"b",le="+Inf"} 4' in text
+    assert 't_seconds_sum{route="/a\\"b"} 3.65' in text
+    assert "t_total 3" in text
+
+
+def test_kpi_query_is_traced_and_exported(fake_bq):
+    fake_bq()
+    name = "api_revenue_daily.sql"
+    bytes_before = metrics.BQ_BYTES_PROCESSED.value(name=name)
+    stage_before = metrics.STAGE_LATENCY.count(
+        route="/kpi/query", name=name, stage="bq_job"
+    )
+
+    with TestClient(main.app) as tc:
+        resp = tc.post(
+            "/kpi/query",
+            json={"sql_file": name},
+            headers={"X-Request-ID": "req-42"},
+        )
+        text = tc.get("/metrics").text
+
+    assert resp.status_code == 200
+    assert resp.json()["data"] == [{"day": "2024-01-01", "revenue": 10.0}]
+    assert resp.headers["x-request-id"] == "req-42"
+    timing = resp.headers["server-timing"]
+    assert [part.split(";")[0] for part in timing.split(", ")] == [
+        "dry_run",
+        "queue",
+        "bq_job",
+        "fetch",
+        "serialize",
+    ]
+
+    assert metrics.BQ_BYTES_PROCESSED.value(name=name) == bytes_before + 1000
+    assert (
+        metrics.STAGE_LATENCY.count(route="/kpi/query", name=name, stage="bq_job")
+        == stage_before + 1
+    )
+    assert (
+        'execkpi_http_request_duration_seconds_count{method="POST",route="/kpi/query"}'
+        in text
+    )
+    assert f'execkpi_bq_slot_seconds_total{{name="{name}"}}' in text
+    assert 'execkpi_kpi_queries{state="running"} 0' in text
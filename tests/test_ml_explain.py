@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+
+from backend.ml_explain import (
+    Explainer,
+    ExplainService,
+    global_importance,
+    stratified_sample,
+)
+from backend.ml_serving import LoadedModel
+
+
+def _data(n=400):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n, 4))
+    y = (X[:, 0] + 0.5 * X[:, 1] > 0.8).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize(
+    "model",
+    [
+        XGBClassifier(n_estimators=20, max_depth=3),
+        RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0),
+        LogisticRegression(),
+    ],
+    ids=lambda m: type(m).__name__,
+)
+def test_values_add_up_to_model_output(model):
+    X, y = _data()
+    model.fit(X, y)
+    explainer = Explainer(model, background=X)
+    values, base = explainer.explain(X[:50])
+    if explainer.output == "probability":
+        expected = model.predict_proba(X[:50])[:, 1]
+    elif hasattr(model, "get_booster"):
+        expected = model.predict(X[:50], output_margin=True)
+    else:
+        expected = model.decision_function(X[:50])
+    np.testing.assert_allclose(values.sum(axis=1) + base, expected, atol=1e-4)
+
+
+def test_stratified_sample_keeps_class_shares():
+    y = np.r_[np.zeros(900, int), np.ones(100, int)]
+    idx = stratified_sample(y, 200)
+    assert len(idx) == 200 and y[idx].sum() == 20
+
+
+def test_global_importance_and_budget():
+    X, y = _data()
+    model = XGBClassifier(n_estimators=20, max_depth=3).fit(X, y)
+    columns = ["a", "b", "c", "d"]
+    summary, background = global_importance(
+        model, X, y, columns, sample_rows=200, chunk_rows=50, workers=1
+    )
+    assert summary["rows"] == 200 and not summary["partial"]
+    assert [r["feature"] for r in summary["importances"][:2]] == ["a", "b"]
+    assert background.shape == (200, 4)
+
+    # out of time: the first chunk still runs, the rest are skipped
+    summary, _ = global_importance(
+        model, X, y, columns, sample_rows=200, chunk_rows=50, workers=1, budget_s=0
+    )
+    assert summary["partial"] and summary["rows"] == 50
+
+
+def test_service_caches_rows_per_model_version(tmp_path):
+    X, y = _data()
+    model = LogisticRegression().fit(X, y)
+    for version in ("v1", "v2"):
+        (tmp_path / "versions" / version).mkdir(parents=True)
+        np.save(tmp_path / "versions" / version / "shap_background.npy", X[:100])
+    service = ExplainService(tmp_path, cache_size=8)
+    loaded = LoadedModel(model, ["a", "b", "c", "d"], "logistic_regression", "v1")
+
+    first, base, output, hits = service.explain(loaded, X[:5])
+    again, _, _, hits_again = service.explain(loaded, X[:5])
+    assert (hits, hits_again) == (0, 5) and output == "log_odds"
+    np.testing.assert_array_equal(first, again)
+    np.testing.assert_allclose(
+        first.sum(axis=1) + base, model.decision_function(X[:5]), atol=1e-9
+    )
+
+    newer = LoadedModel(model, loaded.columns, "logistic_regression", "v2")
+    assert service.explain(newer, X[:5])[3] == 0  # new version, no stale hits
+    assert len(service._cache) == 8  # LRU bound
+
+    assert service.summary() is None
+    (tmp_path / "versions" / "v2" / "shap_summary.json").write_text('{"rows": 1}')
+    (tmp_path / "LATEST").write_text("v2\n")
+    assert service.summary() == {"rows": 1}
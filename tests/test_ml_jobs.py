@@ -0,0 +1,74 @@
+import sys
+import threading
+
+import pytest
+
+from backend.ml_jobs import JobQueue, JobQueueFull
+
+SCRIPT = """
+import json, os, sys, time
+gate = sys.argv[1]
+print("[trainer] loading", flush=True)
+while not os.path.exists(gate):
+    time.sleep(0.01)
+print("[trainer] done")
+if sys.argv[2] == "fail":
+    sys.exit(3)
+with open(os.environ["EXECKPI_JOB_RESULT"], "w") as f:
+    json.dump({"name": "xgboost", "auc": 0.9}, f)
+"""
+
+
+def _argv(gate, mode="ok"):
+    return [sys.executable, "-c", SCRIPT, str(gate), mode]
+
+
+def _wait(queue, job):
+    # follow() returns once the job is finished
+    return "".join(queue.follow(job))
+
+
+def test_dedup_result_and_logs(tmp_path):
+    queue = JobQueue(workers=1, max_pending=1, job_dir=tmp_path / "jobs")
+    gate = tmp_path / "gate"
+    reloaded = []
+    job, created = queue.submit("train", _argv(gate), on_success=reloaded.append)
+    again, created_again = queue.submit("train", _argv(gate))
+    assert created and not created_again and again is job
+    assert queue.stats()["deduplicated"] == 1
+
+    # another kind waits for the single slot; a third is over the bound
+    other, _ = queue.submit("score", _argv(gate))
+    with pytest.raises(JobQueueFull):
+        queue.submit("export", _argv(gate))
+
+    logs = []
+    reader = threading.Thread(target=lambda: logs.append(_wait(queue, job)))
+    reader.start()
+    gate.touch()
+    reader.join(timeout=30)
+    _wait(queue, other)
+
+    assert logs == ["[trainer] loading\n[trainer] done\n"]
+    info = job.info()
+    assert info["status"] == "succeeded" and info["returncode"] == 0
+    assert info["result"] == {"name": "xgboost", "auc": 0.9}
+    assert info["progress"] == "[trainer] done"
+    assert reloaded == [job]
+    assert "".join(queue.follow(job, offset=1)) == "[trainer] done\n"
+
+    # finished jobs no longer dedupe
+    rerun, created = queue.submit("train", _argv(gate))
+    assert created and rerun is not job
+    queue.close()
+
+
+def test_failed_job(tmp_path):
+    queue = JobQueue(workers=1, job_dir=tmp_path / "jobs")
+    gate = tmp_path / "gate"
+    gate.touch()
+    job, _ = queue.submit("train", _argv(gate, "fail"))
+    _wait(queue, job)
+    assert job.status == "failed" and job.returncode == 3
+    assert job.result is None and "exit code 3" in job.error
+    queue.close()
@@ -0,0 +1,86 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.linear_model import LogisticRegression
+
+import backend.main as main
+from backend.artifact_store import ArtifactStore
+from backend.ml_serving import (
+    MicroBatcher,
+    ModelStore,
+    PredictInputError,
+    parse_rows,
+)
+
+
+def _write(artifacts, n_features):
+    rng = np.random.default_rng(n_features)
+    X = rng.normal(size=(200, n_features))
+    model = LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    columns = [f"f{i}" for i in range(n_features)]
+    manifest = ArtifactStore(artifacts).commit(model, "logistic_regression", columns)
+    return model, manifest["version"]
+
+
+def test_micro_batches_concurrent_rows(tmp_path):
+    model, _ = _write(tmp_path, 3)
+    loaded = ModelStore(tmp_path).reload()
+    rows = [{"f0": i / 10, "f1": "[1]", "user_id": i} for i in range(50)]
+    X = loaded.matrix(rows)
+    batcher = MicroBatcher(max_batch=16, max_wait_s=0.01)
+
+    async def score():
+        return await asyncio.gather(*(batcher.submit(loaded, x) for x in X))
+
+    proba = asyncio.run(score())
+    np.testing.assert_allclose(proba, model.predict_proba(X)[:, 1])
+    assert batcher.rows == 50 and batcher.batches == 4  # 16 + 16 + 16 + 2
+
+
+def test_hot_swap_rollback_and_bad_artifacts(tmp_path):
+    _, v1 = _write(tmp_path, 3)
+    store = ModelStore(tmp_path)
+    first = store.reload()
+    assert first.version == v1
+    assert store.reload() is first  # LATEST unchanged: no reload
+
+    _, v2 = _write(tmp_path, 4)
+    second = store.reload()
+    assert second is not first and len(second.columns) == 4
+
+    # rolling back is a pointer swap to the kept version
+    store.store.set_latest(v1)
+    assert store.reload().version == v1
+    store.store.set_latest(v2)
+    assert store.reload().version == v2
+
+    # a broken version: keep serving the loaded model
+    _, v3 = _write(tmp_path, 5)
+    (tmp_path / "versions" / v3 / "linear.json").write_text("{")
+    assert store.reload().version == v2 and store.reload_errors == 1
+
+
+def test_rollback_to_broken_version_keeps_latest(tmp_path, monkeypatch):
+    _, v1 = _write(tmp_path, 3)
+    (tmp_path / "versions" / v1 / "linear.json").write_text("{")
+    _, v2 = _write(tmp_path, 4)
+    store = ModelStore(tmp_path)
+    monkeypatch.setattr(main, "_model_store", store)
+    assert store.reload().version == v2
+
+    with TestClient(main.app) as tc:
+        resp = tc.post("/ml/model/rollback", json={"version": v1})
+    assert resp.status_code == 500
+    assert store.store.latest() == v2 and store.current().version == v2
+
+
+def test_input_validation(tmp_path):
+    _write(tmp_path, 3)
+    loaded = ModelStore(tmp_path).reload()
+    assert parse_rows({"features": {"f0": 1}}) == ([{"f0": 1}], True)
+    with pytest.raises(PredictInputError):
+        parse_rows({"rows": []})
+    with pytest.raises(PredictInputError):
+        loaded.matrix([{"f9": 1.0}])
@@ -0,0 +1,98 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main as main
+from backend import query_governor
+from backend.sql_registry import SqlRegistry, parse_bytes
+
+GB = 1024**3
+
+
+def _registry(tmp_path):
+    (tmp_path / "api_big.sql").write_text(
+        "-- Big table\n"
+        "-- @param start DATE\n"
+        "-- @max_bytes 2GB\n"
+        "-- @budget_ms 1500\n"
+        "-- @fallback api_big_sample.sql\n"
+        "select * from events_all where d >= @start\n"
+    )
+    (tmp_path / "api_big_sample.sql").write_text(
+        "-- Big table, sampled\nselect * from events_1pct\n"
+    )
+    registry = SqlRegistry(tmp_path)
+    registry.load()
+    return registry
+
+
+def test_directives_and_sizes(tmp_path):
+    q = _registry(tmp_path).get("api_big.sql")
+    assert q.description == "Big table"
+    assert (q.max_bytes, q.budget_ms, q.fallback) == (
+        2 * GB,
+        1500.0,
+        "api_big_sample.sql",
+    )
+    assert parse_bytes("512MB") == 512 * 1024**2
+    assert parse_bytes("1.5 gb") == int(1.5 * GB)
+    assert parse_bytes("1000") == 1000
+    with pytest.raises(ValueError):
+        parse_bytes("lots")
+
+
+def test_plan_allows_downgrades_and_rejects(tmp_path, fake_bq):
+    registry = _registry(tmp_path)
+    query = registry.get("api_big.sql")
+    params = query.bind([{"name": "start", "value": "2024-01-01"}])
+    governor = query_governor.QueryGovernor(
+        registry, max_bytes=10 * GB, labels="env=Prod"
+    )
+
+    client = fake_bq(sizes={"events_1pct": GB // 10, "events_all": GB})
+    plan = governor.plan(client, query, params)
+    assert plan.query is query and plan.estimate == GB
+    assert governor.plan(client, query, params).estimate == GB
+    assert client.dry_runs == 1 and governor.estimate_hits == 1
+
+    config = plan.job_config()
+    assert config.maximum_bytes_billed == 2 * GB and config.use_query_cache
+    assert config.labels == {"app": "execkpi", "env": "prod", "sql_file": "api_big_sql"}
+    assert plan.timeout_s() == 1.5 and plan.timeout_s(1.0) == 1.0
+
+    # estimates are memoised, so a bigger table needs a fresh governor
+    governor = query_governor.QueryGovernor(registry, max_bytes=10 * GB)
+    client = fake_bq(sizes={"events_1pct": GB // 10, "events_all": 5 * GB})
+    plan = governor.plan(client, query, params)
+    assert plan.query.name == "api_big_sample.sql" and plan.params == []
+    assert plan.info()["downgraded_from"] == "api_big.sql"
+
+    governor.max_bytes = GB // 20  # the sample no longer fits either
+    with pytest.raises(query_governor.QueryTooExpensive) as e:
+        governor.plan(client, query, params)
+    assert e.value.estimate == 5 * GB and e.value.limit == GB // 20
+    assert (governor.downgraded, governor.rejected, governor.estimate_hits) == (1, 1, 2)
+
+
+def test_kpi_query_rejected_before_any_job_runs(fake_bq):
+    client = fake_bq(sizes={"execkpi_execkpi": 100 * GB})
+    main._governor.max_bytes = GB
+
+    with TestClient(main.app) as tc:
+        resp = tc.post("/kpi/query", json={"sql_file": "api_revenue_daily.sql"})
+    assert resp.status_code == 422
+    assert "over its 1.0GB limit" in resp.json()["detail"]
+    assert client.dry_runs == 1 and client.queries == 0
+
+
+def test_registry_rejects_bad_fallbacks(tmp_path):
+    (tmp_path / "api_a.sql").write_text(
+        "-- @param start DATE\n-- @fallback api_b.sql\nselect @start\n"
+    )
+    (tmp_path / "api_b.sql").write_text("-- @param start STRING\nselect @start\n")
+    (tmp_path / "api_c.sql").write_text("-- @fallback api_nope.sql\nselect 1\n")
+    (tmp_path / "api_d.sql").write_text("-- @fallback api_c.sql\nselect 1\n")
+    registry = SqlRegistry(tmp_path)
+    registry.load()
+    assert set(registry.errors()) == {"api_a.sql", "api_c.sql", "api_d.sql"}
+    assert "types @start as STRING" in registry.errors()["api_a.sql"]
+    assert registry.get("api_b.sql") is not None
@@ -0,0 +1,65 @@
+import pytest
+
+from backend.main import SQL_DIR
+from backend.sql_registry import ParamError, SqlRegistry
+
+
+def test_repo_queries_load_cleanly():
+    registry = SqlRegistry(SQL_DIR)
+    registry.load()
+    assert registry.errors() == {}
+    revenue = registry.get("api_revenue_daily.sql")
+    assert set(revenue.params) == {"start", "end"}
+    assert registry.get("../requirements.txt") is None
+
+
+def test_bind_validates_and_fills_nulls(tmp_path):
+    (tmp_path / "api_q.sql").write_text(
+        "-- @param start DATE\n-- @param n INT64\nselect @start, @n, @@project_id\n"
+    )
+    (tmp_path / "api_bad.sql").write_text("select @undeclared\n")
+    registry = SqlRegistry(tmp_path)
+    registry.load()
+    assert "api_bad.sql" in registry.errors()
+
+    q = registry.get("api_q.sql")
+    bound = q.bind([{"name": "n", "type": "INT64", "value": "5"}])
+    assert bound == [
+        {"name": "start", "type": "DATE", "value": None},
+        {"name": "n", "type": "INT64", "value": 5},
+    ]
+    with pytest.raises(ParamError):
+        q.bind([{"name": "other", "value": 1}])
+    with pytest.raises(ParamError):
+        q.bind([{"name": "start", "type": "DATE", "value": "not-a-date"}])
+
+
+def test_numeric_params_must_be_finite_decimals(tmp_path):
+    (tmp_path / "api_n.sql").write_text("-- @param x NUMERIC\nselect @x\n")
+    registry = SqlRegistry(tmp_path)
+    registry.load()
+    q = registry.get("api_n.sql")
+    assert q.bind([{"name": "x", "value": " 12.50 "}])[0]["value"] == "12.50"
+    assert q.bind([{"name": "x", "value": 3}])[0]["value"] == "3"
+    for bad in ("abc", "NaN", "Infinity"):
+        with pytest.raises(ParamError):
+            q.bind([{"name": "x", "value": bad}])
+
+
+def test_int_and_float_params_reject_lossy_values(tmp_path):
+    (tmp_path / "api_n.sql").write_text(
+        "-- @param n INT64\n-- @param f FLOAT64\nselect @n, @f\n"
+    )
+    registry = SqlRegistry(tmp_path)
+    registry.load()
+    q = registry.get("api_n.sql")
+    assert q.bind([{"name": "n", "value": 2.0}, {"name": "f", "value": "1.5"}]) == [
+        {"name": "n", "type": "INT64", "value": 2},
+        {"name": "f", "type": "FLOAT64", "value": 1.5},
+    ]
+    for name, bad in [("n", 1.9), ("n", True), ("n", "true"), ("f", "nan")]:
+        with pytest.raises(ParamError):
+            q.bind([{"name": name, "value": bad}])
+    for bad in ("inf", "-inf", False):
+        with pytest.raises(ParamError):
+            q.bind([{"name": "f", "value": bad}])
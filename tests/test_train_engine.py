@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("xgboost")
+
+from backend.train_engine import (  # noqa: E402
+    TrainConfigError,
+    plan_trials,
+    search,
+)
+
+
+def _data(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 5))
+    y = (X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.5, size=n) > 0).astype(int)
+    return X[:480], X[480:], y[:480], y[480:]
+
+
+def test_plan_is_interleaved_and_seeded():
+    space = {
+        "random_forest": {"max_depth": [2, 4, 8]},
+        "xgboost": {"max_depth": [2, 3]},
+    }
+    plan = plan_trials(space, "grid", models=("random_forest", "xgboost"))
+    assert plan[:2] == [("random_forest", {}), ("xgboost", {})]
+    assert len(plan) == 7
+
+    picked = plan_trials(space, "random", trials=2, seed=1, models=("random_forest",))
+    assert picked == plan_trials(
+        space, "random", trials=2, seed=1, models=("random_forest",)
+    )
+    assert len(picked) == 3
+    with pytest.raises(TrainConfigError):
+        plan_trials(space, "bayes")
+
+
+def test_search_is_deterministic_across_workers():
+    X_train, X_test, y_train, y_test = _data()
+    kwargs = {
+        "models": ("logistic_regression", "xgboost"),
+        "space": {"xgboost": {"max_depth": [2, 4]}},
+        "search": "grid",
+        "folds": 3,
+        "budget_s": 300,
+    }
+    inline = search(X_train, y_train, X_test, y_test, workers=1, **kwargs)
+    pooled = search(X_train, y_train, X_test, y_test, workers=2, **kwargs)
+
+    assert inline["summary"]["trials_completed"] == 4
+    assert [t["cv_auc"] for t in inline["trials"]] == [
+        t["cv_auc"] for t in pooled["trials"]
+    ]
+    xgb = inline["models"]["xgboost"]
+    assert xgb["auc"] > 0.8 and 1 <= xgb["n_estimators"] < 1000
+
+
+def test_budget_stops_new_fits():
+    X_train, X_test, y_train, y_test = _data()
+    out = search(
+        X_train,
+        y_train,
+        X_test,
+        y_test,
+        models=("logistic_regression",),
+        search="none",
+        budget_s=0,
+        workers=1,
+    )
+    assert out["summary"]["timed_out"] and out["models"] == {}